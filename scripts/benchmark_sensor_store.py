@@ -0,0 +1,53 @@
+"""
+Benchmark sustained ingest throughput of the embedded sensor store
+"""
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from sensor_store import SensorStore
+
+
+def run_benchmark(n_readings=200000, n_machines=10, batch_size=5000):
+    """Ingest n_readings at 1 Hz per machine and report readings per second"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SensorStore(os.path.join(tmp, 'bench.db'), batch_size=batch_size)
+        rng = np.random.default_rng(42)
+        start_ts = time.time() - n_readings // n_machines
+
+        readings = [
+            {
+                'timestamp': start_ts + i // n_machines,
+                'temperature': 65 + rng.normal(0, 1),
+                'vibration': 2.3 + rng.normal(0, 0.1),
+                'cycle_time': 42.5 + rng.normal(0, 0.5),
+                'error_count': 0,
+                'pressure': 105.0,
+                'humidity': 48.0,
+                'power': 15250.0,
+                'production': 94.5
+            }
+            for i in range(n_readings)
+        ]
+
+        t0 = time.perf_counter()
+        for i in range(0, n_readings, 1000):
+            store.append_many(f"machine-{(i // 1000) % n_machines}", readings[i:i + 1000])
+        store.flush()
+        elapsed = time.perf_counter() - t0
+
+        stats = store.stats()
+        store.close()
+
+    print(f"Ingested {n_readings} readings for {n_machines} machines in {elapsed:.2f}s")
+    print(f"Throughput: {n_readings / elapsed:,.0f} readings/s")
+    print(f"Rows: raw={stats['raw_rows']} 1m={stats['rollup_1m_rows']} 1h={stats['rollup_1h_rows']}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
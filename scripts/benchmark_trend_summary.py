@@ -0,0 +1,93 @@
+"""
+Benchmark trend summarization: pandas DataFrame per call vs. the NumPy SensorWindow path
+
+The DataFrame path is what GeminiAnalyzer used to do on every call: build a DataFrame from the
+list of reading dicts and read iloc[0], iloc[-1] and mean() of temperature, vibration and error
+count. The NumPy path extracts all eight sensor columns once and summarizes them in one
+vectorized pass, computing more statistics for more sensors.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from trend_stats import SensorWindow, summarize
+
+
+def _readings(n, seed=42):
+    """n reading dicts shaped like the /ai/trends request body"""
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'machine_id': 'machine-1',
+            'timestamp': f"2024-01-01T00:00:{i:08d}",
+            'temperature': 65 + rng.normal(0, 1),
+            'vibration': 2.3 + rng.normal(0, 0.1),
+            'cycle_time': 42.5 + rng.normal(0, 0.5),
+            'error_count': int(rng.poisson(0.3)),
+            'pressure': 105.0,
+            'humidity': 48.0,
+            'power': 15250.0,
+            'production': 94.5
+        }
+        for i in range(n)
+    ]
+
+
+def dataframe_summary(sensor_history):
+    """The previous per-call path"""
+    df = pd.DataFrame(sensor_history)
+    return {
+        name: {
+            'current': df[name].iloc[-1],
+            'avg': df[name].mean(),
+            'trend': 'increasing' if df[name].iloc[-1] > df[name].iloc[0] else 'decreasing'
+        }
+        for name in ('temperature', 'vibration', 'error_count')
+    }
+
+
+def numpy_summary(sensor_history):
+    return summarize(SensorWindow.from_history(sensor_history))
+
+
+def _time_calls(fn, n, rounds=5):
+    """Best mean ms/call over several rounds, to filter out scheduler and GC noise"""
+    per_round = max(1, n // rounds)
+    best = float('inf')
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(per_round):
+            fn()
+        best = min(best, (time.perf_counter() - t0) / per_round * 1000)
+    return best
+
+
+def run_benchmark(sizes=(10, 1000, 100000)):
+    """Report ms per summarization for each window size"""
+    print(f"{'readings':>10} {'DataFrame ms':>14} {'NumPy ms':>10} {'speedup':>8}")
+    for n in sizes:
+        readings = _readings(n)
+        # Same answer for the statistics both paths compute
+        old, new = dataframe_summary(readings), numpy_summary(readings)
+        for name in old:
+            assert abs(old[name]['avg'] - new[name]['mean']) < 1e-9 * max(1.0, abs(old[name]['avg']))
+            assert old[name]['current'] == new[name]['current']
+
+        calls = max(5, min(2000, 2000000 // n))
+        df_ms = _time_calls(lambda: dataframe_summary(readings), calls)
+        np_ms = _time_calls(lambda: numpy_summary(readings), calls)
+        print(f"{n:>10} {df_ms:>14.3f} {np_ms:>10.3f} {df_ms / np_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trend summarization paths")
+    parser.add_argument('sizes', nargs='*', type=int, default=[10, 1000, 100000],
+                        help="Window sizes in readings (default: 10 1000 100000)")
+    args = parser.parse_args()
+    run_benchmark(args.sizes)
@@ -3,7 +3,20 @@ AI Explainer using LangChain and OpenAI
 Provides root cause analysis and recommended actions for downtime predictions
 """
 import os
+import re
+import sys
+import json
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from explanation_cache import ExplanationCache, explanation_signature
+from llm_store import LLMResponseStore
+from single_flight import SingleFlight, AsyncSingleFlight
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from rule_explainer import RuleExplainer, EnrichmentQueue
+from llm_metrics import (get_llm_metrics, estimate_tokens, EVENT_CALL, EVENT_ERROR, EVENT_FALLBACK,
+                         EVENT_CACHE_HIT, EVENT_STORE_HIT)
 
 load_dotenv()
 
@@ -20,29 +33,182 @@ except ImportError:
     except ImportError:
         LANGCHAIN_AVAILABLE = False
 
+try:
+    from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+    TOKEN_CALLBACK_AVAILABLE = True
+except ImportError:
+    TOKEN_CALLBACK_AVAILABLE = False
+
+try:
+    import httpx
+    import openai
+    OPENAI_CLIENT_AVAILABLE = True
+except ImportError:
+    OPENAI_CLIENT_AVAILABLE = False
+
+SYSTEM_PROMPT = "You are an expert industrial maintenance engineer analyzing machine sensor data."
+
+EXPLANATION_PROMPT = """Analyze this machine downtime risk prediction:
+
+Risk Score: {risk}%
+Sensor Readings:
+- Temperature: {temp}°C
+- Vibration: {vib} mm/s
+- Cycle Time: {cycle}s
+- Error Count: {errors}
+
+Key Contributing Factors:
+{factors}
+
+Provide:
+1. Root Cause Analysis: What is likely causing the high downtime risk?
+2. Recommended Action: What should the operator do immediately?
+
+Keep responses concise (2-3 sentences each) and actionable."""
+
+
+BATCH_PROMPT = """Analyze these {count} machine downtime risk predictions:
+
+{machines}
+
+For every machine provide:
+1. root_cause: What is likely causing the downtime risk?
+2. recommended_action: What should the operator do immediately?
+
+Keep each field concise (2-3 sentences) and actionable.
+Respond with only a JSON array, one object per machine, in this form:
+[{{"machine_id": "...", "root_cause": "...", "recommended_action": "..."}}]"""
+
+# One machine's block inside BATCH_PROMPT
+BATCH_MACHINE_BLOCK = """Machine {machine_id}: Risk {risk}%, Temperature {temp}°C, Vibration {vib} mm/s, Cycle Time {cycle}s, Error Count {errors}
+Key factors: {factors}"""
+
+# Section markers in LLM responses
+ACTION_MARKER = "Recommended Action:"
+ROOT_CAUSE_PREFIXES = ("Root Cause:", "Root Cause Analysis:")
+DEFAULT_ACTION = "Monitor sensor readings and schedule maintenance."
+
+
+def _http_limits():
+    """Connection pool limits shared by the sync and async OpenAI HTTP clients"""
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(os.getenv("LLM_HTTP_KEEPALIVE_CONNECTIONS", 10)),
+        keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", 60))
+    )
+
+
+class ExplanationStreamParser:
+    """Split a streamed LLM response into root cause and recommended action text as it arrives"""
+
+    def __init__(self):
+        self.text = ""
+        self.emitted = {'root_cause': "", 'recommended_action': ""}
+
+    def _sections(self):
+        """Section text that is safe to emit given what has arrived so far"""
+        idx = self.text.find(ACTION_MARKER)
+        if idx >= 0:
+            root_raw, action_raw = self.text[:idx], self.text[idx + len(ACTION_MARKER):]
+        else:
+            # Hold back a tail that could be the start of a marker split across tokens
+            holdback = 0
+            for n in range(1, len(ACTION_MARKER)):
+                if self.text.endswith(ACTION_MARKER[:n]):
+                    holdback = n
+            root_raw, action_raw = self.text[:len(self.text) - holdback], ""
+
+        root_cause = root_raw.lstrip()
+        # Wait until a possible "Root Cause ..." heading is complete before emitting anything
+        if idx < 0 and any(p.startswith(root_cause) for p in ROOT_CAUSE_PREFIXES):
+            root_cause = ""
+        for prefix in sorted(ROOT_CAUSE_PREFIXES, key=len, reverse=True):
+            if root_cause.startswith(prefix):
+                root_cause = root_cause[len(prefix):]
+                break
+        return {'root_cause': root_cause.lstrip(), 'recommended_action': action_raw.lstrip()}
+
+    def feed(self, chunk):
+        """
+        Add a chunk of generated text
+
+        Returns:
+            List of (section, new_text) pairs not yet emitted
+        """
+        self.text += chunk
+        deltas = []
+        for section, text in self._sections().items():
+            done = self.emitted[section]
+            if len(text) > len(done) and text.startswith(done):
+                deltas.append((section, text[len(done):]))
+                self.emitted[section] = text
+        return deltas
+
+
 class AIExplainer:
     """Generate AI-powered explanations for downtime predictions"""
-    
+
     def __init__(self):
         self.openai_api_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_KEY")
         self.llm = None
-        
+        self.prompt = None
+        self.chain = None
+        self.batch_prompt = None
+        self.batch_chain = None
+        self.model_name = "gpt-3.5-turbo"
+        self.model_params = {'temperature': 0.7}
+        # Repeated readings within the TTL reuse the previous explanation instead of a new LLM call
+        self.cache = ExplanationCache()
+        # Responses persisted across restarts and processes, keyed on the exact rendered prompt
+        self.response_store = LLMResponseStore()
+        # Concurrent requests for the same situation wait on a single in-flight LLM call
+        self.single_flight = SingleFlight()
+        self.async_single_flight = AsyncSingleFlight()
+        self.coalesce_timeout_s = float(os.getenv("EXPLANATION_COALESCE_TIMEOUT", 60))
+        # Deadline per LLM call; repeated failures or slow calls switch to the template fallback
+        self.breaker = CircuitBreaker('openai')
+        # Prompt token budget per batch request and concurrent batch requests
+        self.batch_token_budget = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", 3000))
+        self.batch_concurrency = int(os.getenv("LLM_BATCH_CONCURRENCY", 4))
+        # Deterministic explanations for the request path, with optional background LLM enrichment
+        self.rules = RuleExplainer()
+        self.enrichment = EnrichmentQueue(self._enrich, path=self.response_store.path)
+        # Tokens, latency, errors, fallbacks and cache hits for every call
+        self.metrics = get_llm_metrics()
+
+        if LANGCHAIN_AVAILABLE:
+            # Template is built once and reused by every explain call
+            self.prompt = ChatPromptTemplate.from_messages([
+                ("system", SYSTEM_PROMPT),
+                ("human", EXPLANATION_PROMPT)
+            ])
+            self.batch_prompt = ChatPromptTemplate.from_messages([
+                ("system", SYSTEM_PROMPT),
+                ("human", BATCH_PROMPT)
+            ])
+
         if LANGCHAIN_AVAILABLE and self.openai_api_key:
             try:
                 # Try new langchain-openai format first
                 try:
                     self.llm = ChatOpenAI(
-                        model="gpt-3.5-turbo",
+                        model=self.model_name,
                         api_key=self.openai_api_key,
-                        temperature=0.7
+                        temperature=self.model_params['temperature'],
+                        timeout=self.breaker.deadline_s,
+                        max_retries=int(os.getenv("LLM_MAX_RETRIES", 1)),
+                        **self._pooled_clients()
                     )
                 except:
                     # Fallback to older format
                     self.llm = ChatOpenAI(
-                        model_name="gpt-3.5-turbo",
+                        model_name=self.model_name,
                         openai_api_key=self.openai_api_key,
-                        temperature=0.7
+                        temperature=self.model_params['temperature'],
+                        request_timeout=self.breaker.deadline_s
                     )
+                self.chain = self.prompt | self.llm
+                self.batch_chain = self.batch_prompt | self.llm
             except Exception as e:
                 # Safely handle error message to avoid encoding issues on Windows
                 try:
@@ -55,75 +221,450 @@ class AIExplainer:
                 except:
                     pass  # Silently fail if even stderr write fails
                 self.llm = None
-    
+                self.chain = None
+                self.batch_chain = None
+
+    def _pooled_clients(self):
+        """
+        OpenAI clients backed by long-lived keep-alive connection pools
+
+        Returns:
+            ChatOpenAI keyword arguments ('client', 'async_client'), empty if the
+            OpenAI SDK is unavailable so ChatOpenAI builds its own clients
+        """
+        if not OPENAI_CLIENT_AVAILABLE:
+            return {}
+        # Provider-side timeout matches the call deadline so abandoned requests do not linger
+        sync_client = openai.OpenAI(
+            api_key=self.openai_api_key,
+            timeout=self.breaker.deadline_s,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 1)),
+            http_client=httpx.Client(limits=_http_limits())
+        )
+        async_client = openai.AsyncOpenAI(
+            api_key=self.openai_api_key,
+            timeout=self.breaker.deadline_s,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", 1)),
+            http_client=httpx.AsyncClient(limits=_http_limits())
+        )
+        return {
+            'client': sync_client.chat.completions,
+            'async_client': async_client.chat.completions
+        }
+
+    def _prompt_variables(self, prediction_result, sensor_data):
+        """Template variables for one prediction"""
+        risk = prediction_result.get('risk', 0)
+        importance = prediction_result.get('feature_importance', {})
+
+        # Format factors
+        factors_str = "\n".join([f"- {k}: {v:.1%}" for k, v in sorted(importance.items(), key=lambda x: x[1], reverse=True)[:3]])
+
+        return {
+            "risk": risk,
+            "temp": sensor_data.get('temperature', 0),
+            "vib": sensor_data.get('vibration', 0),
+            "cycle": sensor_data.get('cycle_time', 0),
+            "errors": sensor_data.get('error_count', 0),
+            "factors": factors_str
+        }
+
+    def _render_prompt(self, variables):
+        """Exact prompt text sent to the model, used as the response store key"""
+        return "\n\n".join(f"{m.type}: {m.content}" for m in self.prompt.format_messages(**variables))
+
+    def _parse_explanation(self, content):
+        """Split an LLM response into root cause and recommended action"""
+        # Simple parsing (assumes format: Root Cause: ... Recommended Action: ...)
+        parts = content.split(ACTION_MARKER)
+        root_cause = parts[0]
+        for prefix in ROOT_CAUSE_PREFIXES:
+            root_cause = root_cause.replace(prefix, "")
+        root_cause = root_cause.strip()
+        recommended_action = parts[1].strip() if len(parts) > 1 else DEFAULT_ACTION
+
+        return {
+            'root_cause': root_cause,
+            'recommended_action': recommended_action
+        }
+
+    def _record(self, event, machine_ids=None, **fields):
+        self.metrics.record('openai', self.model_name, event, machine_ids=machine_ids, **fields)
+
+    def _invoke_llm(self, chain, variables, rendered_prompt, machine_ids=None):
+        """
+        Call the LLM through the circuit breaker and record tokens, wall time and cost
+
+        Returns:
+            Response text
+
+        Raises:
+            CircuitOpenError: The breaker is open (nothing is recorded as a call)
+        """
+        handler = OpenAICallbackHandler() if TOKEN_CALLBACK_AVAILABLE else None
+        config = {'callbacks': [handler]} if handler else {}
+        started = time.perf_counter()
+        try:
+            response = self.breaker.call(lambda: chain.invoke(variables, config=config))
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self._record(EVENT_ERROR, machine_ids, wall_s=time.perf_counter() - started, error=str(e))
+            raise
+        content = response.content if hasattr(response, 'content') else str(response)
+        self._record_call(rendered_prompt, content, time.perf_counter() - started, handler, machine_ids)
+        return content
+
+    async def _ainvoke_llm(self, chain, variables, rendered_prompt, machine_ids=None):
+        """Async counterpart of _invoke_llm using the provider's async client"""
+        handler = OpenAICallbackHandler() if TOKEN_CALLBACK_AVAILABLE else None
+        config = {'callbacks': [handler]} if handler else {}
+        started = time.perf_counter()
+        try:
+            response = await self.breaker.acall(lambda: chain.ainvoke(variables, config=config))
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self._record(EVENT_ERROR, machine_ids, wall_s=time.perf_counter() - started, error=str(e))
+            raise
+        content = response.content if hasattr(response, 'content') else str(response)
+        self._record_call(rendered_prompt, content, time.perf_counter() - started, handler, machine_ids)
+        return content
+
+    def _record_call(self, rendered_prompt, content, wall_s, handler=None, machine_ids=None):
+        """Record a completed call, estimating tokens when the provider did not report usage"""
+        prompt_tokens = handler.prompt_tokens if handler else 0
+        completion_tokens = handler.completion_tokens if handler else 0
+        estimated = not prompt_tokens
+        if estimated:
+            prompt_tokens, completion_tokens = estimate_tokens(rendered_prompt), estimate_tokens(content)
+        self._record(EVENT_CALL, machine_ids, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                     wall_s=wall_s, estimated=estimated)
+
+    def _generate(self, cache_key, prediction_result, sensor_data):
+        """
+        Produce one explanation from the response store or the LLM and cache it
+
+        Returns:
+            Explanation dict, or None when no LLM answer is available (replay miss or open breaker)
+        """
+        started = time.perf_counter()
+        variables, rendered_prompt, content = self._stored_response(prediction_result, sensor_data)
+        if content is None and not self.response_store.replay_only:
+            # Invoke LLM under the call deadline; an open breaker answers instantly with the template
+            try:
+                content = self._invoke_llm(self.chain, variables, rendered_prompt)
+            except CircuitOpenError:
+                return None
+            self.response_store.put(rendered_prompt, self.model_name, self.model_params, content)
+        return self._cache_explanation(cache_key, content, started)
+
+    async def _agenerate(self, cache_key, prediction_result, sensor_data):
+        """Async counterpart of _generate"""
+        started = time.perf_counter()
+        variables, rendered_prompt, content = self._stored_response(prediction_result, sensor_data)
+        if content is None and not self.response_store.replay_only:
+            try:
+                content = await self._ainvoke_llm(self.chain, variables, rendered_prompt)
+            except CircuitOpenError:
+                return None
+            self.response_store.put(rendered_prompt, self.model_name, self.model_params, content)
+        return self._cache_explanation(cache_key, content, started)
+
+    def _stored_response(self, prediction_result, sensor_data):
+        """Prompt variables, rendered prompt and the response store's answer for it (or None)"""
+        variables = self._prompt_variables(prediction_result, sensor_data)
+        # Check the persistent response store before paying for an LLM call
+        rendered_prompt = self._render_prompt(variables)
+        content = self.response_store.get(rendered_prompt, self.model_name, self.model_params)
+        if content is not None:
+            self._record(EVENT_STORE_HIT)
+        return variables, rendered_prompt, content
+
+    def _cache_explanation(self, cache_key, content, started):
+        """Parse and cache an LLM response; None (replay mode never calls the LLM) passes through"""
+        if content is None:
+            return None
+        result = self._parse_explanation(content)
+        self.cache.put(cache_key, result, time.perf_counter() - started)
+        return result
+
     def explain(self, prediction_result, sensor_data):
         """
         Generate AI explanation for downtime prediction
-        
+
+        Args:
+            prediction_result: Dict with 'risk' and 'feature_importance'
+            sensor_data: Dict with sensor readings
+
+        Returns:
+            Dict with 'root_cause' and 'recommended_action'
+        """
+        cache_key, answer = self._cached_explanation(prediction_result, sensor_data)
+        if answer is not None:
+            return answer
+        try:
+            # Identical concurrent requests share one LLM call; failures reach every waiter
+            result = self.single_flight.do(
+                cache_key,
+                lambda: self._generate(cache_key, prediction_result, sensor_data),
+                timeout=self.coalesce_timeout_s
+            )
+            return self._explanation(result, prediction_result, sensor_data)
+        except Exception as e:
+            return self._explain_failed(e, prediction_result, sensor_data)
+
+    async def aexplain(self, prediction_result, sensor_data):
+        """
+        Async variant of explain() - awaits the LLM without holding a worker thread
+
         Args:
             prediction_result: Dict with 'risk' and 'feature_importance'
             sensor_data: Dict with sensor readings
-            
+
         Returns:
             Dict with 'root_cause' and 'recommended_action'
         """
-        if not self.llm:
+        cache_key, answer = self._cached_explanation(prediction_result, sensor_data)
+        if answer is not None:
+            return answer
+        try:
+            result = await self.async_single_flight.do(
+                cache_key,
+                lambda: self._agenerate(cache_key, prediction_result, sensor_data),
+                timeout=self.coalesce_timeout_s
+            )
+            return self._explanation(result, prediction_result, sensor_data)
+        except Exception as e:
+            return self._explain_failed(e, prediction_result, sensor_data)
+
+    def _cached_explanation(self, prediction_result, sensor_data):
+        """
+        Answer an explanation request without the LLM if possible
+
+        Returns:
+            (None, template explanation) when no LLM is configured, (None, copy) on a cache hit,
+            else (cache_key, None)
+        """
+        # Replay mode can serve stored responses even without an OpenAI key
+        if not self.llm and not (LANGCHAIN_AVAILABLE and self.response_store.replay_only):
             # Return dummy explanation if OpenAI not configured
+            return None, self._dummy_explanation(prediction_result, sensor_data)
+
+        cache_key = explanation_signature(prediction_result, sensor_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._record(EVENT_CACHE_HIT)
+            return None, dict(cached)
+        return cache_key, None
+
+    def _explanation(self, result, prediction_result, sensor_data):
+        """Copy of a generated explanation, or the template when none was available"""
+        if result is None:
             return self._dummy_explanation(prediction_result, sensor_data)
-        
+        return dict(result)
+
+    def _explain_failed(self, error, prediction_result, sensor_data):
+        """Report a failed explanation on stderr and fall back to the template"""
+        # Safely handle error message to avoid encoding issues on Windows
+        try:
+            error_msg = str(error)
+        except:
+            error_msg = "Unknown error occurred"
         try:
-            risk = prediction_result.get('risk', 0)
-            importance = prediction_result.get('feature_importance', {})
-            
-            # Build prompt
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", "You are an expert industrial maintenance engineer analyzing machine sensor data."),
-                ("human", """Analyze this machine downtime risk prediction:
+            sys.stderr.write(f"Error generating AI explanation: {error_msg}\n")
+        except:
+            pass  # Silently fail if even stderr write fails
+        return self._dummy_explanation(prediction_result, sensor_data)
 
-Risk Score: {risk}%
-Sensor Readings:
-- Temperature: {temp}°C
-- Vibration: {vib} mm/s
-- Cycle Time: {cycle}s
-- Error Count: {errors}
+    def stream_explain(self, prediction_result, sensor_data):
+        """
+        Generate an AI explanation, yielding section text as the LLM produces it
 
-Key Contributing Factors:
-{factors}
+        Args:
+            prediction_result: Dict with 'risk' and 'feature_importance'
+            sensor_data: Dict with sensor readings
 
-Provide:
-1. Root Cause Analysis: What is likely causing the high downtime risk?
-2. Recommended Action: What should the operator do immediately?
+        Yields:
+            Dicts with 'event' 'root_cause' or 'recommended_action' and the new 'text',
+            then a final 'done' event carrying the full parsed explanation and its 'source'
+            ('llm', 'cache', 'store' or 'fallback')
+        """
+        def finished(result, source):
+            return dict(result, event='done', source=source)
 
-Keep responses concise (2-3 sentences each) and actionable.""")
-            ])
-            
-            # Format factors
-            factors_str = "\n".join([f"- {k}: {v:.1%}" for k, v in sorted(importance.items(), key=lambda x: x[1], reverse=True)[:3]])
-            
-            # Invoke LLM
-            chain = prompt | self.llm
-            response = chain.invoke({
-                "risk": risk,
-                "temp": sensor_data.get('temperature', 0),
-                "vib": sensor_data.get('vibration', 0),
-                "cycle": sensor_data.get('cycle_time', 0),
-                "errors": sensor_data.get('error_count', 0),
-                "factors": factors_str
-            })
-            
-            # Parse response
-            content = response.content if hasattr(response, 'content') else str(response)
-            
-            # Simple parsing (assumes format: Root Cause: ... Recommended Action: ...)
-            parts = content.split("Recommended Action:")
-            root_cause = parts[0].replace("Root Cause:", "").replace("Root Cause Analysis:", "").strip()
-            recommended_action = parts[1].strip() if len(parts) > 1 else "Monitor sensor readings and schedule maintenance."
-            
-            return {
-                'root_cause': root_cause,
-                'recommended_action': recommended_action
-            }
-            
+        def replay(result, source):
+            # Already complete: emit both sections at once
+            for section in ('root_cause', 'recommended_action'):
+                yield {'event': section, 'text': result[section]}
+            yield finished(result, source)
+
+        if not self.llm and not (LANGCHAIN_AVAILABLE and self.response_store.replay_only):
+            yield from replay(self._dummy_explanation(prediction_result, sensor_data), 'fallback')
+            return
+
+        cache_key = explanation_signature(prediction_result, sensor_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._record(EVENT_CACHE_HIT)
+            yield from replay(cached, 'cache')
+            return
+
+        started = time.perf_counter()
+        variables = self._prompt_variables(prediction_result, sensor_data)
+        rendered_prompt = self._render_prompt(variables)
+        content = self.response_store.get(rendered_prompt, self.model_name, self.model_params)
+        if content is not None:
+            self._record(EVENT_STORE_HIT)
+            result = self._parse_explanation(content)
+            self.cache.put(cache_key, result, time.perf_counter() - started)
+            yield from replay(result, 'store')
+            return
+
+        if self.response_store.replay_only or not self.breaker.allow_request():
+            yield from replay(self._dummy_explanation(prediction_result, sensor_data), 'fallback')
+            return
+
+        parser = ExplanationStreamParser()
+        started = time.perf_counter()
+        deadline_s = self.breaker.deadline_s
+        # The breaker admitted this call (possibly as the half-open probe), so every exit must
+        # settle it - including the client disconnecting mid-stream (GeneratorExit)
+        settled = False
+        try:
+            try:
+                self.breaker.record_call()
+                for chunk in self.chain.stream(variables):
+                    # A stalled read is bounded by the client's own timeout (also deadline_s);
+                    # this bounds a stream that keeps trickling chunks past the deadline
+                    if deadline_s and time.perf_counter() - started > deadline_s:
+                        raise TimeoutError(f"{self.breaker.name} stream exceeded {deadline_s}s deadline")
+                    text = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    for section, delta in parser.feed(text):
+                        yield {'event': section, 'text': delta}
+            except Exception as e:
+                if isinstance(e, TimeoutError):
+                    self.breaker.record_timeout()
+                else:
+                    self.breaker.record_failure()
+                settled = True
+                self._record(EVENT_ERROR, wall_s=time.perf_counter() - started, error=str(e))
+                # Safely handle error message to avoid encoding issues on Windows
+                try:
+                    error_msg = str(e)
+                except:
+                    error_msg = "Unknown error occurred"
+                import sys
+                try:
+                    sys.stderr.write(f"Error streaming AI explanation: {error_msg}\n")
+                except:
+                    pass  # Silently fail if even stderr write fails
+                # Sections already streamed are superseded by the fallback in the final event
+                yield finished(self._dummy_explanation(prediction_result, sensor_data), 'fallback')
+                return
+
+            elapsed = time.perf_counter() - started
+            self.breaker.record_success(elapsed)
+            settled = True
+            # Streaming responses carry no usage data, so tokens are estimated
+            self._record_call(rendered_prompt, parser.text, elapsed)
+            self.response_store.put(rendered_prompt, self.model_name, self.model_params, parser.text)
+            result = self._parse_explanation(parser.text)
+            self.cache.put(cache_key, result, elapsed)
+            yield finished(result, 'llm')
+        finally:
+            if not settled:
+                # Abandoned mid-stream: the provider was not at fault, only free the probe slot
+                self.breaker.release_probe()
+
+    def explain_batch(self, items, token_budget=None):
+        """
+        Generate explanations for many machines, several machines per LLM request
+
+        Args:
+            items: List of dicts with 'machine_id', 'prediction_result' and 'sensor_data'
+            token_budget: Prompt tokens allowed per request (defaults to LLM_BATCH_TOKEN_BUDGET)
+
+        Returns:
+            Dict of machine_id -> {'root_cause', 'recommended_action', 'source'}, where source is
+            'llm', 'cache', 'store' or 'fallback' (template explanation)
+        """
+        results = {}
+        pending = []
+        llm_ready = self.llm is not None or (LANGCHAIN_AVAILABLE and self.response_store.replay_only)
+        for item in items:
+            machine_id = str(item['machine_id'])
+            prediction_result, sensor_data = item['prediction_result'], item['sensor_data']
+            if not llm_ready:
+                results[machine_id] = dict(self._dummy_explanation(prediction_result, sensor_data, [machine_id]),
+                                           source='fallback')
+                continue
+            cache_key = explanation_signature(prediction_result, sensor_data)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._record(EVENT_CACHE_HIT, [machine_id])
+                results[machine_id] = dict(cached, source='cache')
+            else:
+                pending.append((machine_id, cache_key, prediction_result, sensor_data))
+
+        batches = self._pack_batches(pending, token_budget or self.batch_token_budget)
+        if len(batches) == 1:
+            results.update(self._explain_sub_batch(batches[0]))
+        elif batches:
+            with ThreadPoolExecutor(max_workers=min(len(batches), self.batch_concurrency)) as executor:
+                # Each worker runs in a copy of the caller's context so metrics keep the endpoint
+                futures = [executor.submit(contextvars.copy_context().run, self._explain_sub_batch, batch)
+                           for batch in batches]
+                for future in futures:
+                    results.update(future.result())
+        # Same order as the request
+        return {str(item['machine_id']): results[str(item['machine_id'])] for item in items}
+
+    def _machine_block(self, machine_id, prediction_result, sensor_data):
+        variables = self._prompt_variables(prediction_result, sensor_data)
+        variables['factors'] = variables['factors'].replace("\n- ", ", ").lstrip("- ") or "none"
+        return BATCH_MACHINE_BLOCK.format(machine_id=machine_id, **variables)
+
+    def _pack_batches(self, pending, token_budget):
+        """Greedily group machines so each request's prompt stays within the token budget"""
+        overhead = estimate_tokens(SYSTEM_PROMPT + BATCH_PROMPT)
+        batches, current, used = [], [], overhead
+        for entry in pending:
+            block = self._machine_block(entry[0], entry[2], entry[3])
+            # Output tokens scale with the number of machines too; budget roughly the same again
+            cost = estimate_tokens(block) * 2
+            if current and used + cost > token_budget:
+                batches.append(current)
+                current, used = [], overhead
+            current.append(entry + (block,))
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _explain_sub_batch(self, batch):
+        """One LLM request for a group of machines, with per-machine template fallback"""
+        started = time.perf_counter()
+        variables = {'count': len(batch), 'machines': "\n\n".join(entry[4] for entry in batch)}
+        parsed, source = {}, 'llm'
+        try:
+            rendered_prompt = "\n\n".join(
+                f"{m.type}: {m.content}" for m in self.batch_prompt.format_messages(**variables)
+            )
+            machine_ids = [entry[0] for entry in batch]
+            content = self.response_store.get(rendered_prompt, self.model_name, self.model_params)
+            if content is not None:
+                source = 'store'
+                self._record(EVENT_STORE_HIT, machine_ids)
+            elif not self.response_store.replay_only:
+                content = self._invoke_llm(self.batch_chain, variables, rendered_prompt, machine_ids)
+            if content is not None:
+                parsed = self._parse_batch_response(content)
+                # Only keep responses that parsed, so a malformed reply is retried next time
+                if parsed and source == 'llm':
+                    self.response_store.put(rendered_prompt, self.model_name, self.model_params, content)
+        except CircuitOpenError:
+            pass
         except Exception as e:
             # Safely handle error message to avoid encoding issues on Windows
             try:
@@ -132,25 +673,99 @@ Keep responses concise (2-3 sentences each) and actionable.""")
                 error_msg = "Unknown error occurred"
             import sys
             try:
-                sys.stderr.write(f"Error generating AI explanation: {error_msg}\n")
+                sys.stderr.write(f"Error generating batch AI explanation: {error_msg}\n")
             except:
                 pass  # Silently fail if even stderr write fails
-            return self._dummy_explanation(prediction_result, sensor_data)
-    
-    def _dummy_explanation(self, prediction_result, sensor_data):
-        """Fallback dummy explanation"""
-        risk = prediction_result.get('risk', 0)
-        importance = prediction_result.get('feature_importance', {})
-        
-        if importance:
-            top_feature = max(importance.items(), key=lambda x: x[1])
-            root_cause = f"High risk ({risk}%) detected. Primary concern: {top_feature[0]} is outside normal range. Temperature and vibration patterns suggest potential bearing wear or mechanical stress."
-            recommended_action = f"Inspect {top_feature[0]} immediately. Consider reducing machine load or scheduling preventive maintenance."
-        else:
-            root_cause = f"Downtime risk is {risk}%. Monitor sensor readings closely."
-            recommended_action = "Review sensor trends and schedule maintenance if risk continues to increase."
-        
+
+        latency = (time.perf_counter() - started) / max(len(batch), 1)
+        results = {}
+        for machine_id, cache_key, prediction_result, sensor_data, _ in batch:
+            explanation = parsed.get(machine_id)
+            if explanation:
+                self.cache.put(cache_key, explanation, latency)
+                results[machine_id] = dict(explanation, source=source)
+            else:
+                results[machine_id] = dict(self._dummy_explanation(prediction_result, sensor_data, [machine_id]),
+                                           source='fallback')
+        return results
+
+    def _parse_batch_response(self, content):
+        """
+        Parse a batch response into machine_id -> explanation
+
+        Returns:
+            Dict of complete entries only; machines missing from the reply are left out
+        """
+        match = re.search(r"\[.*\]", content, re.DOTALL)
+        if not match:
+            return {}
+        try:
+            entries = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        parsed = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            root_cause = str(entry.get('root_cause') or "").strip()
+            recommended_action = str(entry.get('recommended_action') or "").strip()
+            if entry.get('machine_id') is not None and root_cause:
+                parsed[str(entry['machine_id'])] = {
+                    'root_cause': root_cause,
+                    'recommended_action': recommended_action or DEFAULT_ACTION
+                }
+        return parsed
+
+    def explain_fast(self, prediction_result, sensor_data, history=None, enrich=True):
+        """
+        Rule-based explanation that never waits on the LLM
+
+        Args:
+            prediction_result: Dict with 'risk' and 'feature_importance'
+            sensor_data: Dict with sensor readings
+            history: Optional list of recent readings (oldest first) for trend direction
+            enrich: Queue a background LLM explanation, fetchable with get_explanation()
+
+        Returns:
+            Rule explanation dict (see RuleExplainer.explain) plus 'explanation_id' and
+            'enrichment' ('pending', 'rules_only', or 'skipped' when the enrichment queue is full)
+        """
+        result = self.rules.explain(prediction_result, sensor_data, history)
+        enrich = enrich and self.llm is not None
+        explanation_id, status = self.enrichment.submit(result, prediction_result, sensor_data, enrich)
+        return dict(result, explanation_id=explanation_id, enrichment=status)
+
+    def get_explanation(self, explanation_id):
+        """
+        Look up an explanation from explain_fast()
+
+        Returns:
+            Dict with 'status' ('pending', 'enriched', 'failed', 'rules_only' or 'skipped'), 'rules' and
+            'enriched' (LLM explanation once available), or None if unknown or expired
+        """
+        return self.enrichment.get(explanation_id)
+
+    def _enrich(self, prediction_result, sensor_data):
+        """LLM explanation for the enrichment queue; raises when only the template is available"""
+        cache_key = explanation_signature(prediction_result, sensor_data)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            self._record(EVENT_CACHE_HIT)
+            return dict(cached)
+        result = self.single_flight.do(
+            cache_key,
+            lambda: self._generate(cache_key, prediction_result, sensor_data),
+            timeout=self.coalesce_timeout_s
+        )
+        if result is None:
+            raise RuntimeError("No LLM explanation available")
+        return dict(result)
+
+    def _dummy_explanation(self, prediction_result, sensor_data, machine_ids=None):
+        """Fallback explanation composed by the rule engine"""
+        self._record(EVENT_FALLBACK, machine_ids)
+        result = self.rules.explain(prediction_result, sensor_data)
         return {
-            'root_cause': root_cause,
-            'recommended_action': recommended_action
+            'root_cause': result['root_cause'],
+            'recommended_action': result['recommended_action']
         }
@@ -0,0 +1,202 @@
+"""
+Alert Digest
+Buffer maintenance alerts for a short window and send them as one batched webhook payload,
+so a plant-wide incident runs the n8n workflow once instead of once per machine
+"""
+import os
+import time
+import uuid
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+
+from alert_suppression import SEVERITY_RANK
+
+# Severities sent on their own immediately instead of waiting for the next digest
+BYPASS_SEVERITIES = ('CRITICAL',)
+
+# Why a digest was sent
+FLUSH_SIZE = 'size'          # Reached max_items
+FLUSH_INTERVAL = 'interval'  # Oldest alert waited interval_s
+FLUSH_CLOSE = 'close'        # Shutdown or explicit flush()
+
+
+class AlertDigest:
+    """Collects alert payloads and hands them to flush_fn in batches from a background thread"""
+
+    def __init__(self, flush_fn, interval_s=None, max_items=None):
+        """
+        Args:
+            flush_fn: Callable(digest_payload) returning a result dict with 'success' (and
+                      optionally 'status_code', 'message', 'alert_id'); exceptions count as failures
+            interval_s: Longest time an alert waits in the buffer (defaults to ALERT_DIGEST_INTERVAL_S or 30)
+            max_items: Alerts per digest; a full buffer is sent at once (defaults to ALERT_DIGEST_MAX_ITEMS or 25)
+        """
+        self.flush_fn = flush_fn
+        self.interval_s = float(interval_s or os.getenv("ALERT_DIGEST_INTERVAL_S", 30))
+        self.max_items = max(int(max_items or os.getenv("ALERT_DIGEST_MAX_ITEMS", 25)), 1)
+        self._cond = threading.Condition()
+        self._alerts = []
+        self._full = deque()  # Batches that reached max_items, waiting for the worker
+        self._digest_id = None
+        self._opened = None
+        self._thread = None
+        self._closed = False
+        self.buffered = 0
+        self.digests = 0
+        self.failed = 0
+        self.alerts_sent = 0
+        self.flush_reasons = {FLUSH_SIZE: 0, FLUSH_INTERVAL: 0, FLUSH_CLOSE: 0}
+        self.last_flush = None
+        # Alerts still buffered when the process exits are sent rather than lost
+        atexit.register(self.close)
+
+    def add(self, payload):
+        """
+        Buffer an alert payload for the next digest
+
+        Returns:
+            Dict with 'digest_id' (of the digest the alert will be sent in), 'position'
+            (alerts in it so far) and 'flush_in_s' (latest time until it is sent)
+        """
+        with self._cond:
+            if self._digest_id is None:
+                self._digest_id = uuid.uuid4().hex
+                self._opened = time.monotonic()
+            self._alerts.append(payload)
+            self.buffered += 1
+            entry = {
+                'digest_id': self._digest_id,
+                'position': len(self._alerts),
+                'flush_in_s': round(max(self._opened + self.interval_s - time.monotonic(), 0.0), 1)
+            }
+            if len(self._alerts) >= self.max_items:
+                # Closed here rather than by the worker so a burst never exceeds max_items
+                self._full.append(self._take())
+                entry['flush_in_s'] = 0.0
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._worker, name="alert-digest", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return entry
+
+    def _take(self):
+        """Empty the buffer (caller holds the lock); returns (digest_id, alerts, window_s)"""
+        batch = (self._digest_id, self._alerts, time.monotonic() - self._opened)
+        self._alerts, self._digest_id, self._opened = [], None, None
+        return batch
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._full:
+                        batch, reason = self._full.popleft(), FLUSH_SIZE
+                        break
+                    if self._alerts:
+                        remaining = self._opened + self.interval_s - time.monotonic()
+                        if remaining <= 0:
+                            batch, reason = self._take(), FLUSH_INTERVAL
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self._send(*batch, reason=reason)
+
+    def _send(self, digest_id, alerts, window_s, reason):
+        """Build the digest payload and pass it to flush_fn (outside the lock)"""
+        payload = build_digest(digest_id, alerts, window_s)
+        try:
+            result = self.flush_fn(payload) or {}
+        except Exception as e:
+            result = {'success': False, 'message': f'Unexpected error: {str(e)}'}
+        with self._cond:
+            self.digests += 1
+            self.alerts_sent += len(alerts)
+            self.flush_reasons[reason] += 1
+            if not result.get('success'):
+                self.failed += 1
+            self.last_flush = {
+                'digest_id': digest_id,
+                'alerts': len(alerts),
+                'reason': reason,
+                'success': bool(result.get('success')),
+                'status_code': result.get('status_code'),
+                'alert_id': result.get('alert_id'),
+                'message': result.get('message'),
+                'at': datetime.now().isoformat()
+            }
+        return result
+
+    def flush(self):
+        """
+        Send whatever is buffered now, on the calling thread
+
+        Returns:
+            flush_fn's result for the last digest sent, or None if the buffer was empty
+        """
+        with self._cond:
+            batches = list(self._full)
+            self._full.clear()
+            if self._alerts:
+                batches.append(self._take())
+        result = None
+        for batch in batches:
+            result = self._send(*batch, reason=FLUSH_CLOSE)
+        return result
+
+    def close(self):
+        """Stop the background thread and send any buffered alerts"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+        self.flush()
+
+    def stats(self):
+        """Buffer state and batching counters"""
+        with self._cond:
+            return {
+                'interval_s': self.interval_s,
+                'max_items': self.max_items,
+                'bypass_severities': list(BYPASS_SEVERITIES),
+                'buffered_now': len(self._alerts) + sum(len(batch[1]) for batch in self._full),
+                'oldest_buffered_s': round(time.monotonic() - self._opened, 1) if self._opened is not None else None,
+                'alerts_buffered': self.buffered,
+                'digests_sent': self.digests,
+                'digests_failed': self.failed,
+                'alerts_sent': self.alerts_sent,
+                'avg_digest_size': round(self.alerts_sent / self.digests, 2) if self.digests else 0.0,
+                'webhook_calls_saved': self.alerts_sent - self.digests,
+                'flush_reasons': dict(self.flush_reasons),
+                'last_flush': dict(self.last_flush) if self.last_flush else None
+            }
+
+
+def build_digest(digest_id, alerts, window_s=0.0):
+    """
+    One webhook payload carrying several alerts
+
+    Every alert payload is kept whole under 'alerts' (error code, severity, sensor data, ...);
+    the top level summarizes the batch so the workflow can branch without looping first.
+    """
+    severities = [a.get('error_severity', 'UNKNOWN') for a in alerts]
+    error_codes = {}
+    for alert in alerts:
+        error_codes[alert.get('error_code')] = error_codes.get(alert.get('error_code'), 0) + 1
+    return {
+        'alert_type': 'maintenance_digest',
+        'digest_id': digest_id,
+        'timestamp': datetime.now().isoformat(),
+        'window_s': round(window_s, 1),
+        'alert_count': len(alerts),
+        'machines': sorted({str(a.get('machine_id', 'default')) for a in alerts}),
+        'highest_severity': max(severities, key=lambda s: SEVERITY_RANK.get(s, 1)) if severities else None,
+        'max_risk_score': max((a.get('risk_score', 0) for a in alerts), default=None),
+        'error_codes': error_codes,
+        'alerts': alerts
+    }
@@ -0,0 +1,322 @@
+"""
+Alert Outbox
+Durable SQLite queue of outgoing webhook alerts: callers enqueue and return immediately,
+background workers deliver with retries, exponential backoff and a dead-letter state
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import sqlite3
+import threading
+
+# Alert states
+STATUS_PENDING = 'pending'        # Waiting for its (next) delivery attempt
+STATUS_DELIVERING = 'delivering'  # Claimed by a worker
+STATUS_DELIVERED = 'delivered'
+STATUS_DEAD = 'dead'              # Out of attempts, or rejected in a way retrying cannot fix
+
+# Client errors that are worth retrying (timeouts, rate limiting); other 4xx go straight to dead
+RETRYABLE_STATUS_CODES = (408, 425, 429)
+
+# Longest stored webhook response text
+MAX_RESPONSE_CHARS = 10000
+
+
+def _default_outbox_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'data', 'alert_outbox.db')
+
+
+class AlertOutbox:
+    """SQLite-backed alert queue delivered by background worker threads"""
+
+    def __init__(self, send_fn, path=None, workers=None, max_attempts=None, base_delay_s=None,
+                 max_delay_s=None, lease_s=None, retention_s=None, poll_interval_s=1.0, on_dead=None):
+        """
+        Args:
+            send_fn: Callable(payload) returning a result dict with 'success' and optionally
+                     'status_code', 'response' and 'message'; exceptions count as failed attempts
+            path: SQLite database file (defaults to ALERT_OUTBOX_PATH or data/alert_outbox.db)
+            workers: Delivery threads (defaults to ALERT_OUTBOX_WORKERS or 2)
+            max_attempts: Attempts before an alert is dead-lettered (defaults to ALERT_OUTBOX_MAX_ATTEMPTS or 8)
+            base_delay_s: Delay before the first retry, doubled on every further one
+                          (defaults to ALERT_OUTBOX_BASE_DELAY_S or 2)
+            max_delay_s: Cap on the retry delay (defaults to ALERT_OUTBOX_MAX_DELAY_S or 300)
+            lease_s: Seconds after which an alert claimed by a worker that never reported back
+                     (e.g. its process died) is delivered again (defaults to ALERT_OUTBOX_LEASE_S or 120)
+            retention_s: Age after which delivered and dead alerts are deleted
+                         (defaults to ALERT_OUTBOX_RETENTION_S or 7 days)
+            poll_interval_s: Longest idle wait between checks for alerts enqueued by other processes
+            on_dead: Optional callable(payload) run by the worker after it dead-letters an alert,
+                     e.g. so a sender's cool-down does not hold back the next alert
+        """
+        self.send_fn = send_fn
+        self.path = path or os.getenv("ALERT_OUTBOX_PATH") or _default_outbox_path()
+        self.workers = int(workers or os.getenv("ALERT_OUTBOX_WORKERS", 2))
+        self.max_attempts = int(max_attempts or os.getenv("ALERT_OUTBOX_MAX_ATTEMPTS", 8))
+        self.base_delay_s = float(base_delay_s or os.getenv("ALERT_OUTBOX_BASE_DELAY_S", 2))
+        self.max_delay_s = float(max_delay_s or os.getenv("ALERT_OUTBOX_MAX_DELAY_S", 300))
+        self.lease_s = float(lease_s or os.getenv("ALERT_OUTBOX_LEASE_S", 120))
+        self.retention_s = float(retention_s or os.getenv("ALERT_OUTBOX_RETENTION_S", 7 * 86400))
+        self.poll_interval_s = poll_interval_s
+        self.on_dead = on_dead
+        self._local = threading.local()
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._closed = False
+        self._last_prune = 0.0
+        self._stats_lock = threading.Lock()
+        self.enqueued = 0
+        self.attempts = 0
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                alert_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                next_attempt REAL NOT NULL,
+                claimed_at REAL,
+                delivered_at REAL,
+                status_code INTEGER,
+                response TEXT,
+                last_error TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_due ON alerts (status, next_attempt)")
+        # Alerts left undelivered by an earlier run are picked up without waiting for a new one
+        if conn.execute("SELECT 1 FROM alerts WHERE status IN (?, ?) LIMIT 1",
+                        (STATUS_PENDING, STATUS_DELIVERING)).fetchone():
+            self._start_workers()
+
+    def _connection(self):
+        """One connection per thread; WAL lets the API, dashboard and workers share the file"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=10.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _start_workers(self):
+        """Start the delivery threads on first use"""
+        if self._threads or self._closed:
+            return
+        with self._wakeup:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"alert-outbox-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, payload, alert_id=None):
+        """
+        Durably queue an alert payload for delivery
+
+        Args:
+            payload: JSON-serializable webhook payload
+            alert_id: ID to store it under (defaults to a new random one)
+
+        Returns:
+            Alert ID
+        """
+        alert_id = alert_id or uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO alerts (alert_id, payload, status, created, updated, next_attempt) VALUES (?, ?, ?, ?, ?, ?)",
+            (alert_id, json.dumps(payload, default=str), STATUS_PENDING, now, now, now)
+        )
+        with self._stats_lock:
+            self.enqueued += 1
+        self._start_workers()
+        with self._wakeup:
+            self._wakeup.notify()
+        return alert_id
+
+    def _claim(self):
+        """
+        Atomically take the oldest due alert (or one whose claim lease expired)
+
+        Returns:
+            (alert_id, payload, attempts) or None
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT alert_id, payload, attempts FROM alerts "
+                "WHERE (status = ? AND next_attempt <= ?) OR (status = ? AND claimed_at <= ?) "
+                "ORDER BY next_attempt LIMIT 1",
+                (STATUS_PENDING, now, STATUS_DELIVERING, now - self.lease_s)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE alerts SET status = ?, claimed_at = ?, updated = ?, attempts = attempts + 1 WHERE alert_id = ?",
+                    (STATUS_DELIVERING, now, now, row[0])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), row[2] + 1
+
+    def _next_due_in(self):
+        """Seconds until the next pending alert is due (capped at the poll interval)"""
+        row = self._connection().execute(
+            "SELECT MIN(next_attempt) FROM alerts WHERE status = ?", (STATUS_PENDING,)
+        ).fetchone()
+        if row is None or row[0] is None:
+            return self.poll_interval_s
+        return min(max(row[0] - time.time(), 0.0), self.poll_interval_s)
+
+    def backoff(self, attempts):
+        """Delay before the next attempt after `attempts` failed ones (exponential, with jitter)"""
+        delay = min(self.base_delay_s * (2 ** (attempts - 1)), self.max_delay_s)
+        # Jitter spreads retries of alerts that failed together (e.g. during an n8n outage)
+        return delay * random.uniform(0.8, 1.2)
+
+    def _deliver(self, alert_id, payload, attempts):
+        try:
+            result = self.send_fn(payload) or {}
+        except Exception as e:
+            result = {'success': False, 'message': f'Unexpected error: {str(e)}'}
+        status_code = result.get('status_code')
+        response = result.get('response')
+        if response is not None:
+            response = str(response)[:MAX_RESPONSE_CHARS]
+        now = time.time()
+
+        if result.get('success'):
+            status, next_attempt, error = STATUS_DELIVERED, now, None
+        else:
+            error = result.get('message') or 'Delivery failed'
+            permanent = (status_code is not None and 400 <= status_code < 500
+                         and status_code not in RETRYABLE_STATUS_CODES)
+            if permanent or attempts >= self.max_attempts:
+                status, next_attempt = STATUS_DEAD, now
+            else:
+                status, next_attempt = STATUS_PENDING, now + self.backoff(attempts)
+
+        self._connection().execute(
+            "UPDATE alerts SET status = ?, updated = ?, next_attempt = ?, claimed_at = NULL, "
+            "delivered_at = ?, status_code = ?, response = ?, last_error = ? WHERE alert_id = ?",
+            (status, now, next_attempt, now if status == STATUS_DELIVERED else None,
+             status_code, response, error, alert_id)
+        )
+        with self._stats_lock:
+            self.attempts += 1
+            if status == STATUS_DELIVERED:
+                self.delivered += 1
+            elif status == STATUS_DEAD:
+                self.dead += 1
+            else:
+                self.retried += 1
+        if status == STATUS_DEAD and self.on_dead is not None:
+            try:
+                self.on_dead(payload)
+            except Exception as e:
+                # Safely handle error message to avoid encoding issues on Windows
+                try:
+                    error_msg = str(e)
+                except:
+                    error_msg = "Unknown error occurred"
+                try:
+                    sys.stderr.write(f"Error handling dead-lettered alert {alert_id}: {error_msg}\n")
+                except:
+                    pass  # Silently fail if even stderr write fails
+
+    def _prune(self):
+        """Delete finished alerts past their retention (at most once a minute)"""
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        self._connection().execute(
+            "DELETE FROM alerts WHERE status IN (?, ?) AND updated < ?",
+            (STATUS_DELIVERED, STATUS_DEAD, now - self.retention_s)
+        )
+
+    def _worker(self):
+        while not self._closed:
+            try:
+                claimed = self._claim()
+                if claimed is not None:
+                    self._deliver(*claimed)
+                    continue
+                self._prune()
+                wait_s = self._next_due_in()
+            except sqlite3.Error:
+                wait_s = self.poll_interval_s  # Database busy or briefly unavailable
+            with self._wakeup:
+                if not self._closed:
+                    self._wakeup.wait(wait_s)
+
+    def get(self, alert_id):
+        """Delivery state of an alert, or None if unknown (or past retention)"""
+        row = self._connection().execute(
+            "SELECT alert_id, status, attempts, created, updated, next_attempt, delivered_at, "
+            "status_code, response, last_error, payload FROM alerts WHERE alert_id = ?",
+            (alert_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        alert = dict(zip(
+            ('alert_id', 'status', 'attempts', 'created', 'updated', 'next_attempt', 'delivered_at',
+             'status_code', 'response', 'last_error'),
+            row[:-1]
+        ))
+        if alert['status'] != STATUS_PENDING:
+            alert['next_attempt'] = None
+        alert['payload'] = json.loads(row[-1])
+        return alert
+
+    def stats(self):
+        """Alerts per state in the outbox plus this process's delivery counters"""
+        counts = {status: 0 for status in (STATUS_PENDING, STATUS_DELIVERING, STATUS_DELIVERED, STATUS_DEAD)}
+        oldest_pending_s = None
+        try:
+            conn = self._connection()
+            for status, count in conn.execute("SELECT status, COUNT(*) FROM alerts GROUP BY status"):
+                counts[status] = count
+            row = conn.execute("SELECT MIN(created) FROM alerts WHERE status = ?", (STATUS_PENDING,)).fetchone()
+            if row and row[0] is not None:
+                oldest_pending_s = round(time.time() - row[0], 1)
+        except sqlite3.Error:
+            pass
+        with self._stats_lock:
+            return {
+                'path': self.path,
+                'workers': self.workers,
+                'alerts': counts,
+                'oldest_pending_s': oldest_pending_s,
+                'enqueued': self.enqueued,
+                'attempts': self.attempts,
+                'delivered': self.delivered,
+                'retried': self.retried,
+                'dead': self.dead
+            }
+
+    def close(self, timeout=5.0):
+        """Stop the workers (queued alerts stay in the database for the next start)"""
+        self._closed = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
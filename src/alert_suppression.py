@@ -0,0 +1,182 @@
+"""
+Alert Suppression
+Send one maintenance alert per machine and error code, then stay quiet for a cool-down window
+unless severity escalates; an alert only clears once risk has stayed low for a while
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from error_codes import ErrorCodes
+
+# Order of ErrorCodes.SEVERITY levels; a new alert above a machine's active level is an escalation
+SEVERITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'UNKNOWN': 1, 'HIGH': 2, 'CRITICAL': 3}
+
+# Seconds before an alert that is still active is sent again, per severity
+DEFAULT_COOLDOWNS = {
+    'CRITICAL': 300,
+    'HIGH': 900,
+    'MEDIUM': 1800,
+    'LOW': 3600
+}
+
+# Decisions
+DECISION_NEW = 'new'              # First alert of this code since the machine last cleared
+DECISION_ESCALATED = 'escalated'  # Higher severity than anything active on the machine
+DECISION_RENOTIFY = 'renotify'    # Still active after its cool-down
+DECISION_SUPPRESSED = 'suppressed'
+
+
+def _env_cooldowns():
+    raw = os.getenv("ALERT_COOLDOWNS")
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class AlertSuppressor:
+    """Thread-safe per-machine alert state: cool-downs, escalation and hysteresis clearing"""
+
+    def __init__(self, cooldowns=None, clear_risk=None, clear_after_s=None, max_machines=None):
+        """
+        Args:
+            cooldowns: Dict of severity -> seconds merged over DEFAULT_COOLDOWNS
+                       (defaults to ALERT_COOLDOWNS, a JSON object of the same shape)
+            clear_risk: Risk below which a machine starts clearing; readings between this and
+                        the alert threshold neither alert nor clear (defaults to ALERT_CLEAR_RISK or 65)
+            clear_after_s: Seconds risk must stay below clear_risk before the machine's alerts
+                           clear and the next one is sent at once (defaults to ALERT_CLEAR_AFTER_S or 60)
+            max_machines: Machines tracked before the least recently alerting is dropped
+                          (defaults to ALERT_SUPPRESSION_MAX_MACHINES or 1000)
+        """
+        self.cooldowns = dict(DEFAULT_COOLDOWNS)
+        self.cooldowns.update(cooldowns or _env_cooldowns() or {})
+        self.clear_risk = float(os.getenv("ALERT_CLEAR_RISK", 65) if clear_risk is None else clear_risk)
+        self.clear_after_s = float(os.getenv("ALERT_CLEAR_AFTER_S", 60) if clear_after_s is None else clear_after_s)
+        self.max_machines = int(max_machines or os.getenv("ALERT_SUPPRESSION_MAX_MACHINES", 1000))
+        self._machines = OrderedDict()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.sent = {DECISION_NEW: 0, DECISION_ESCALATED: 0, DECISION_RENOTIFY: 0}
+        self.suppressed = 0
+        self.cleared = 0
+
+    def cooldown_s(self, severity):
+        return float(self.cooldowns.get(severity, self.cooldowns.get('HIGH', 900)))
+
+    def check(self, machine_id, error_code, now=None):
+        """
+        Decide whether an alert should be sent, and record it
+
+        Args:
+            machine_id: Machine the alert is for
+            error_code: Alert error code (its ErrorCodes.SEVERITY sets cool-down and escalation)
+            now: Current time (defaults to time.time())
+
+        Returns:
+            Dict with 'send', 'decision' (new, escalated, renotify or suppressed), 'severity',
+            'suppressed_count' (alerts held back for this machine and code since it was last
+            sent) and 'last_sent_s' (seconds since then, None for a new alert)
+        """
+        now = time.time() if now is None else now
+        severity = ErrorCodes.SEVERITY.get(error_code, 'UNKNOWN')
+        rank = SEVERITY_RANK.get(severity, 1)
+        with self._lock:
+            self.checks += 1
+            machine = self._machines.get(machine_id)
+            if machine is None:
+                machine = self._machines[machine_id] = {'alerts': {}, 'below_since': None}
+            self._machines.move_to_end(machine_id)
+            while len(self._machines) > self.max_machines:
+                self._machines.popitem(last=False)
+            # An alert-level reading interrupts clearing
+            machine['below_since'] = None
+
+            alerts = machine['alerts']
+            entry = alerts.get(error_code)
+            active_rank = max((SEVERITY_RANK.get(a['severity'], 1) for a in alerts.values()), default=-1)
+            if entry is None:
+                decision = DECISION_ESCALATED if alerts and rank > active_rank else DECISION_NEW
+            elif now - entry['last_sent'] >= self.cooldown_s(severity):
+                decision = DECISION_RENOTIFY
+            else:
+                decision = DECISION_SUPPRESSED
+
+            if decision == DECISION_SUPPRESSED:
+                entry['suppressed'] += 1
+                self.suppressed += 1
+                return {
+                    'send': False,
+                    'decision': decision,
+                    'severity': severity,
+                    'suppressed_count': entry['suppressed'],
+                    'last_sent_s': round(now - entry['last_sent'], 1),
+                    'cooldown_s': self.cooldown_s(severity)
+                }
+
+            held_back = entry['suppressed'] if entry else 0
+            last_sent_s = round(now - entry['last_sent'], 1) if entry else None
+            alerts[error_code] = {'severity': severity, 'last_sent': now, 'suppressed': 0}
+            self.sent[decision] += 1
+            return {
+                'send': True,
+                'decision': decision,
+                'severity': severity,
+                'suppressed_count': held_back,
+                'last_sent_s': last_sent_s,
+                'cooldown_s': self.cooldown_s(severity)
+            }
+
+    def observe(self, machine_id, risk_score, now=None):
+        """
+        Record a below-alert-threshold reading; clears the machine's alerts once risk has
+        stayed under clear_risk for clear_after_s
+
+        Returns:
+            True if the machine's alerts were cleared by this reading
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            machine = self._machines.get(machine_id)
+            if machine is None or not machine['alerts']:
+                return False
+            if risk_score >= self.clear_risk:
+                machine['below_since'] = None
+                return False
+            if machine['below_since'] is None:
+                machine['below_since'] = now
+            if now - machine['below_since'] < self.clear_after_s:
+                return False
+            del self._machines[machine_id]
+            self.cleared += 1
+            return True
+
+    def discard(self, machine_id, error_code):
+        """Forget a sent alert (e.g. its delivery failed) so the next one is sent at once"""
+        with self._lock:
+            machine = self._machines.get(machine_id)
+            if machine is not None:
+                machine['alerts'].pop(error_code, None)
+
+    def stats(self):
+        """Suppression metrics"""
+        with self._lock:
+            sent = sum(self.sent.values())
+            return {
+                'machines': len(self._machines),
+                'active_alerts': sum(len(m['alerts']) for m in self._machines.values()),
+                'cooldowns_s': self.cooldowns,
+                'clear_risk': self.clear_risk,
+                'clear_after_s': self.clear_after_s,
+                'checks': self.checks,
+                'sent': dict(self.sent),
+                'suppressed': self.suppressed,
+                'suppressed_rate': round(self.suppressed / self.checks, 4) if self.checks else 0.0,
+                'cleared': self.cleared,
+                'sent_total': sent
+            }
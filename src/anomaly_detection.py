@@ -0,0 +1,282 @@
+"""
+Anomaly Detection
+Vectorized rolling z-score, EWMA control chart and CUSUM change-point detection over
+every sensor in a history window - no LLM involved
+"""
+from functools import lru_cache
+
+import numpy as np
+
+try:
+    from scipy.signal import lfilter
+except ImportError:  # scipy comes with scikit-learn; the numpy fallback is slower but equivalent
+    lfilter = None
+
+from trend_stats import SensorWindow
+
+SENSOR_LABELS = {
+    'temperature': ('Temperature', '°C'),
+    'vibration': ('Vibration', ' mm/s'),
+    'cycle_time': ('Cycle time', 's'),
+    'error_count': ('Error count', ''),
+    'pressure': ('Pressure', ' kPa'),
+    'humidity': ('Humidity', '%'),
+    'power': ('Power', ' W'),
+    'production': ('Production rate', '%')
+}
+
+# Detector settings
+ZSCORE_WINDOW = 20        # Trailing readings the current value is compared against
+# Limits are wider than the textbook 3-sigma / L=3 / h=5 because a 1000-reading window over
+# eight sensors would otherwise raise several false alarms on pure noise
+ZSCORE_THRESHOLD = 4.5
+EWMA_LAMBDA = 0.2
+EWMA_L = 4.0              # Control limit width in EWMA standard deviations
+CUSUM_K = 0.5             # Allowance, in baseline standard deviations
+CUSUM_H = 10.0            # Decision interval, in baseline standard deviations
+MIN_READINGS = 8
+# Quartile spread of a normal distribution, in standard deviations
+_IQR_SIGMA = 1.349
+
+# EWMA is evaluated in blocks small enough that (1 - lambda)^-block stays well inside float range
+_EWMA_BLOCK = 64
+
+
+def _baseline(values, has_missing=False):
+    """Per-sensor median and quartile-based sigma from one partition, mean and std where they tie"""
+    n = len(values)
+    if has_missing:
+        low, center, high = np.nanquantile(values, (0.25, 0.5, 0.75), axis=0)
+    else:
+        q1, q3, half = (n - 1) // 4, n - 1 - (n - 1) // 4, n // 2
+        part = np.partition(values, sorted({q1, half - 1, half, q3}), axis=0)
+        low, high = part[q1], part[q3]
+        center = part[half] if n % 2 else 0.5 * (part[half - 1] + part[half])
+    sigma = (high - low) / _IQR_SIGMA
+    degenerate = np.flatnonzero(~((low < center) & (center < high)))
+    if len(degenerate):
+        # A quarter of the readings equal to the median (e.g. error counts that are mostly 0): the
+        # quartiles describe the ties rather than the spread, so use the mean and std instead
+        subset = values[:, degenerate]
+        center[degenerate] = np.nanmean(subset, axis=0) if has_missing else subset.mean(axis=0)
+        sigma[degenerate] = np.nanstd(subset, axis=0) if has_missing else subset.std(axis=0)
+    # Floor relative to the signal level so constant sensors do not produce infinite scores
+    floor = np.maximum(np.abs(center) * 1e-3, 1e-6)
+    return center, np.maximum(np.nan_to_num(sigma), floor)
+
+
+def rolling_zscore(values, window=ZSCORE_WINDOW, min_sigma=None, threshold=None):
+    """
+    z-score of each reading against the mean and std of the preceding `window` readings
+
+    Args:
+        values: Float array (n, k) without NaN
+        window: Trailing window length
+        min_sigma: Per-sensor lower bound on the rolling std
+        threshold: Only score readings that can exceed this |z| (needs min_sigma); others stay 0
+
+    Returns:
+        Float array (n, k); the first `window` rows are 0
+    """
+    n = len(values)
+    z = np.zeros_like(values)
+    if n <= window:
+        return z
+    # Centre first so the running sums do not lose precision on large readings
+    values = values - values[:window].mean(axis=0)
+    cs = np.empty((n + 1, values.shape[1]))
+    cs[0] = 0.0
+    np.cumsum(values, axis=0, out=cs[1:])
+    # Mean of rows t-window .. t-1 for every t >= window
+    deviation = values[window:] - (cs[window:n] - cs[:n - window]) / window
+
+    if threshold is not None and min_sigma is not None:
+        rows, cols = np.nonzero(np.abs(deviation) > threshold * min_sigma)
+        if not len(rows):
+            return z
+        # Gather each candidate's trailing window and take its std directly
+        trailing = values[rows[:, None] + np.arange(window), cols[:, None]]
+        std = np.maximum(trailing.std(axis=1, ddof=1), min_sigma[cols])
+        z[rows + window, cols] = deviation[rows, cols] / np.where(std > 0, std, np.inf)
+        return z
+
+    cs2 = np.empty((n + 1, values.shape[1]))
+    cs2[0] = 0.0
+    np.cumsum(values * values, axis=0, out=cs2[1:])
+    mean = (cs[window:n] - cs[:n - window]) / window
+    var = np.maximum((cs2[window:n] - cs2[:n - window]) / window - mean * mean, 0.0)
+    std = np.sqrt(var * window / (window - 1))
+    if min_sigma is not None:
+        std = np.maximum(std, min_sigma)
+    z[window:] = deviation / np.where(std > 0, std, np.inf)
+    return z
+
+
+def ewma(values, lam=EWMA_LAMBDA, start=None):
+    """
+    Exponentially weighted moving average of every column, z_t = lam*x_t + (1-lam)*z_{t-1}
+
+    Args:
+        values: Float array (n, k)
+        lam: Smoothing weight of the newest reading
+        start: Initial value per column (defaults to the first row)
+
+    Returns:
+        Float array (n, k)
+    """
+    n, k = values.shape
+    out = np.empty_like(values)
+    if not n:
+        return out
+    a = 1.0 - lam
+    prev = np.array(values[0] if start is None else start, dtype=float)
+    if lfilter is not None:
+        return lfilter([lam], [1.0, -a], values, axis=0, zi=(a * prev)[None, :])[0]
+    j = np.arange(_EWMA_BLOCK, dtype=float)[:, None]
+    pow_j = a ** j
+    pow_neg = a ** -j
+    # Blockwise closed form: z_{b+j} = a^(j+1) z_b + lam * a^j * sum_{i<=j} a^-i x_{b+i}
+    for b in range(0, n, _EWMA_BLOCK):
+        block = values[b:b + _EWMA_BLOCK]
+        m = len(block)
+        acc = np.cumsum(block * pow_neg[:m], axis=0)
+        out[b:b + m] = a * pow_j[:m] * prev + lam * pow_j[:m] * acc
+        prev = out[b + m - 1]
+    return out
+
+
+def cusum(standardized, k=CUSUM_K):
+    """Two-sided tabular CUSUM of standardized values, as (upper, lower) float arrays (n, k)"""
+    # C_t = max(0, C_{t-1} + s_t - k) is S_t - min(0, min_{j<=t} S_j) for S the running sum of s - k
+    total = np.cumsum(standardized, axis=0)
+    drift = k * np.arange(1, len(standardized) + 1, dtype=float)[:, None]
+    up = total - drift
+    upper = up - np.minimum(np.minimum.accumulate(up, axis=0), 0.0)
+    down = -total - drift
+    lower = down - np.minimum(np.minimum.accumulate(down, axis=0), 0.0)
+    return upper, lower
+
+
+@lru_cache(maxsize=32)
+def _ewma_sd(n, lam):
+    """Standard deviation of the EWMA after each of n unit-variance readings, an (n, 1) array"""
+    t = np.arange(1, n + 1, dtype=float)[:, None]
+    sd = np.sqrt(lam / (2 - lam) * (1 - (1 - lam) ** (2 * t)))
+    sd.flags.writeable = False
+    return sd
+
+
+def _runs(flags, gap=0):
+    """(column, start, end) for every run of True rows, end exclusive, merging runs at most `gap` rows apart"""
+    cols, rows = np.nonzero(flags.T)
+    if not len(rows):
+        return zip((), (), ())
+    # A run starts at the first flag of a column or after more than `gap` unflagged rows
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = (cols[1:] != cols[:-1]) | (rows[1:] - rows[:-1] > gap + 1)
+    last = np.append(first[1:], True)
+    return zip(cols[first].tolist(), rows[first].tolist(), (rows[last] + 1).tolist())
+
+
+def detect_anomalies(sensor_history, sensors=None, zscore_window=ZSCORE_WINDOW,
+                     zscore_threshold=ZSCORE_THRESHOLD, ewma_lambda=EWMA_LAMBDA, ewma_l=EWMA_L,
+                     cusum_k=CUSUM_K, cusum_h=CUSUM_H, max_anomalies=50):
+    """
+    Detect anomalies over a whole history window
+
+    Three detectors run on every sensor column at once:
+    - rolling z-score: a reading far from its trailing window (spikes)
+    - EWMA control chart: the smoothed level drifts outside its control limits (sustained shifts)
+    - CUSUM: accumulated deviation from the baseline crosses the decision interval (change points)
+
+    Consecutive flagged readings form one anomaly, reported at its most extreme reading.
+
+    Args:
+        sensor_history: List of reading dicts, DataFrame, dict of column arrays or SensorWindow
+        sensors: Sensor names (defaults to all eight sensors)
+        max_anomalies: Highest-scoring anomalies returned
+
+    Returns:
+        List of dicts with 'sensor', 'method', 'direction', 'index', 'start_index', 'end_index',
+        'timestamp', 'value', 'baseline', 'magnitude' (value - baseline, in sensor units) and
+        'score' (|z|, or statistic relative to its limit), sorted by score
+    """
+    window = SensorWindow.from_history(sensor_history, sensors)
+    values, names = window.values, window.names
+    n = len(values)
+    if n < MIN_READINGS or not names:
+        return []
+
+    # Fill gaps with the column median so the cumulative detectors stay defined
+    missing = np.isnan(values)
+    has_missing = bool(missing.any())
+    center, sigma = _baseline(values, has_missing)
+    if has_missing:
+        values = np.where(missing, center, values)
+
+    standardized = (values - center) / sigma
+
+    # Rolling z-score (spikes relative to the recent past). The score does not depend on a
+    # column's scale, so it runs on the standardized readings
+    z = rolling_zscore(standardized, zscore_window, min_sigma=np.ones(len(names)), threshold=zscore_threshold)
+    z_score = np.abs(z)
+    z_flags = z_score > zscore_threshold
+
+    # EWMA control chart around the robust baseline
+    smoothed = ewma(standardized, ewma_lambda, start=np.zeros(len(names)))
+    ewma_score = np.abs(smoothed) / (ewma_l * _ewma_sd(n, ewma_lambda))
+    ewma_flags = ewma_score > 1.0
+
+    # CUSUM change points
+    upper, lower = cusum(standardized, cusum_k)
+    cusum_score = np.maximum(upper, lower) / cusum_h
+    cusum_flags = cusum_score > 1.0
+
+    anomalies = []
+    for method, flags, score in (('zscore', z_flags, z_score),
+                                 ('ewma', ewma_flags, ewma_score),
+                                 ('cusum', cusum_flags, cusum_score)):
+        if not flags.any():
+            continue
+        for col, start, end in _runs(flags, gap=0 if method == 'zscore' else zscore_window):
+            peak = start + int(np.argmax(score[start:end, col]))
+            if method == 'cusum':
+                # The change started where the statistic last left zero
+                stat = upper if upper[peak, col] >= lower[peak, col] else lower
+                zeros = np.flatnonzero(stat[:start, col] <= 0)
+                change_start = int(zeros[-1]) + 1 if len(zeros) else 0
+                direction = 'increase' if stat is upper else 'decrease'
+            else:
+                change_start = start
+                signed = z[peak, col] if method == 'zscore' else smoothed[peak, col]
+                direction = 'increase' if signed > 0 else 'decrease'
+            value = float(values[peak, col])
+            anomalies.append({
+                'sensor': names[col],
+                'method': method,
+                'direction': direction,
+                'index': int(peak),
+                'start_index': int(change_start),
+                'end_index': int(end - 1),
+                'timestamp': window.timestamp(peak),
+                'value': round(value, 4),
+                'baseline': round(float(center[col]), 4),
+                'magnitude': round(value - float(center[col]), 4),
+                'score': round(float(score[peak, col]), 3)
+            })
+
+    anomalies.sort(key=lambda a: a['score'], reverse=True)
+    return anomalies[:max_anomalies]
+
+
+def describe_anomaly(anomaly):
+    """One-line human readable description of a detected anomaly"""
+    label, unit = SENSOR_LABELS.get(anomaly['sensor'], (anomaly['sensor'], ''))
+    kind = {
+        'zscore': 'spike',
+        'ewma': 'sustained shift',
+        'cusum': 'change point'
+    }[anomaly['method']]
+    where = f" at {anomaly['timestamp']}" if anomaly.get('timestamp') else f" at reading {anomaly['index']}"
+    return (f"{label} {kind} ({anomaly['direction']}){where}: {anomaly['value']:.2f}{unit}, "
+            f"{anomaly['magnitude']:+.2f}{unit} vs baseline, score {anomaly['score']:.1f}")
@@ -2,9 +2,10 @@
 FastAPI Backend - Complete API for Factory Copilot
 Provides all endpoints needed to replace Streamlit UI
 """
-from fastapi import FastAPI, HTTPException, Body, Request
+from fastapi import FastAPI, HTTPException, Body, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -12,6 +13,9 @@ from datetime import datetime
 import os
 import sys
 import re
+import json
+import asyncio
+import hashlib
 
 # Add src directory to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -23,6 +27,10 @@ from ai_explainer import AIExplainer
 from gemini_analyzer import GeminiAnalyzer
 from automation import AutomationTrigger
 from error_codes import determine_error_code, ErrorCodes
+from sensor_store import SensorStore, to_epoch_seconds
+from shared_ring import open_shared_ring, encode_machine_id
+from llm_metrics import get_llm_metrics, set_llm_endpoint, llm_call_context
+from trend_jobs import TrendJobQueue, QueueFullError, FINISHED_STATES
 import uvicorn
 
 # Initialize FastAPI app
@@ -70,6 +78,13 @@ predictor.train()
 ai_explainer = AIExplainer()
 gemini_analyzer = GeminiAnalyzer()
 automation = AutomationTrigger()
+sensor_store = SensorStore()
+# Recent readings shared by all worker processes (None if shared memory is unavailable)
+recent_readings = open_shared_ring()
+# Bound on LLM calls awaited at once by the async endpoints; further requests queue as coroutines
+llm_semaphore = asyncio.Semaphore(int(os.getenv("LLM_MAX_CONCURRENCY", 64)))
+# Queued trend analyses, fetched later by job ID
+trend_jobs = TrendJobQueue(lambda history: _analyze_trend_job(history))
 
 # Import LiveSensorGenerator from app.py logic
 import numpy as np
@@ -145,10 +160,51 @@ class AIExplanationResponse(BaseModel):
     root_cause: str
     recommended_action: str
 
+class BatchExplanationItem(BaseModel):
+    machine_id: str
+    prediction: PredictionResponse
+    sensor_data: SensorData
+
+class BatchExplanationResult(BaseModel):
+    machine_id: str
+    root_cause: str
+    recommended_action: str
+    source: str
+
+class RuleExplanationRequest(BaseModel):
+    prediction: PredictionResponse
+    sensor_data: SensorData
+    history: Optional[List[SensorReading]] = None
+    enrich: bool = True
+
 class TrendAnalysisResponse(BaseModel):
     summary: str
     anomalies: List[str]
+    anomaly_details: Optional[List[Dict[str, Any]]] = None
+    trends: Optional[Dict[str, Any]] = None
     status: str
+    reused_age_s: Optional[float] = None
+
+class FleetDigestRequest(BaseModel):
+    machines: Dict[str, List[SensorReading]]
+    top_k: Optional[int] = None
+
+class FleetDigestResponse(BaseModel):
+    summary: str
+    machines: List[Dict[str, Any]]
+    ranking: List[Dict[str, Any]]
+    fleet: Dict[str, Any]
+    machine_count: int
+    flagged: int
+    skipped: List[str]
+    status: str
+
+class TrendJobRequest(BaseModel):
+    history: Optional[List[SensorReading]] = None
+    machine_id: Optional[str] = None
+    start: Optional[str] = None
+    end: Optional[str] = None
+    n: int = 50
 
 class AutomationResponse(BaseModel):
     success: bool
@@ -157,6 +213,11 @@ class AutomationResponse(BaseModel):
     response_data: Optional[Dict[str, Any]] = None
     status_code: Optional[int] = None
     error_code: Optional[str] = None
+    queued: bool = False
+    alert_id: Optional[str] = None
+    suppressed: bool = False
+    batched: bool = False
+    digest_id: Optional[str] = None
 
 @app.get("/")
 def root():
@@ -190,13 +251,27 @@ def api_info():
             },
             "ai_features": {
                 "explain": "POST /ai/explain - Get AI explanation (OpenAI)",
-                "trends": "POST /ai/trends - Analyze trends (Gemini)"
+                "explain_batch": "POST /ai/explain/batch - Get AI explanations for many machines, several per OpenAI request",
+                "explain_rules": "POST /ai/explain/rules - Instant rule-based explanation with optional background AI enrichment",
+                "explanation": "GET /ai/explanations/{explanation_id} - Rule explanation and AI enrichment status",
+                "explain_stream": "POST /ai/explain/stream - Stream AI explanation sections as they are generated (Server-Sent Events)",
+                "trends": "POST /ai/trends - Analyze trends (Gemini)",
+                "machine_trends": "GET /ai/trends/{machine_id} - Analyze trends of a machine's latest readings (Gemini)",
+                "fleet": "POST /ai/fleet - Plant-wide trend digest of many machines' histories in one Gemini call",
+                "fleet_latest": "GET /ai/fleet - Plant-wide trend digest of every machine's latest readings in one Gemini call",
+                "trend_jobs": "POST /ai/trends/jobs - Queue a trend analysis of a history or a machine's time range, returns a job ID",
+                "trend_job": "GET /ai/trends/jobs/{job_id} - Trend job status and result (optionally waits for completion)",
+                "trend_job_events": "GET /ai/trends/jobs/{job_id}/events - Trend job status changes as Server-Sent Events"
             },
             "sensor_data": {
-                "generate": "POST /sensor/generate - Generate live sensor reading"
+                "generate": "POST /sensor/generate - Generate live sensor reading",
+                "ingest": "POST /readings/{machine_id} - Store sensor readings for a machine",
+                "history": "GET /history/{machine_id} - Query stored history at a target resolution (columnar)",
+                "recent": "GET /readings/{machine_id}/recent - Latest readings shared across API workers (columnar)"
             },
             "automation": {
-                "trigger": "POST /automation/trigger - Trigger n8n workflow"
+                "trigger": "POST /automation/trigger - Trigger n8n workflow (queued for background delivery in outbox mode, batched with other non-critical alerts in digest mode)",
+                "alert": "GET /automation/alerts/{alert_id} - Delivery status of a queued alert"
             },
             "error_codes": {
                 "list": "GET /error-codes - Get all error codes",
@@ -204,6 +279,7 @@ def api_info():
             },
             "system": {
                 "health": "GET /health - Health check",
+                "llm_metrics": "GET /metrics/llm - Token, latency, error, fallback, cache and cost metrics of LLM calls",
                 "docs": "GET /docs - Interactive API documentation",
                 "redoc": "GET /redoc - Alternative API documentation"
             }
@@ -215,7 +291,27 @@ def api_info():
             "ai_explainer": ai_explainer.llm is not None,
             "gemini_analyzer": gemini_analyzer.model is not None,
             "automation": automation.enabled
-        }
+        },
+        "explanation_cache": ai_explainer.cache.stats(),
+        "explanation_single_flight": {
+            "sync": ai_explainer.single_flight.stats(),
+            "async": ai_explainer.async_single_flight.stats()
+        },
+        "explanation_enrichment": ai_explainer.enrichment.stats(),
+        "circuit_breakers": {
+            "ai_explainer": ai_explainer.breaker.stats(),
+            "gemini_analyzer": gemini_analyzer.breaker.stats()
+        },
+        "llm_response_store": {
+            "ai_explainer": ai_explainer.response_store.stats(),
+            "gemini_analyzer": gemini_analyzer.response_store.stats()
+        },
+        "trend_gate": gemini_analyzer.trend_gate.stats(),
+        "trend_jobs": trend_jobs.stats(),
+        "alert_outbox": automation.outbox.stats() if automation.outbox is not None else None,
+        "automation_http": automation.connection_stats(),
+        "alert_digest": automation.digest.stats() if automation.digest is not None else None,
+        "alert_suppression": automation.suppressor.stats() if automation.suppressor is not None else None
     }
 
 @app.post("/predict", response_model=PredictionResponse)
@@ -249,7 +345,7 @@ def predict(sensor_data: SensorData):
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
 @app.post("/ai/explain", response_model=AIExplanationResponse)
-def get_ai_explanation(
+async def get_ai_explanation(
     prediction: PredictionResponse = Body(...),
     sensor_data: SensorData = Body(...)
 ):
@@ -258,6 +354,7 @@ def get_ai_explanation(
     
     Returns root cause analysis and recommended actions
     """
+    set_llm_endpoint("/ai/explain")
     try:
         prediction_dict = {
             'risk': prediction.risk,
@@ -270,13 +367,125 @@ def get_ai_explanation(
             'error_count': sensor_data.error_count
         }
         
-        explanation = ai_explainer.explain(prediction_dict, sensor_dict)
+        async with llm_semaphore:
+            explanation = await ai_explainer.aexplain(prediction_dict, sensor_dict)
         return AIExplanationResponse(**explanation)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI explanation error: {str(e)}")
 
+@app.post("/ai/explain/batch", response_model=List[BatchExplanationResult])
+def get_ai_explanations_batch(items: List[BatchExplanationItem]):
+    """
+    Get AI explanations for several machines at once (OpenAI)
+
+    Machines are packed into as few LLM requests as the token budget allows; any machine
+    whose explanation cannot be parsed gets the template explanation (source 'fallback')
+    """
+    set_llm_endpoint("/ai/explain/batch")
+    try:
+        results = ai_explainer.explain_batch([
+            {
+                'machine_id': item.machine_id,
+                'prediction_result': {
+                    'risk': item.prediction.risk,
+                    'feature_importance': item.prediction.feature_importance
+                },
+                'sensor_data': item.sensor_data.dict()
+            }
+            for item in items
+        ])
+        return [
+            BatchExplanationResult(machine_id=machine_id, **explanation)
+            for machine_id, explanation in results.items()
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch AI explanation error: {str(e)}")
+
+@app.post("/ai/explain/rules")
+def get_rule_explanation(request: RuleExplanationRequest):
+    """
+    Get an instant rule-based explanation (error code, attributions, baseline deltas, trends)
+
+    When enrich is set and OpenAI is configured, an AI explanation is generated in the
+    background; fetch it from /ai/explanations/{explanation_id}
+    """
+    set_llm_endpoint("/ai/explain/rules")
+    try:
+        prediction_dict = {
+            'risk': request.prediction.risk,
+            'feature_importance': request.prediction.feature_importance
+        }
+        history = [reading.dict() for reading in request.history] if request.history else None
+        return ai_explainer.explain_fast(prediction_dict, request.sensor_data.dict(), history, request.enrich)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rule explanation error: {str(e)}")
+
+@app.get("/ai/explanations/{explanation_id}")
+def get_explanation(explanation_id: str):
+    """Rule explanation and background AI enrichment status by explanation ID"""
+    explanation = ai_explainer.get_explanation(explanation_id)
+    if explanation is None:
+        raise HTTPException(status_code=404, detail=f"Explanation '{explanation_id}' not found")
+    return explanation
+
+@app.post("/ai/explain/stream")
+def stream_ai_explanation(
+    prediction: PredictionResponse = Body(...),
+    sensor_data: SensorData = Body(...)
+):
+    """
+    Stream AI explanation for downtime prediction as Server-Sent Events
+
+    Emits 'root_cause' and 'recommended_action' events with text as it is generated,
+    then a 'done' event with the complete explanation and its source
+    """
+    prediction_dict = {
+        'risk': prediction.risk,
+        'feature_importance': prediction.feature_importance
+    }
+    sensor_dict = {
+        'temperature': sensor_data.temperature,
+        'vibration': sensor_data.vibration,
+        'cycle_time': sensor_data.cycle_time,
+        'error_count': sensor_data.error_count
+    }
+
+    def events():
+        stream = ai_explainer.stream_explain(prediction_dict, sensor_dict)
+        try:
+            while True:
+                # Each step may run in a fresh copy of the request context, so re-tag it every time
+                set_llm_endpoint("/ai/explain/stream")
+                try:
+                    event = next(stream)
+                except StopIteration:
+                    break
+                name = event.pop('event')
+                yield f"event: {name}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            # Client disconnected: close the explainer stream now so it settles its breaker probe
+            stream.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics/llm")
+def get_llm_metrics_endpoint():
+    """
+    LLM call accounting (OpenAI and Gemini)
+
+    Prompt/completion tokens, wall time, errors, fallbacks, cache and response-store hits and
+    estimated cost - in total and per provider, endpoint and machine. Every event is also
+    appended to a rolling NDJSON log (see log_path) by a background writer; 'log' counts the
+    events queued, written and dropped.
+    """
+    return get_llm_metrics().snapshot()
+
 @app.post("/ai/trends", response_model=TrendAnalysisResponse)
-def analyze_trends(sensor_history: List[SensorReading]):
+async def analyze_trends(sensor_history: List[SensorReading]):
     """
     Analyze sensor trends using Gemini AI
     
@@ -286,6 +495,7 @@ def analyze_trends(sensor_history: List[SensorReading]):
     Returns:
         Trend summary and detected anomalies
     """
+    set_llm_endpoint("/ai/trends")
     try:
         if len(sensor_history) < 5:
             raise HTTPException(
@@ -296,13 +506,251 @@ def analyze_trends(sensor_history: List[SensorReading]):
         # Convert to list of dicts
         history_dicts = [reading.dict() for reading in sensor_history]
         
-        analysis = gemini_analyzer.analyze_trends(history_dicts)
+        async with llm_semaphore:
+            analysis = await gemini_analyzer.aanalyze_trends(history_dicts)
+        return TrendAnalysisResponse(**analysis)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Trend analysis error: {str(e)}")
+
+@app.get("/ai/trends/{machine_id}", response_model=TrendAnalysisResponse)
+async def analyze_machine_trends(
+    machine_id: str,
+    n: int = Query(50, ge=5, description="Number of latest readings to analyze")
+):
+    """
+    Analyze trends of a machine's latest readings using Gemini AI
+    
+    Uses the shared-memory ring buffer, so readings posted to any worker are included
+    """
+    if recent_readings is None:
+        raise HTTPException(status_code=503, detail="Shared reading buffer unavailable")
+    try:
+        history = recent_readings.latest_records(machine_id, n)
+        if len(history) < 5:
+            raise HTTPException(
+                status_code=400,
+                detail="At least 5 sensor readings required for trend analysis"
+            )
+        
+        with llm_call_context(endpoint="/ai/trends/{machine_id}", machine_id=machine_id):
+            async with llm_semaphore:
+                analysis = await gemini_analyzer.aanalyze_trends(history)
         return TrendAnalysisResponse(**analysis)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Trend analysis error: {str(e)}")
 
+def _stored_history(machine_id, start, end):
+    """
+    Raw readings of a machine's time range from the sensor store, as columns
+
+    Long ranges keep the newest MAX_QUERY_POINTS readings; 'truncated' says whether older ones were left out
+    """
+    result = sensor_store.query(machine_id, None, start, end, 0)
+    history = {name: columns['mean'] for name, columns in result['sensors'].items()}
+    history['timestamp'] = result['timestamps']
+    history['machine_id'] = result['machine_id']
+    history['truncated'] = result['truncated']
+    return history
+
+def _analyze_trend_job(history):
+    """Trend analysis of a job's history, flagging stored ranges that were cut to their newest readings"""
+    result = gemini_analyzer.analyze_trends(history)
+    if isinstance(history, dict) and history.get('truncated'):
+        result = dict(result, truncated=True, readings_analyzed=len(history['timestamp']))
+    return result
+
+@app.post("/ai/trends/jobs", status_code=202)
+def submit_trend_job(request: TrendJobRequest):
+    """
+    Queue a trend analysis and return its job ID immediately
+    
+    Analyzes either the posted 'history', or readings of 'machine_id': its stored readings
+    between 'start' and 'end' when either is given, otherwise its latest 'n' readings from
+    the shared ring buffer. Loading and analysis run on a bounded worker pool; an identical
+    submission that is still queued or running returns the existing job.
+    
+    Returns:
+        Job ID and status, plus the URLs to poll or subscribe to
+    """
+    machine_id = request.machine_id
+    if request.history is not None:
+        if len(request.history) < 5:
+            raise HTTPException(
+                status_code=400,
+                detail="At least 5 sensor readings required for trend analysis"
+            )
+        history = [reading.dict() for reading in request.history]
+        if machine_id is not None:
+            for reading in history:
+                reading['machine_id'] = machine_id
+        digest = hashlib.sha1(json.dumps(history, sort_keys=True).encode()).hexdigest()
+        key = ('history', digest)
+        load_history = lambda: history
+    elif machine_id is not None:
+        if request.start is not None or request.end is not None:
+            try:
+                start = to_epoch_seconds(request.start) if request.start is not None else None
+                end = to_epoch_seconds(request.end) if request.end is not None else None
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid time range: {str(e)}")
+            if start is not None and end is not None and start > end:
+                raise HTTPException(status_code=400, detail="Invalid time range: start must not be after end")
+            key = ('range', machine_id, start, end)
+            load_history = lambda: _stored_history(machine_id, start, end)
+        else:
+            if recent_readings is None:
+                raise HTTPException(status_code=503, detail="Shared reading buffer unavailable")
+            if request.n < 5:
+                raise HTTPException(status_code=400, detail="n must be at least 5")
+            n = request.n
+            key = ('latest', machine_id, n)
+            load_history = lambda: recent_readings.latest_records(machine_id, n)
+    else:
+        raise HTTPException(status_code=400, detail="Either history or machine_id is required")
+
+    try:
+        with llm_call_context(endpoint="/ai/trends/jobs", machine_id=machine_id):
+            job_id, deduplicated = trend_jobs.submit(key, load_history, machine_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    job = trend_jobs.get(job_id)
+    return {
+        "job_id": job_id,
+        "status": job['status'] if job else "queued",
+        "deduplicated": deduplicated,
+        "poll": f"/ai/trends/jobs/{job_id}",
+        "events": f"/ai/trends/jobs/{job_id}/events"
+    }
+
+@app.get("/ai/trends/jobs/{job_id}")
+async def get_trend_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish before responding")
+):
+    """
+    Status of a trend job, with its result once done
+    
+    With 'wait', the request is held until the job finishes or the wait elapses (long polling)
+    """
+    job = trend_jobs.get(job_id)
+    if job is not None and wait and job['status'] not in FINISHED_STATES:
+        loop = asyncio.get_running_loop()
+        finished = asyncio.Event()
+
+        def listener(state):
+            if state['status'] in FINISHED_STATES:
+                loop.call_soon_threadsafe(finished.set)
+
+        if trend_jobs.subscribe(job_id, listener) is not None:
+            try:
+                await asyncio.wait_for(finished.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                trend_jobs.unsubscribe(job_id, listener)
+        job = trend_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trend job not found or expired")
+    return job
+
+@app.get("/ai/trends/jobs/{job_id}/events")
+async def stream_trend_job(job_id: str):
+    """
+    Trend job status changes as Server-Sent Events
+    
+    Emits the current state at once, then a 'running' event and a final 'done' or 'failed'
+    event carrying the result; the stream ends with the job
+    """
+    if trend_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Trend job not found or expired")
+    loop = asyncio.get_running_loop()
+
+    async def events():
+        updates = asyncio.Queue()
+
+        def listener(state):
+            loop.call_soon_threadsafe(updates.put_nowait, state)
+
+        state = trend_jobs.subscribe(job_id, listener)
+        try:
+            while state is not None:
+                yield f"event: {state['status']}\ndata: {json.dumps(state)}\n\n"
+                if state['status'] in FINISHED_STATES:
+                    break
+                while True:
+                    try:
+                        state = await asyncio.wait_for(updates.get(), 15)
+                        break
+                    except asyncio.TimeoutError:
+                        # Keeps proxies from closing an idle connection
+                        yield ": keep-alive\n\n"
+        finally:
+            trend_jobs.unsubscribe(job_id, listener)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/ai/fleet", response_model=FleetDigestResponse)
+async def analyze_fleet(request: FleetDigestRequest):
+    """
+    Plant-wide trend digest of many machines using one Gemini call
+    
+    Statistics and anomaly scores of every machine are computed locally; only the top_k
+    highest scoring machines are described to Gemini, so one refresh costs one LLM call
+    however many machines there are
+    
+    Returns:
+        Plant summary, top_k ranked machines with notes, and every machine's score
+    """
+    if request.top_k is not None and request.top_k < 1:
+        raise HTTPException(status_code=400, detail="top_k must be at least 1")
+    try:
+        fleet_history = {
+            machine_id: [reading.dict() for reading in readings]
+            for machine_id, readings in request.machines.items()
+        }
+        with llm_call_context(endpoint="/ai/fleet"):
+            async with llm_semaphore:
+                digest = await gemini_analyzer.aanalyze_fleet(fleet_history, request.top_k)
+        return FleetDigestResponse(**digest)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Fleet analysis error: {str(e)}")
+
+@app.get("/ai/fleet", response_model=FleetDigestResponse)
+async def analyze_fleet_latest(
+    machines: Optional[str] = Query(None, description="Comma-separated machine IDs (default: every machine in the shared buffer)"),
+    n: int = Query(200, ge=5, description="Number of latest readings per machine"),
+    top_k: Optional[int] = Query(None, ge=1, description="Machines described in the digest")
+):
+    """
+    Plant-wide trend digest of every machine's latest readings using one Gemini call
+    
+    Uses the shared-memory ring buffer, so readings posted to any worker are included
+    """
+    if recent_readings is None:
+        raise HTTPException(status_code=503, detail="Shared reading buffer unavailable")
+    try:
+        machine_ids = [m.strip() for m in machines.split(',') if m.strip()] if machines else recent_readings.machines()
+        fleet_history = {}
+        for machine_id in machine_ids:
+            window = recent_readings.latest(machine_id, n)
+            history = {name: window[name] for name in window.dtype.names if name != 'ts'}
+            history['timestamp'] = window['ts']
+            fleet_history[machine_id] = history
+        with llm_call_context(endpoint="/ai/fleet"):
+            async with llm_semaphore:
+                digest = await gemini_analyzer.aanalyze_fleet(fleet_history, top_k)
+        return FleetDigestResponse(**digest)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Fleet analysis error: {str(e)}")
+
 @app.post("/sensor/generate")
 def generate_sensor_reading(
     mode: str = Body(..., embed=True, description="'normal' or 'failure'"),
@@ -330,21 +778,115 @@ def generate_sensor_reading(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Sensor generation error: {str(e)}")
 
+@app.post("/readings/{machine_id}")
+def ingest_readings(machine_id: str, readings: List[SensorReading]):
+    """
+    Store sensor readings for a machine
+    
+    Readings are written in batches and rolled up into 1-minute and 1-hour
+    min/max/mean aggregates as they are stored
+    
+    Args:
+        machine_id: Machine identifier
+        readings: List of sensor readings (timestamp defaults to now)
+        
+    Returns:
+        Number of readings accepted
+    """
+    try:
+        reading_dicts = [reading.dict() for reading in readings]
+        if recent_readings is not None:
+            # Reject IDs the ring cannot hold before anything is stored
+            encode_machine_id(machine_id)
+        stored = sensor_store.append_many(machine_id, reading_dicts)
+        if recent_readings is not None:
+            recent_readings.append_many(machine_id, reading_dicts)
+        return {
+            "machine_id": machine_id,
+            "stored": stored
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid reading: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Reading storage error: {str(e)}")
+
+@app.get("/readings/{machine_id}/recent")
+def get_recent_readings(
+    machine_id: str,
+    n: int = Query(50, ge=1, description="Number of latest readings")
+):
+    """
+    Latest readings for a machine from the shared-memory ring buffer
+    
+    Readings posted to any API worker process are visible here
+    
+    Returns:
+        Columnar result: 'timestamps' (epoch seconds) plus one array per sensor
+    """
+    if recent_readings is None:
+        raise HTTPException(status_code=503, detail="Shared reading buffer unavailable")
+    try:
+        window = recent_readings.latest(machine_id, n)
+        return {
+            "machine_id": machine_id,
+            "count": len(window),
+            "timestamps": window['ts'].tolist(),
+            "sensors": {
+                name: [None if np.isnan(v) else v for v in window[name].tolist()]
+                for name in window.dtype.names if name != 'ts'
+            }
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Recent readings error: {str(e)}")
+
+@app.get("/history/{machine_id}")
+def get_history(
+    machine_id: str,
+    sensors: Optional[str] = Query(None, description="Comma-separated sensor names (default: all)"),
+    start: Optional[str] = Query(None, description="Range start, ISO timestamp or epoch seconds (default: 24h before end)"),
+    end: Optional[str] = Query(None, description="Range end, ISO timestamp or epoch seconds (default: now)"),
+    resolution: int = Query(60, ge=0, description="Target resolution in seconds (0 = raw readings)")
+):
+    """
+    Query stored sensor history for a machine
+    
+    Served from the coarsest precomputed rollup tier (1 minute, 1 hour) that
+    satisfies the requested resolution, so latency depends on the number of
+    returned points rather than on the amount of raw data stored
+    
+    Returns:
+        Columnar result: 'timestamps' plus per-sensor 'mean', 'min', 'max' and 'count' arrays;
+        raw queries (resolution 0) return the newest 10,000 readings with 'truncated' set if
+        the range held more
+    """
+    try:
+        sensor_list = [s.strip() for s in sensors.split(',') if s.strip()] if sensors else None
+        return sensor_store.query(machine_id, sensor_list, start, end, resolution)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid history query: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"History query error: {str(e)}")
+
 @app.post("/automation/trigger")
-def trigger_automation(
+async def trigger_automation(
     risk_score: float = Body(..., embed=True),
     sensor_data: SensorData = Body(...),
     explanation: Optional[Dict[str, str]] = Body(None, embed=True),
-    error_code: Optional[str] = Body(None, embed=True)
+    error_code: Optional[str] = Body(None, embed=True),
+    machine_id: Optional[str] = Body(None, embed=True)
 ):
     """
     Trigger n8n automation workflow
     
+    With ALERT_SUPPRESSION on, repeats of an alert already sent for the same machine and error
+    code are suppressed during their cool-down unless severity escalates
+    
     Args:
         risk_score: Downtime risk score (0-100)
         sensor_data: Current sensor readings
         explanation: Optional AI explanation dict
         error_code: Optional error code
+        machine_id: Optional machine identifier (suppression is tracked per machine)
         
     Returns:
         Automation trigger result
@@ -361,11 +903,12 @@ def trigger_automation(
         if not error_code:
             error_code = determine_error_code(sensor_dict, risk_score)
         
-        result = automation.trigger_maintenance_alert(
+        result = await automation.atrigger_maintenance_alert(
             risk_score,
             sensor_dict,
             explanation,
-            error_code
+            error_code,
+            machine_id
         )
         
         return AutomationResponse(
@@ -374,11 +917,33 @@ def trigger_automation(
             triggered=result.get('triggered', False),
             response_data=result.get('response_data'),
             status_code=result.get('status_code'),
-            error_code=error_code
+            error_code=error_code,
+            queued=result.get('queued', False),
+            alert_id=result.get('alert_id'),
+            suppressed=result.get('suppressed', False),
+            batched=result.get('batched', False),
+            digest_id=result.get('digest_id')
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Automation error: {str(e)}")
 
+@app.get("/automation/alerts/{alert_id}")
+def get_alert_status(alert_id: str):
+    """
+    Delivery status of an alert queued by /automation/trigger in outbox mode
+    (with digests on, a digest is stored under its digest ID once its window closes)
+    
+    Returns:
+        'status' (pending, delivering, delivered or dead), attempts, next attempt time,
+        last error and the webhook response once delivered
+    """
+    if automation.outbox is None:
+        raise HTTPException(status_code=404, detail="Alert outbox is not enabled")
+    alert = automation.alert_status(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return alert
+
 @app.get("/error-codes")
 def get_error_codes():
     """Get all available error codes and their information"""
@@ -430,12 +995,13 @@ def determine_error_code_endpoint(
         raise HTTPException(status_code=500, detail=f"Error code determination error: {str(e)}")
 
 @app.post("/complete-analysis")
-def complete_analysis(sensor_data: SensorData):
+async def complete_analysis(sensor_data: SensorData):
     """
     Complete analysis endpoint - returns prediction, AI explanation, and error code
     
     This is a convenience endpoint that combines multiple features
     """
+    set_llm_endpoint("/complete-analysis")
     try:
         sensor_dict = {
             'temperature': sensor_data.temperature,
@@ -444,15 +1010,16 @@ def complete_analysis(sensor_data: SensorData):
             'error_count': sensor_data.error_count
         }
         
-        # Get prediction
-        prediction_result = predictor.predict_risk(sensor_dict)
+        # Get prediction (CPU-bound model call stays off the event loop)
+        prediction_result = await run_in_threadpool(predictor.predict_risk, sensor_dict)
         prediction = PredictionResponse(
             risk=prediction_result['risk'],
             feature_importance=prediction_result['feature_importance']
         )
         
         # Get AI explanation
-        explanation = ai_explainer.explain(prediction_result, sensor_dict)
+        async with llm_semaphore:
+            explanation = await ai_explainer.aexplain(prediction_result, sensor_dict)
         
         # Determine error code
         error_code = determine_error_code(sensor_dict, prediction.risk)
@@ -479,17 +1046,85 @@ def predict_api(sensor_data: SensorData):
     return predict(sensor_data)
 
 @app.post("/api/ai/explain", response_model=AIExplanationResponse)
-def get_ai_explanation_api(
+async def get_ai_explanation_api(
     prediction: PredictionResponse = Body(...),
     sensor_data: SensorData = Body(...)
 ):
     """API-prefixed version of AI explain endpoint"""
-    return get_ai_explanation(prediction, sensor_data)
+    return await get_ai_explanation(prediction, sensor_data)
+
+@app.post("/api/ai/explain/batch", response_model=List[BatchExplanationResult])
+def get_ai_explanations_batch_api(items: List[BatchExplanationItem]):
+    """API-prefixed version of batch AI explain endpoint"""
+    return get_ai_explanations_batch(items)
+
+@app.post("/api/ai/explain/rules")
+def get_rule_explanation_api(request: RuleExplanationRequest):
+    """API-prefixed version of rule explanation endpoint"""
+    return get_rule_explanation(request)
+
+@app.get("/api/ai/explanations/{explanation_id}")
+def get_explanation_api(explanation_id: str):
+    """API-prefixed version of explanation lookup endpoint"""
+    return get_explanation(explanation_id)
+
+@app.post("/api/ai/explain/stream")
+def stream_ai_explanation_api(
+    prediction: PredictionResponse = Body(...),
+    sensor_data: SensorData = Body(...)
+):
+    """API-prefixed version of AI explain stream endpoint"""
+    return stream_ai_explanation(prediction, sensor_data)
+
+@app.get("/api/metrics/llm")
+def get_llm_metrics_endpoint_api():
+    """API-prefixed version of LLM metrics endpoint"""
+    return get_llm_metrics_endpoint()
 
 @app.post("/api/ai/trends", response_model=TrendAnalysisResponse)
-def analyze_trends_api(sensor_history: List[SensorReading]):
+async def analyze_trends_api(sensor_history: List[SensorReading]):
     """API-prefixed version of trends endpoint"""
-    return analyze_trends(sensor_history)
+    return await analyze_trends(sensor_history)
+
+@app.get("/api/ai/trends/{machine_id}", response_model=TrendAnalysisResponse)
+async def analyze_machine_trends_api(
+    machine_id: str,
+    n: int = Query(50, ge=5, description="Number of latest readings to analyze")
+):
+    """API-prefixed version of machine trends endpoint"""
+    return await analyze_machine_trends(machine_id, n)
+
+@app.post("/api/ai/trends/jobs", status_code=202)
+def submit_trend_job_api(request: TrendJobRequest):
+    """API-prefixed version of trend job submission endpoint"""
+    return submit_trend_job(request)
+
+@app.get("/api/ai/trends/jobs/{job_id}")
+async def get_trend_job_api(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Seconds to wait for the job to finish before responding")
+):
+    """API-prefixed version of trend job status endpoint"""
+    return await get_trend_job(job_id, wait)
+
+@app.get("/api/ai/trends/jobs/{job_id}/events")
+async def stream_trend_job_api(job_id: str):
+    """API-prefixed version of trend job events endpoint"""
+    return await stream_trend_job(job_id)
+
+@app.post("/api/ai/fleet", response_model=FleetDigestResponse)
+async def analyze_fleet_api(request: FleetDigestRequest):
+    """API-prefixed version of fleet digest endpoint"""
+    return await analyze_fleet(request)
+
+@app.get("/api/ai/fleet", response_model=FleetDigestResponse)
+async def analyze_fleet_latest_api(
+    machines: Optional[str] = Query(None, description="Comma-separated machine IDs (default: every machine in the shared buffer)"),
+    n: int = Query(200, ge=5, description="Number of latest readings per machine"),
+    top_k: Optional[int] = Query(None, ge=1, description="Machines described in the digest")
+):
+    """API-prefixed version of latest-readings fleet digest endpoint"""
+    return await analyze_fleet_latest(machines, n, top_k)
 
 @app.post("/api/sensor/generate")
 def generate_sensor_reading_api(
@@ -500,15 +1135,45 @@ def generate_sensor_reading_api(
     """API-prefixed version of sensor generate endpoint"""
     return generate_sensor_reading(mode, failure_progress, history_length)
 
+@app.post("/api/readings/{machine_id}")
+def ingest_readings_api(machine_id: str, readings: List[SensorReading]):
+    """API-prefixed version of readings ingest endpoint"""
+    return ingest_readings(machine_id, readings)
+
+@app.get("/api/readings/{machine_id}/recent")
+def get_recent_readings_api(
+    machine_id: str,
+    n: int = Query(50, ge=1, description="Number of latest readings")
+):
+    """API-prefixed version of recent readings endpoint"""
+    return get_recent_readings(machine_id, n)
+
+@app.get("/api/history/{machine_id}")
+def get_history_api(
+    machine_id: str,
+    sensors: Optional[str] = Query(None, description="Comma-separated sensor names (default: all)"),
+    start: Optional[str] = Query(None, description="Range start, ISO timestamp or epoch seconds (default: 24h before end)"),
+    end: Optional[str] = Query(None, description="Range end, ISO timestamp or epoch seconds (default: now)"),
+    resolution: int = Query(60, ge=0, description="Target resolution in seconds (0 = raw readings)")
+):
+    """API-prefixed version of history query endpoint"""
+    return get_history(machine_id, sensors, start, end, resolution)
+
 @app.post("/api/automation/trigger")
-def trigger_automation_api(
+async def trigger_automation_api(
     risk_score: float = Body(..., embed=True),
     sensor_data: SensorData = Body(...),
     explanation: Optional[Dict[str, str]] = Body(None, embed=True),
-    error_code: Optional[str] = Body(None, embed=True)
+    error_code: Optional[str] = Body(None, embed=True),
+    machine_id: Optional[str] = Body(None, embed=True)
 ):
     """API-prefixed version of automation trigger endpoint"""
-    return trigger_automation(risk_score, sensor_data, explanation, error_code)
+    return await trigger_automation(risk_score, sensor_data, explanation, error_code, machine_id)
+
+@app.get("/api/automation/alerts/{alert_id}")
+def get_alert_status_api(alert_id: str):
+    """API-prefixed version of alert status endpoint"""
+    return get_alert_status(alert_id)
 
 @app.get("/api/error-codes")
 def get_error_codes_api():
@@ -524,9 +1189,9 @@ def determine_error_code_endpoint_api(
     return determine_error_code_endpoint(sensor_data, risk_score)
 
 @app.post("/api/complete-analysis")
-def complete_analysis_api(sensor_data: SensorData):
+async def complete_analysis_api(sensor_data: SensorData):
     """API-prefixed version of complete analysis endpoint"""
-    return complete_analysis(sensor_data)
+    return await complete_analysis(sensor_data)
 
 if __name__ == "__main__":
     # Use PORT environment variable if available (for Railway/Render/etc), otherwise default to 8000
@@ -25,6 +25,9 @@ from ai_explainer import AIExplainer
 from gemini_analyzer import GeminiAnalyzer
 from automation import AutomationTrigger
 from error_codes import determine_error_code, ErrorCodes
+from sensor_loader import open_sensor_history
+from llm_metrics import set_llm_endpoint
+from trend_estimation import downsample
 
 # Load environment variables
 load_dotenv()
@@ -49,6 +52,8 @@ if 'data_source_mode' not in st.session_state:
     st.session_state.data_source_mode = 'live'  # 'live' or 'json'
 if 'json_data_loaded' not in st.session_state:
     st.session_state.json_data_loaded = None
+if 'replay_started_at' not in st.session_state:
+    st.session_state.replay_started_at = None
 
 class LiveSensorGenerator:
     """
@@ -189,49 +194,61 @@ def init_predictor():
 predictor = init_predictor()
 
 # Initialize AI components
+# LLM calls made while rendering the dashboard are accounted under one endpoint
+set_llm_endpoint("dashboard")
 ai_explainer = AIExplainer()
-gemini_analyzer = GeminiAnalyzer()
-automation = AutomationTrigger()
 
-# Load sensor data from JSON file (for JSON mode)
-@st.cache_data
-def load_json_sensor_data():
-    """Load IoT 4.0 sensor data from JSON file"""
+# Kept across reruns so queued alerts are delivered by one set of outbox workers
+@st.cache_resource
+def init_automation():
+    return AutomationTrigger()
+
+automation = init_automation()
+
+# Kept across reruns so the trend gate remembers the last analysis instead of re-sending it every refresh
+@st.cache_resource
+def init_gemini_analyzer():
+    return GeminiAnalyzer()
+
+gemini_analyzer = init_gemini_analyzer()
+
+# Open sensor history file (for JSON and replay modes)
+@st.cache_resource
+def load_sensor_history():
+    """Open the IoT 4.0 sensor history file for chunked, time-range reads"""
     try:
-        # Try multiple paths to find the JSON file
+        # Try multiple paths to find the history file
         # Get project root (parent of src directory)
         project_root = os.path.dirname(current_dir)
-        json_paths = [
+        history_paths = [
+            os.getenv("SENSOR_DATA_PATH", ""),  # Large NDJSON/CSV/Parquet histories
             os.path.join(project_root, 'data', 'sample_sensor_data.json'),  # From project root
             os.path.join(current_dir, '..', 'data', 'sample_sensor_data.json'),  # Relative from src
             'data/sample_sensor_data.json',  # Relative from project root (when running from root)
             'sample_sensor_data.json',  # Fallback for old location
         ]
         
-        json_path = None
-        for path in json_paths:
+        history_path = None
+        for path in history_paths:
+            if not path:
+                continue
             abs_path = os.path.abspath(path)
             if os.path.exists(abs_path):
-                json_path = abs_path
+                history_path = abs_path
                 break
         
-        if not json_path:
+        if not history_path:
             raise FileNotFoundError("sample_sensor_data.json not found in any expected location")
         
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        df = pd.DataFrame(data)
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        # Sort by timestamp to ensure proper order
-        df = df.sort_values('timestamp').reset_index(drop=True)
-        return df
+        # Only the sparse index is built here; readings are read on demand per time range
+        return open_sensor_history(history_path)
     except FileNotFoundError:
         st.error("❌ sample_sensor_data.json not found in data/ folder!")
         st.info("💡 Make sure sample_sensor_data.json exists in the data/ directory")
-        return pd.DataFrame()
+        return None
     except Exception as e:
-        st.error(f"❌ Error loading JSON: {str(e)}")
-        return pd.DataFrame()
+        st.error(f"❌ Error loading sensor history: {str(e)}")
+        return None
 
 # API endpoint - can be overridden by environment variable for cloud deployment
 API_URL = os.getenv("API_URL", "http://localhost:8000")
@@ -245,51 +262,63 @@ st.sidebar.header("⚙️ Controls")
 
 # Data source selection
 st.sidebar.subheader("📊 Data Source")
+data_source_options = ["Live Data Generation", "JSON File", "Replay JSON File"]
+data_source_modes = ['live', 'json', 'replay']
 data_source = st.sidebar.radio(
     "Select data source:",
-    ["Live Data Generation", "JSON File"],
-    index=0 if st.session_state.data_source_mode == 'live' else 1,
-    help="Live Data: Generates real-time sensor data\nJSON File: Loads data from sample_sensor_data.json"
+    data_source_options,
+    index=data_source_modes.index(st.session_state.data_source_mode),
+    help="Live Data: Generates real-time sensor data\nJSON File: Loads data from sample_sensor_data.json\nReplay: Streams sample_sensor_data.json as recorded, at original or scaled speed"
 )
 
 # Update mode when changed
-if data_source == "Live Data Generation":
-    st.session_state.data_source_mode = 'live'
-else:
-    st.session_state.data_source_mode = 'json'
-    # Clear live history when switching to JSON mode
+selected_mode = data_source_modes[data_source_options.index(data_source)]
+if selected_mode != 'replay':
+    st.session_state.replay_started_at = None
+st.session_state.data_source_mode = selected_mode
+if selected_mode != 'live':
+    # Clear live history when switching to JSON or replay mode
     if len(st.session_state.sensor_history) > 0:
         st.session_state.sensor_history = []
 
+replay_speed = 1.0
+if st.session_state.data_source_mode == 'replay':
+    replay_speed = st.sidebar.select_slider(
+        "Replay Speed",
+        options=[1.0, 10.0, 100.0],
+        value=10.0,
+        format_func=lambda x: f"{x:.0f}x"
+    )
+    if st.sidebar.button("⏮️ Restart Replay"):
+        st.session_state.replay_started_at = None
+
 st.sidebar.markdown("---")
 
 USE_DUMMY_MODE = st.sidebar.checkbox("Use Local Predictions (No API Required)", value=True)
 show_failure = st.sidebar.checkbox("Simulate Failure Scenario", value=False)
-auto_refresh = st.sidebar.checkbox("Auto Refresh (Live Data)", value=st.session_state.data_source_mode == 'live')
+auto_refresh = st.sidebar.checkbox("Auto Refresh (Live Data)", value=st.session_state.data_source_mode in ('live', 'replay'))
 refresh_interval = st.sidebar.slider("Refresh Interval (seconds)", 0.5, 5.0, 1.0, 0.5)
 refresh_button = st.sidebar.button("🔄 Refresh Now")
 
 # Data loading based on selected source
 if st.session_state.data_source_mode == 'json':
     # Load data from JSON file
-    json_df = load_json_sensor_data()
+    history = load_sensor_history()
     
-    if len(json_df) == 0:
+    if history is None or history.row_count == 0:
         st.error("No JSON data available. Please ensure sample_sensor_data.json exists.")
         st.stop()
     
     # Show failure scenario (last readings) or normal (first readings)
     if show_failure:
-        # Show failure scenarios (last portion of data)
-        current_row = json_df.iloc[-1]
-        # Show last 50 readings (failure scenarios)
-        trend_df = json_df.tail(50).copy()
+        # Show failure scenarios (last 50 readings), reading only the trailing chunk
+        trend_df = history.tail(50)
+        current_row = trend_df.iloc[-1]
         scenario_name = "Failure Scenarios"
     else:
-        # Show normal operation (first portion of data)
-        current_row = json_df.iloc[0]
-        # Show first 41 readings (original normal + gradual failure)
-        trend_df = json_df.head(41).copy()
+        # Show normal operation (first 41 readings: original normal + gradual failure)
+        trend_df = history.head(41)
+        current_row = trend_df.iloc[0]
         scenario_name = "Normal Operation"
     
     # Disable auto-refresh for JSON mode
@@ -297,6 +326,30 @@ if st.session_state.data_source_mode == 'json':
         st.sidebar.info("ℹ️ Auto-refresh disabled in JSON file mode")
         auto_refresh = False
 
+elif st.session_state.data_source_mode == 'replay':
+    # Replay recorded readings, advancing by elapsed wall time scaled by replay speed
+    history = load_sensor_history()
+    
+    if history is None or history.row_count == 0:
+        st.error("No JSON data available. Please ensure sample_sensor_data.json exists.")
+        st.stop()
+    
+    if st.session_state.replay_started_at is None:
+        st.session_state.replay_started_at = datetime.now()
+    
+    first_ts, last_ts = history.time_bounds()
+    elapsed = (datetime.now() - st.session_state.replay_started_at).total_seconds() * replay_speed
+    replay_ts = first_ts + pd.Timedelta(seconds=elapsed)
+    
+    # Show the last 50 replayed readings, like the live chart
+    trend_df = history.tail(50, end=replay_ts)
+    current_row = trend_df.iloc[-1]
+    scenario_name = f"Replay ({current_row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')}, {replay_speed:.0f}x)"
+    
+    if replay_ts >= last_ts:
+        st.sidebar.info("ℹ️ Replay finished - press Restart Replay to play it again")
+        auto_refresh = False
+
 else:
     # Live data generation mode
     # Update failure mode state
@@ -395,12 +448,15 @@ with col1:
         if not pd.api.types.is_datetime64_any_dtype(trend_df['timestamp']):
             trend_df['timestamp'] = pd.to_datetime(trend_df['timestamp'])
         
+        # Long windows are LTTB-downsampled so the chart stays light whatever the history length
+        chart_df = downsample(trend_df)
+        
         fig = go.Figure()
         
         # Add temperature trace - smooth spline curve (like turbine graph)
         fig.add_trace(go.Scatter(
-            x=trend_df['timestamp'],
-            y=trend_df['temperature'],
+            x=chart_df['timestamp'],
+            y=chart_df['temperature'],
             name='Temperature (°C)',
             line=dict(color='#FF6B6B', width=2.5, shape='spline', smoothing=1.3),
             yaxis='y',
@@ -409,8 +465,8 @@ with col1:
         
         # Add vibration trace - smooth curve
         fig.add_trace(go.Scatter(
-            x=trend_df['timestamp'],
-            y=trend_df['vibration'] * 10,  # Scale for visibility
+            x=chart_df['timestamp'],
+            y=chart_df['vibration'] * 10,  # Scale for visibility
             name='Vibration (mm/s × 10)',
             line=dict(color='#4ECDC4', width=2.5, shape='spline', smoothing=1.3),
             yaxis='y2',
@@ -419,8 +475,8 @@ with col1:
         
         # Add cycle time trace - smooth curve
         fig.add_trace(go.Scatter(
-            x=trend_df['timestamp'],
-            y=trend_df['cycle_time'],
+            x=chart_df['timestamp'],
+            y=chart_df['cycle_time'],
             name='Cycle Time (s)',
             line=dict(color='#95E1D3', width=2.5, shape='spline', smoothing=1.3),
             yaxis='y3',
@@ -429,8 +485,8 @@ with col1:
         
         # Add error count trace - smooth curve
         fig.add_trace(go.Scatter(
-            x=trend_df['timestamp'],
-            y=trend_df['error_count'] * 5,  # Scale for visibility
+            x=chart_df['timestamp'],
+            y=chart_df['error_count'] * 5,  # Scale for visibility
             name='Error Count (× 5)',
             line=dict(color='#F38181', width=2.5, shape='spline', smoothing=1.3),
             yaxis='y4',
@@ -502,7 +558,8 @@ with col1:
         
         # Show data info
         time_range = f"{trend_df['timestamp'].min().strftime('%H:%M')} - {trend_df['timestamp'].max().strftime('%H:%M')}"
-        st.caption(f"📊 Showing {len(trend_df)} data points | Scenario: {scenario_name} | Time Range: {time_range}")
+        shown = f"{len(chart_df)} of {len(trend_df)}" if len(chart_df) < len(trend_df) else f"{len(trend_df)}"
+        st.caption(f"📊 Showing {shown} data points | Scenario: {scenario_name} | Time Range: {time_range}")
     else:
         st.warning("⚠️ No data available for chart")
     
@@ -641,123 +698,132 @@ with col2:
                 st.success(f"✅ **Automation Triggered:** {auto_result['message']}")
                 st.info(f"📋 **Error Code:** {error_code} - {error_description}")
                 
-                # Display webhook response data
-                st.markdown("---")
-                st.subheader("📥 Webhook Response from n8n")
+                if auto_result.get('batched'):
+                    # Digest mode: sent together with other alerts when the digest window closes
+                    st.info(f"🗂️ **Digest ID:** {auto_result['digest_id']} - {auto_result['message']}")
+                elif auto_result.get('queued'):
+                    # Outbox mode: n8n's response arrives later, look it up by alert ID
+                    st.info(f"📮 **Alert ID:** {auto_result['alert_id']} - queued for delivery (status: GET /automation/alerts/{auto_result['alert_id']})")
+                else:
+                    # Display webhook response data
+                    st.markdown("---")
+                    st.subheader("📥 Webhook Response from n8n")
                 
-                # Show webhook URL used
-                webhook_url = auto_result.get('url', 'N/A')
-                st.markdown(f"**🌐 Webhook URL:** `{webhook_url}`")
+                    # Show webhook URL used
+                    webhook_url = auto_result.get('url', 'N/A')
+                    st.markdown(f"**🌐 Webhook URL:** `{webhook_url}`")
                 
-                # Show response status
-                response_status = auto_result.get('status_code', 'Unknown')
-                if response_status in [200, 201, 202]:
-                    st.success(f"✅ **Status Code:** {response_status} - Success")
-                else:
-                    st.error(f"❌ **Status Code:** {response_status} - Error")
+                    # Show response status
+                    response_status = auto_result.get('status_code', 'Unknown')
+                    if response_status in [200, 201, 202]:
+                        st.success(f"✅ **Status Code:** {response_status} - Success")
+                    else:
+                        st.error(f"❌ **Status Code:** {response_status} - Error")
                 
-                # Display response headers if available
-                response_headers = auto_result.get('response_headers', {})
-                if response_headers:
-                    with st.expander("📋 View Response Headers"):
-                        st.json(response_headers)
+                    # Display response headers if available
+                    response_headers = auto_result.get('response_headers', {})
+                    if response_headers:
+                        with st.expander("📋 View Response Headers"):
+                            st.json(response_headers)
                 
-                # Display response data
-                response_data = auto_result.get('response_data', {})
-                full_response = auto_result.get('response', '')
+                    # Display response data
+                    response_data = auto_result.get('response_data', {})
+                    full_response = auto_result.get('response', '')
                 
-                # Extract Gemini response from n8n workflow output
-                gemini_response = None
-                if response_data and isinstance(response_data, dict):
-                    # Try different n8n response structures
-                    # Structure 1: {"output": [{"json": {"output": "text"}}]}
-                    if 'output' in response_data:
-                        output = response_data['output']
-                        if isinstance(output, list) and len(output) > 0:
-                            if isinstance(output[0], list) and len(output[0]) > 0:
-                                first_item = output[0][0]
-                                if isinstance(first_item, dict) and 'json' in first_item:
-                                    json_data = first_item['json']
-                                    if isinstance(json_data, dict):
-                                        # Look for common output fields
-                                        gemini_response = json_data.get('output') or json_data.get('text') or json_data.get('response') or json_data.get('message')
-                        elif isinstance(output, str):
-                            gemini_response = output
-                    # Structure 2: Direct text response
-                    elif 'text' in response_data:
-                        gemini_response = response_data['text']
-                    elif 'response' in response_data:
-                        gemini_response = response_data['response']
-                    elif 'message' in response_data:
-                        gemini_response = response_data['message']
-                    # Structure 3: Check if entire response is a string (raw text)
-                    elif len(response_data) == 1 and 'raw_response' in response_data:
-                        raw = response_data['raw_response']
-                        if isinstance(raw, str) and not raw.startswith('{'):
-                            gemini_response = raw
+                    # Extract Gemini response from n8n workflow output
+                    gemini_response = None
+                    if response_data and isinstance(response_data, dict):
+                        # Try different n8n response structures
+                        # Structure 1: {"output": [{"json": {"output": "text"}}]}
+                        if 'output' in response_data:
+                            output = response_data['output']
+                            if isinstance(output, list) and len(output) > 0:
+                                if isinstance(output[0], list) and len(output[0]) > 0:
+                                    first_item = output[0][0]
+                                    if isinstance(first_item, dict) and 'json' in first_item:
+                                        json_data = first_item['json']
+                                        if isinstance(json_data, dict):
+                                            # Look for common output fields
+                                            gemini_response = json_data.get('output') or json_data.get('text') or json_data.get('response') or json_data.get('message')
+                            elif isinstance(output, str):
+                                gemini_response = output
+                        # Structure 2: Direct text response
+                        elif 'text' in response_data:
+                            gemini_response = response_data['text']
+                        elif 'response' in response_data:
+                            gemini_response = response_data['response']
+                        elif 'message' in response_data:
+                            gemini_response = response_data['message']
+                        # Structure 3: Check if entire response is a string (raw text)
+                        elif len(response_data) == 1 and 'raw_response' in response_data:
+                            raw = response_data['raw_response']
+                            if isinstance(raw, str) and not raw.startswith('{'):
+                                gemini_response = raw
                 
-                # Display Gemini response prominently if found
-                if gemini_response:
-                    st.markdown("---")
-                    st.subheader("🤖 Gemini AI Response from n8n Workflow")
-                    st.markdown(f"""
-                    <div style='
-                        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                        padding: 20px;
-                        border-radius: 10px;
-                        border: 2px solid #667eea;
-                        margin: 15px 0;
-                        color: white;
-                    '>
-                        <h3 style='color: white; margin: 0 0 10px 0;'>💡 AI-Generated Error Description</h3>
-                        <p style='color: white; font-size: 16px; line-height: 1.6; margin: 0;'>{gemini_response}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    st.markdown("---")
+                    # Display Gemini response prominently if found
+                    if gemini_response:
+                        st.markdown("---")
+                        st.subheader("🤖 Gemini AI Response from n8n Workflow")
+                        st.markdown(f"""
+                        <div style='
+                            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+                            padding: 20px;
+                            border-radius: 10px;
+                            border: 2px solid #667eea;
+                            margin: 15px 0;
+                            color: white;
+                        '>
+                            <h3 style='color: white; margin: 0 0 10px 0;'>💡 AI-Generated Error Description</h3>
+                            <p style='color: white; font-size: 16px; line-height: 1.6; margin: 0;'>{gemini_response}</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+                        st.markdown("---")
                 
-                if response_data and isinstance(response_data, dict) and len(response_data) > 0:
-                    st.markdown("**📦 Full Parsed JSON Response:**")
-                    st.json(response_data)
+                    if response_data and isinstance(response_data, dict) and len(response_data) > 0:
+                        st.markdown("**📦 Full Parsed JSON Response:**")
+                        st.json(response_data)
                     
-                    # Display key fields prominently if available
-                    st.markdown("**🔑 Key Information:**")
-                    key_found = False
-                    if 'message' in response_data and not gemini_response:
-                        st.info(f"💬 **Message:** {response_data['message']}")
-                        key_found = True
-                    if 'executionId' in response_data:
-                        st.info(f"🆔 **Execution ID:** {response_data['executionId']}")
-                        key_found = True
-                    if 'workflowId' in response_data:
-                        st.info(f"📋 **Workflow ID:** {response_data['workflowId']}")
-                        key_found = True
-                    if 'data' in response_data:
-                        st.info(f"📊 **Data:** {response_data['data']}")
-                        key_found = True
-                    if not key_found and not gemini_response:
-                        # Show all keys if no standard keys found
-                        for key, value in response_data.items():
-                            if key != 'raw_response':
-                                st.info(f"**{key}:** {value}")
+                        # Display key fields prominently if available
+                        st.markdown("**🔑 Key Information:**")
+                        key_found = False
+                        if 'message' in response_data and not gemini_response:
+                            st.info(f"💬 **Message:** {response_data['message']}")
+                            key_found = True
+                        if 'executionId' in response_data:
+                            st.info(f"🆔 **Execution ID:** {response_data['executionId']}")
+                            key_found = True
+                        if 'workflowId' in response_data:
+                            st.info(f"📋 **Workflow ID:** {response_data['workflowId']}")
+                            key_found = True
+                        if 'data' in response_data:
+                            st.info(f"📊 **Data:** {response_data['data']}")
+                            key_found = True
+                        if not key_found and not gemini_response:
+                            # Show all keys if no standard keys found
+                            for key, value in response_data.items():
+                                if key != 'raw_response':
+                                    st.info(f"**{key}:** {value}")
                 
-                # Always show full raw response
-                if full_response:
-                    st.markdown("**📄 Full Raw Response Text:**")
-                    st.code(full_response, language='json' if response_data else 'text')
+                    # Always show full raw response
+                    if full_response:
+                        st.markdown("**📄 Full Raw Response Text:**")
+                        st.code(full_response, language='json' if response_data else 'text')
                 
-                # Show what was sent
-                with st.expander("📤 View Data Sent to n8n"):
-                    sent_data = {
-                        'error_code': error_code,
-                        'error_description': error_description,
-                        'error_severity': ErrorCodes.SEVERITY.get(error_code, 'UNKNOWN'),
-                        'risk_score': risk,
-                        'alert_type': 'high_downtime_risk',
-                        'timestamp': datetime.now().isoformat(),
-                        'sensor_data': current_sensor,
-                        'explanation': explanation_dict
-                    }
-                    st.json(sent_data)
+                    # Show what was sent
+                    with st.expander("📤 View Data Sent to n8n"):
+                        sent_data = {
+                            'error_code': error_code,
+                            'error_description': error_description,
+                            'error_severity': ErrorCodes.SEVERITY.get(error_code, 'UNKNOWN'),
+                            'risk_score': risk,
+                            'alert_type': 'high_downtime_risk',
+                            'timestamp': datetime.now().isoformat(),
+                            'sensor_data': current_sensor,
+                            'explanation': explanation_dict
+                        }
+                        st.json(sent_data)
+            elif auto_result.get('suppressed'):
+                st.caption(f"🔕 {auto_result['message']}")
             elif auto_result.get('success') == False and automation.is_configured():
                 error_message = auto_result.get('message', 'Unknown error')
                 st.warning(f"⚠️ Automation failed: {error_message}")
@@ -793,12 +859,17 @@ with col2:
                     if full_response:
                         st.markdown("**📄 Full Response Text:**")
                         st.code(full_response, language='text')
+        else:
+            # Lets the suppressor clear this machine's alerts once risk stays low
+            automation.observe_risk(risk)
         
         # Gemini Trend Analysis
-        data_length = len(trend_df) if st.session_state.data_source_mode == 'json' else len(st.session_state.sensor_history)
+        data_length = len(trend_df) if st.session_state.data_source_mode != 'live' else len(st.session_state.sensor_history)
         if data_length >= 10:
             st.subheader("📊 Trend Analysis (Gemini)")
-            trend_analysis = gemini_analyzer.analyze_trends(trend_df)
+            # The dashboard shows one machine per data source, so that is what the trend gate keys on
+            trend_analysis = gemini_analyzer.analyze_trends(
+                trend_df, gate_key=f"dashboard:{st.session_state.data_source_mode}")
             st.markdown("**Summary:**")
             st.info(trend_analysis['summary'])
             if trend_analysis.get('anomalies'):
@@ -807,6 +878,10 @@ with col2:
                     st.warning(f"⚠️ {anomaly}")
             if trend_analysis.get('status') == 'dummy':
                 st.caption("💡 Configure GEMINI_API_KEY in .env for AI-powered trend analysis")
+            elif trend_analysis.get('reused_age_s') is not None:
+                gate_stats = gemini_analyzer.trend_gate.stats()
+                st.caption(f"♻️ Trend unchanged - summary from {trend_analysis['reused_age_s']:.0f}s ago "
+                           f"({gate_stats['calls_avoided']} Gemini calls avoided)")
     else:
         st.error("❌ Failed to get prediction")
 
@@ -3,133 +3,453 @@ Automation Module for n8n Webhook Integration
 Triggers automated workflows when downtime risk exceeds thresholds
 """
 import os
+import time
+import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 from dotenv import load_dotenv
 from error_codes import determine_error_code, ErrorCodes
+from alert_outbox import AlertOutbox
+from alert_suppression import AlertSuppressor
+from alert_digest import AlertDigest, BYPASS_SEVERITIES
 
 load_dotenv()
 
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
 class AutomationTrigger:
     """Trigger automated workflows via n8n webhooks"""
     
-    def __init__(self):
+    def __init__(self, use_outbox=None, suppress=None, use_digest=None):
+        """
+        Args:
+            use_outbox: Queue alerts in the durable outbox and deliver them in the background
+                        instead of waiting for n8n (defaults to AUTOMATION_OUTBOX, off unless
+                        set to 1/true/yes)
+            suppress: Hold back repeats of an alert already sent for the same machine and error
+                      code (defaults to ALERT_SUPPRESSION, off unless set to 1/true/yes)
+            use_digest: Batch non-critical alerts into one webhook call per ALERT_DIGEST_INTERVAL_S
+                        or ALERT_DIGEST_MAX_ITEMS alerts (defaults to ALERT_DIGEST, off unless set
+                        to 1/true/yes)
+        """
         self.webhook_url = os.getenv("N8N_WEBHOOK_URL")
         self.enabled = bool(self.webhook_url)
+        # Connection pool to n8n, reused across alerts instead of a new TCP/TLS handshake per alert
+        self.pool_size = int(os.getenv("N8N_HTTP_POOL_SIZE", 10))
+        self.connect_timeout_s = float(os.getenv("N8N_CONNECT_TIMEOUT_S", 5))
+        # Read timeout is long to accommodate Gemini API calls in the n8n workflow
+        self.read_timeout_s = float(os.getenv("N8N_READ_TIMEOUT_S", 30))
+        # Idle connections older than this are closed rather than reused (n8n or a proxy in front
+        # of it may already have dropped them)
+        self.keepalive_expiry_s = float(os.getenv("N8N_KEEPALIVE_EXPIRY_S", 60))
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        self._session_lock = threading.Lock()
+        self._session_used = None
+        self._expired_connections = 0
+        self._async_client = None
+        self._async_loop = None
+        self._stats_lock = threading.Lock()
+        self.http_stats = {
+            'sync': {'requests': 0, 'errors': 0, 'wall_s': 0.0},
+            'async': {'requests': 0, 'errors': 0, 'connections': 0, 'wall_s': 0.0}
+        }
+        if use_outbox is None:
+            use_outbox = os.getenv("AUTOMATION_OUTBOX", "").strip().lower() in ("1", "true", "yes")
+        # Durable queue of alerts awaiting delivery (None when alerts are sent synchronously)
+        self.outbox = (AlertOutbox(self._send_payload, on_dead=self._undelivered)
+                       if use_outbox and self.enabled else None)
+        if suppress is None:
+            suppress = os.getenv("ALERT_SUPPRESSION", "").strip().lower() in ("1", "true", "yes")
+        # Cool-downs per machine and error code (None sends every alert)
+        self.suppressor = AlertSuppressor() if suppress else None
+        if use_digest is None:
+            use_digest = os.getenv("ALERT_DIGEST", "").strip().lower() in ("1", "true", "yes")
+        # Buffer of alerts awaiting the next digest (None sends each alert on its own)
+        self.digest = AlertDigest(self._send_digest) if use_digest and self.enabled else None
     
-    def trigger_maintenance_alert(self, risk_score, sensor_data, explanation=None, error_code=None):
+    def trigger_maintenance_alert(self, risk_score, sensor_data, explanation=None, error_code=None,
+                                  machine_id=None):
         """
         Trigger maintenance alert via n8n webhook
         
+        With suppression on, an alert already sent for the same machine and error code is
+        held back during its cool-down (the result has 'suppressed'), unless severity escalated.
+        In digest mode non-critical alerts are buffered and sent together with others (the result
+        has 'batched' and the 'digest_id'); CRITICAL alerts are always sent immediately.
+        In outbox mode the alert is stored and delivered in the background (with retries),
+        and the result carries 'queued' and the 'alert_id' to look up its delivery status.
+        
         Args:
             risk_score: Downtime risk percentage (0-100)
             sensor_data: Current sensor readings
             explanation: Optional AI explanation
             error_code: Optional error code (e.g., 'E001', 'BEARING_FAILURE', etc.)
+            machine_id: Machine the alert is for (defaults to sensor_data's 'machine_id', else one
+                        shared 'default' machine)
             
         Returns:
             Dict with 'success' and 'message'
         """
+        try:
+            result, payload = self._prepare_alert(risk_score, sensor_data, explanation, error_code, machine_id)
+            if result is not None:
+                return result
+            if self.digest is not None and payload['error_severity'] not in BYPASS_SEVERITIES:
+                return self._buffer(payload)
+            if self.outbox is not None:
+                return self._enqueue(payload)
+            return self._sent(payload, self._send_payload(payload))
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error: {str(e)}',
+                'triggered': False
+            }
+    
+    async def atrigger_maintenance_alert(self, risk_score, sensor_data, explanation=None, error_code=None,
+                                         machine_id=None):
+        """
+        Async variant of trigger_maintenance_alert() - awaits n8n without holding a worker thread
+        
+        Returns:
+            Same dict as trigger_maintenance_alert()
+        """
+        try:
+            result, payload = self._prepare_alert(risk_score, sensor_data, explanation, error_code, machine_id)
+            if result is not None:
+                return result
+            if self.digest is not None and payload['error_severity'] not in BYPASS_SEVERITIES:
+                return self._buffer(payload)
+            if self.outbox is not None:
+                return self._enqueue(payload)
+            if not HTTPX_AVAILABLE:
+                return self._sent(payload, await asyncio.to_thread(self._send_payload, payload))
+            return self._sent(payload, await self._asend_payload(payload))
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Unexpected error: {str(e)}',
+                'triggered': False
+            }
+    
+    def observe_risk(self, risk_score, machine_id=None):
+        """
+        Report a machine's risk when no alert is raised, so its active alerts can clear
+        (after risk stays below the clear level for a while - see AlertSuppressor)
+        """
+        if self.suppressor is not None and risk_score < 75:
+            self.suppressor.observe(str(machine_id or 'default'), risk_score)
+    
+    def _prepare_alert(self, risk_score, sensor_data, explanation, error_code, machine_id):
+        """
+        Threshold and suppression checks shared by the sync and async triggers
+        
+        Returns:
+            (result, None) when nothing is to be sent, else (None, payload)
+        """
         if not self.enabled:
             return {
                 'success': False,
                 'message': 'n8n webhook not configured',
                 'triggered': False
-            }
+            }, None
+        
+        machine_key = str(machine_id or sensor_data.get('machine_id') or 'default')
         
         # Only trigger if risk is high
         if risk_score < 75:
+            self.observe_risk(risk_score, machine_key)
             return {
                 'success': True,
                 'message': f'Risk ({risk_score}%) below threshold (75%)',
                 'triggered': False
-            }
+            }, None
         
+        payload = self._build_payload(risk_score, sensor_data, explanation, error_code)
+        if machine_id is not None or 'machine_id' in sensor_data:
+            payload['machine_id'] = machine_key
+        if self.suppressor is not None:
+            decision = self.suppressor.check(machine_key, payload['error_code'])
+            if not decision['send']:
+                return {
+                    'success': True,
+                    'message': (f"Alert {payload['error_code']} suppressed: already sent for machine "
+                                f"'{machine_key}' {decision['last_sent_s']:.0f}s ago "
+                                f"(cool-down {decision['cooldown_s']:.0f}s)"),
+                    'triggered': False,
+                    'suppressed': True,
+                    'suppressed_count': decision['suppressed_count']
+                }, None
+            # Lets the workflow tell first alerts from reminders and escalations
+            payload['alert_decision'] = decision['decision']
+            payload['suppressed_count'] = decision['suppressed_count']
+        return None, payload
+    
+    def _buffer(self, payload):
+        """Add a payload to the pending digest"""
+        entry = self.digest.add(payload)
+        return {
+            'success': True,
+            'message': (f"Maintenance alert added to digest ({entry['position']} alert(s) so far, "
+                        f"sent within {entry['flush_in_s']:.0f}s)"),
+            'triggered': True,
+            'batched': True,
+            'digest_id': entry['digest_id'],
+            'url': self.webhook_url
+        }
+    
+    def _send_digest(self, digest):
+        """Deliver a digest payload (called by the digest's background thread)"""
+        if self.outbox is not None:
+            # Stored under the digest ID so callers can look it up with the ID they were given
+            return self._enqueue(digest, alert_id=digest['digest_id'])
+        return self._sent(digest, self._send_payload(digest))
+    
+    def _enqueue(self, payload, alert_id=None):
+        """Queue a payload in the outbox (its cool-down is dropped again if it is never delivered)"""
         try:
-            # Determine error code if not provided
-            if error_code is None:
-                # Auto-generate error code based on sensor readings
-                error_code = determine_error_code(sensor_data, risk_score)
-            
-            # Ensure error_code is a valid string
-            if not error_code or error_code is None:
-                error_code = ErrorCodes.UNKNOWN
-            error_code = str(error_code).strip()
-            
-            # Prepare payload - error_code is included at top level
-            payload = {
-                'error_code': error_code,  # Error code at top level
-                'error_description': ErrorCodes.DESCRIPTIONS.get(error_code, 'Unknown error'),
-                'error_severity': ErrorCodes.SEVERITY.get(error_code, 'UNKNOWN'),
-                'risk_score': risk_score,
-                'alert_type': 'high_downtime_risk',
-                'timestamp': sensor_data.get('timestamp', datetime.now().isoformat()) if isinstance(sensor_data.get('timestamp'), (str, type(None))) else datetime.now().isoformat(),
-                'sensor_data': sensor_data,
-                'explanation': explanation or 'High downtime risk detected'
-            }
-            
-            # Send webhook request
-            # Increased timeout to 30 seconds to accommodate Gemini API calls in n8n workflow
-            response = requests.post(
+            alert_id = self.outbox.enqueue(payload, alert_id=alert_id)
+        except Exception:
+            self._undelivered(payload)
+            raise
+        return {
+            'success': True,
+            'message': 'Maintenance alert queued for delivery',
+            'triggered': True,
+            'queued': True,
+            'alert_id': alert_id,
+            'url': self.webhook_url
+        }
+    
+    def _sent(self, payload, result):
+        """Delivery result; a failed send does not start a cool-down, so the next alert retries"""
+        if not result.get('success'):
+            self._undelivered(payload)
+        return result
+    
+    def _undelivered(self, payload):
+        """
+        Drop the cool-down of an alert that was never delivered - a failed send, a failed enqueue
+        or an outbox dead letter - or of every alert in an undelivered digest
+        """
+        if self.suppressor is None:
+            return
+        alerts = payload['alerts'] if payload.get('alert_type') == 'maintenance_digest' else [payload]
+        for alert in alerts:
+            self.suppressor.discard(alert.get('machine_id', 'default'), alert['error_code'])
+    
+    def _build_payload(self, risk_score, sensor_data, explanation=None, error_code=None):
+        """Webhook payload for a maintenance alert"""
+        # Determine error code if not provided
+        if error_code is None:
+            # Auto-generate error code based on sensor readings
+            error_code = determine_error_code(sensor_data, risk_score)
+        
+        # Ensure error_code is a valid string
+        if not error_code or error_code is None:
+            error_code = ErrorCodes.UNKNOWN
+        error_code = str(error_code).strip()
+        
+        # Prepare payload - error_code is included at top level
+        return {
+            'error_code': error_code,  # Error code at top level
+            'error_description': ErrorCodes.DESCRIPTIONS.get(error_code, 'Unknown error'),
+            'error_severity': ErrorCodes.SEVERITY.get(error_code, 'UNKNOWN'),
+            'risk_score': risk_score,
+            'alert_type': 'high_downtime_risk',
+            'timestamp': sensor_data.get('timestamp', datetime.now().isoformat()) if isinstance(sensor_data.get('timestamp'), (str, type(None))) else datetime.now().isoformat(),
+            'sensor_data': sensor_data,
+            'explanation': explanation or 'High downtime risk detected'
+        }
+    
+    def _send_payload(self, payload):
+        """
+        POST a payload to the n8n webhook over the pooled session
+        
+        Returns:
+            Dict with 'success', 'message', 'triggered' and the webhook response details
+        """
+        started = time.perf_counter()
+        try:
+            response = self._get_session().post(
                 self.webhook_url,
                 json=payload,
-                timeout=30,  # Increased from 5 to 30 seconds for Gemini processing
-                headers={'Content-Type': 'application/json'}
+                timeout=(self.connect_timeout_s, self.read_timeout_s)
             )
-            
-            # Capture full response information
-            full_response_text = response.text
-            response_headers = dict(response.headers)
-            
-            # Try to parse JSON response
-            try:
-                response_data = response.json()
-            except:
-                response_data = {'raw_response': full_response_text}
-            
-            if response.status_code in [200, 201, 202]:
-                return {
-                    'success': True,
-                    'message': 'Maintenance alert triggered successfully',
-                    'triggered': True,
-                    'response': full_response_text,  # Full response text
-                    'response_data': response_data,  # Parsed JSON response
-                    'status_code': response.status_code,
-                    'response_headers': response_headers,  # Response headers
-                    'url': self.webhook_url  # Webhook URL used
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': f'Webhook returned status {response.status_code}',
-                    'triggered': False,
-                    'response': full_response_text,
-                    'response_data': response_data,
-                    'status_code': response.status_code,
-                    'response_headers': response_headers,
-                    'url': self.webhook_url
-                }
+            self._record('sync', started)
+            return self._webhook_result(response)
                 
         except requests.exceptions.Timeout:
-            return {
-                'success': False,
-                'message': 'Webhook request timed out after 30 seconds. The n8n workflow may be taking longer than expected (possibly due to Gemini API processing). Try checking your workflow execution time in n8n.',
-                'triggered': False,
-                'timeout': True
-            }
+            self._record('sync', started, error=True)
+            return self._timeout_result()
         except requests.exceptions.RequestException as e:
+            self._record('sync', started, error=True)
             return {
                 'success': False,
                 'message': f'Webhook request failed: {str(e)}',
                 'triggered': False
             }
         except Exception as e:
+            self._record('sync', started, error=True)
             return {
                 'success': False,
                 'message': f'Unexpected error: {str(e)}',
                 'triggered': False
             }
+        finally:
+            with self._session_lock:
+                self._session_used = time.monotonic()
+    
+    def _get_session(self):
+        """Pooled session, with its connections closed first if it sat idle past keepalive_expiry_s"""
+        with self._session_lock:
+            now = time.monotonic()
+            if self._session_used is not None and now - self._session_used > self.keepalive_expiry_s:
+                self._expired_connections += self._pooled_connections()
+                self._adapter.poolmanager.clear()
+            self._session_used = now
+        return self.session
+    
+    def _pooled_connections(self):
+        """Connections opened by the session's current host pools"""
+        # urllib3 counts connections and requests per host pool
+        pools = self._adapter.poolmanager.pools
+        return sum(pool.num_connections for pool in map(pools.get, pools.keys()) if pool is not None)
+    
+    async def _asend_payload(self, payload):
+        """Async variant of _send_payload() over the pooled httpx client"""
+        started = time.perf_counter()
+        try:
+            response = await self._get_async_client().post(
+                self.webhook_url,
+                json=payload,
+                extensions={'trace': self._trace_connections}
+            )
+            self._record('async', started)
+            return self._webhook_result(response)
+                
+        except httpx.TimeoutException:
+            self._record('async', started, error=True)
+            return self._timeout_result()
+        except httpx.HTTPError as e:
+            self._record('async', started, error=True)
+            return {
+                'success': False,
+                'message': f'Webhook request failed: {str(e)}',
+                'triggered': False
+            }
+    
+    def _get_async_client(self):
+        """Pooled async client, created on first use in the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            # A client's connections belong to the loop that opened them
+            self._async_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=self.keepalive_expiry_s
+                ),
+                timeout=httpx.Timeout(self.read_timeout_s, connect=self.connect_timeout_s),
+                headers={'Content-Type': 'application/json'}
+            )
+            self._async_loop = loop
+        return self._async_client
+    
+    async def _trace_connections(self, event, info):
+        """httpcore trace hook: counts new TCP connections opened by the async client"""
+        if event == 'connection.connect_tcp.complete':
+            with self._stats_lock:
+                self.http_stats['async']['connections'] += 1
+    
+    def _webhook_result(self, response):
+        """Result dict for a webhook response (requests or httpx)"""
+        # Capture full response information
+        full_response_text = response.text
+        response_headers = dict(response.headers)
+        
+        # Try to parse JSON response
+        try:
+            response_data = response.json()
+        except:
+            response_data = {'raw_response': full_response_text}
+        
+        if response.status_code in [200, 201, 202]:
+            return {
+                'success': True,
+                'message': 'Maintenance alert triggered successfully',
+                'triggered': True,
+                'response': full_response_text,  # Full response text
+                'response_data': response_data,  # Parsed JSON response
+                'status_code': response.status_code,
+                'response_headers': response_headers,  # Response headers
+                'url': self.webhook_url  # Webhook URL used
+            }
+        else:
+            return {
+                'success': False,
+                'message': f'Webhook returned status {response.status_code}',
+                'triggered': False,
+                'response': full_response_text,
+                'response_data': response_data,
+                'status_code': response.status_code,
+                'response_headers': response_headers,
+                'url': self.webhook_url
+            }
+    
+    def _timeout_result(self):
+        return {
+            'success': False,
+            'message': f'Webhook request timed out after {self.read_timeout_s:g} seconds. The n8n workflow may be taking longer than expected (possibly due to Gemini API processing). Try checking your workflow execution time in n8n.',
+            'triggered': False,
+            'timeout': True
+        }
+    
+    def _record(self, kind, started, error=False):
+        with self._stats_lock:
+            stats = self.http_stats[kind]
+            stats['requests'] += 1
+            stats['wall_s'] += time.perf_counter() - started
+            if error:
+                stats['errors'] += 1
+    
+    def connection_stats(self):
+        """Webhook requests, new connections opened and the share of requests that reused one"""
+        with self._session_lock:
+            sync_connections = self._expired_connections + self._pooled_connections()
+        with self._stats_lock:
+            result = {
+                'pool_size': self.pool_size,
+                'connect_timeout_s': self.connect_timeout_s,
+                'read_timeout_s': self.read_timeout_s
+            }
+            for kind, stats in self.http_stats.items():
+                connections = sync_connections if kind == 'sync' else stats['connections']
+                requests_made = stats['requests']
+                result[kind] = {
+                    'requests': requests_made,
+                    'errors': stats['errors'],
+                    'connections_opened': connections,
+                    'reuse_rate': round(max(requests_made - connections, 0) / requests_made, 4) if requests_made else 0.0,
+                    'avg_latency_ms': round(stats['wall_s'] / requests_made * 1000, 2) if requests_made else 0.0
+                }
+            return result
     
+    def alert_status(self, alert_id):
+        """Delivery status of a queued alert, or None if unknown (or outbox mode is off)"""
+        if self.outbox is None:
+            return None
+        return self.outbox.get(alert_id)
     
     def is_configured(self):
         """Check if automation is configured"""
@@ -0,0 +1,236 @@
+"""
+Circuit Breaker
+Per-call deadlines and fail-fast protection for slow or failing LLM providers
+"""
+import os
+import asyncio
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Breaker states
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after consecutive failures or slow calls; open -> half-open after a
+    cool-down, where a single probe call decides whether to close again or re-open
+    """
+
+    def __init__(self, name, failure_threshold=None, slow_call_s=None, reset_timeout_s=None,
+                 deadline_s=None, max_workers=None):
+        """
+        Args:
+            name: Label used in stats and error messages
+            failure_threshold: Consecutive failures/slow calls that open the breaker
+                               (defaults to LLM_BREAKER_FAILURES or 5)
+            slow_call_s: Calls taking at least this long count as failures even if they succeed
+                         (defaults to LLM_BREAKER_SLOW_CALL_S or 8)
+            reset_timeout_s: Seconds the breaker stays open before a half-open probe
+                             (defaults to LLM_BREAKER_RESET_S or 30)
+            deadline_s: Per-call deadline in seconds (defaults to LLM_DEADLINE_S or 15)
+            max_workers: Threads available for deadline-bounded calls (defaults to LLM_CALL_WORKERS or 16)
+        """
+        self.name = name
+        self.failure_threshold = int(failure_threshold or os.getenv("LLM_BREAKER_FAILURES", 5))
+        self.slow_call_s = float(slow_call_s or os.getenv("LLM_BREAKER_SLOW_CALL_S", 8))
+        self.reset_timeout_s = float(reset_timeout_s or os.getenv("LLM_BREAKER_RESET_S", 30))
+        self.deadline_s = float(deadline_s or os.getenv("LLM_DEADLINE_S", 15))
+        self.max_workers = int(max_workers or os.getenv("LLM_CALL_WORKERS", 16))
+        self._executor = None
+        self._lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.slow_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    # ------------------------------------------------------------------
+    # State transitions
+    # ------------------------------------------------------------------
+
+    def is_open(self):
+        """True while calls are being rejected outright (does not consume a half-open probe)"""
+        with self._lock:
+            if self.state == STATE_OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout_s
+            return self.state == STATE_HALF_OPEN and self._probe_in_flight
+
+    def allow_request(self):
+        """Decide whether a call may go to the provider; a half-open breaker admits one probe"""
+        with self._lock:
+            if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self.state = STATE_HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def _open(self):
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self.times_opened += 1
+
+    def record_success(self, duration_s):
+        """Record a completed call; slow completions count towards opening the breaker"""
+        with self._lock:
+            if duration_s >= self.slow_call_s:
+                self.slow_calls += 1
+                self._record_failure_locked()
+                return
+            self.consecutive_failures = 0
+            if self.state == STATE_HALF_OPEN:
+                self.state = STATE_CLOSED
+                self._probe_in_flight = False
+
+    def record_failure(self):
+        """Record a failed or timed-out call"""
+        with self._lock:
+            self.failures += 1
+            self._record_failure_locked()
+
+    def record_call(self):
+        """Count a call made outside call()/acall(), e.g. a streamed response"""
+        with self._lock:
+            self.calls += 1
+
+    def record_timeout(self):
+        """Record a call abandoned at its deadline"""
+        with self._lock:
+            self.timeouts += 1
+            self.failures += 1
+            self._record_failure_locked()
+
+    def release_probe(self):
+        """Free a half-open probe slot without judging the provider (the caller went away)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _record_failure_locked(self):
+        self.consecutive_failures += 1
+        if self.state == STATE_HALF_OPEN:
+            self._open()
+        elif self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def call(self, fn, deadline_s=None):
+        """
+        Run fn() through the breaker with a deadline
+
+        Args:
+            fn: Zero-argument callable making the provider call
+            deadline_s: Override for the per-call deadline (0 disables it)
+
+        Returns:
+            Result of fn()
+
+        Raises:
+            CircuitOpenError: The breaker is open and fn was not called
+            TimeoutError: fn did not finish within the deadline
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        deadline_s = self.deadline_s if deadline_s is None else deadline_s
+        with self._lock:
+            self.calls += 1
+            if deadline_s and self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=f"{self.name}-llm")
+
+        started = time.monotonic()
+        try:
+            if deadline_s:
+                # The worker may keep running after the deadline; the caller is released regardless.
+                # It runs in a copy of the caller's context so context variables carry over.
+                result = self._executor.submit(contextvars.copy_context().run, fn).result(timeout=deadline_s)
+            else:
+                result = fn()
+        except FutureTimeoutError:
+            self.record_timeout()
+            raise TimeoutError(f"{self.name} call exceeded {deadline_s}s deadline")
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    async def acall(self, coro_fn, deadline_s=None):
+        """
+        Await coro_fn() through the breaker with a deadline
+
+        Args:
+            coro_fn: Zero-argument callable returning the provider call awaitable
+            deadline_s: Override for the per-call deadline (0 disables it)
+
+        Returns:
+            Result of the awaitable
+
+        Raises:
+            CircuitOpenError: The breaker is open and coro_fn was not called
+            TimeoutError: The call did not finish within the deadline (it is cancelled)
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+        deadline_s = self.deadline_s if deadline_s is None else deadline_s
+        with self._lock:
+            self.calls += 1
+
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(coro_fn(), deadline_s or None)
+        except asyncio.TimeoutError:
+            self.record_timeout()
+            raise TimeoutError(f"{self.name} call exceeded {deadline_s}s deadline")
+        except asyncio.CancelledError:
+            # Caller went away: free a half-open probe slot without judging the provider
+            self.release_probe()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def stats(self):
+        """Breaker state and counters"""
+        with self._lock:
+            retry_in = None
+            if self.state == STATE_OPEN:
+                retry_in = max(0.0, round(self.reset_timeout_s - (time.monotonic() - self.opened_at), 1))
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'failure_threshold': self.failure_threshold,
+                'slow_call_s': self.slow_call_s,
+                'deadline_s': self.deadline_s,
+                'reset_timeout_s': self.reset_timeout_s,
+                'retry_in_s': retry_in,
+                'calls': self.calls,
+                'failures': self.failures,
+                'timeouts': self.timeouts,
+                'slow_calls': self.slow_calls,
+                'rejected': self.rejected,
+                'times_opened': self.times_opened
+            }
@@ -0,0 +1,123 @@
+"""
+Explanation Cache
+TTL + LRU cache for AI explanations keyed on a normalized signature of the situation,
+so only materially different readings reach the LLM
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from error_codes import determine_error_code
+
+# Sensor values are rounded to these steps before building a signature
+SENSOR_STEPS = {
+    'temperature': 2.0,   # °C
+    'vibration': 0.5,     # mm/s
+    'cycle_time': 2.0,    # seconds
+    'error_count': 1.0    # count
+}
+
+
+def explanation_signature(prediction_result, sensor_data, error_code=None, risk_bucket_size=10, top_n=3):
+    """
+    Build a cache key for an explanation request
+
+    Args:
+        prediction_result: Dict with 'risk' and 'feature_importance'
+        sensor_data: Dict with sensor readings
+        error_code: Optional error code (determined from the readings if omitted)
+        risk_bucket_size: Width of risk buckets in percentage points
+        top_n: Number of ranked top factors included
+
+    Returns:
+        Hashable tuple of (risk bucket, top factors, error code, coarsened sensor values)
+    """
+    risk = prediction_result.get('risk', 0)
+    importance = prediction_result.get('feature_importance', {}) or {}
+    top_factors = tuple(
+        name for name, _ in sorted(importance.items(), key=lambda x: x[1], reverse=True)[:top_n]
+    )
+    if error_code is None:
+        error_code = determine_error_code(sensor_data, risk)
+    coarse = tuple(
+        (name, round(float(sensor_data.get(name, 0) or 0) / step) * step)
+        for name, step in SENSOR_STEPS.items()
+    )
+    return (int(risk // risk_bucket_size), top_factors, str(error_code), coarse)
+
+
+class ExplanationCache:
+    """Thread-safe TTL + LRU cache with hit rate and saved-latency metrics"""
+
+    def __init__(self, max_entries=None, ttl_s=None):
+        """
+        Args:
+            max_entries: Maximum cached explanations (defaults to EXPLANATION_CACHE_SIZE or 256)
+            ttl_s: Seconds an explanation stays valid (defaults to EXPLANATION_CACHE_TTL or 300)
+        """
+        self.max_entries = int(max_entries or os.getenv("EXPLANATION_CACHE_SIZE", 256))
+        self.ttl_s = float(ttl_s or os.getenv("EXPLANATION_CACHE_TTL", 300))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.saved_latency_s = 0.0
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, stored_at, latency_s = entry
+            if now - stored_at > self.ttl_s:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_latency_s += latency_s
+            return value
+
+    def put(self, key, value, latency_s=0.0):
+        """
+        Cache a value
+
+        Args:
+            key: Signature from explanation_signature()
+            value: Explanation dict
+            latency_s: Time the LLM call took; credited as saved latency on every later hit
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic(), latency_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached entries (metrics are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Cache metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_s': self.ttl_s,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'saved_latency_s': round(self.saved_latency_s, 3)
+            }
@@ -0,0 +1,247 @@
+"""
+Fleet Digest
+Trend statistics of every machine in a plant computed in one vectorized pass over a padded
+(machines x readings x sensors) array, and machines ranked by how anomalous they look - so a
+single LLM prompt can cover the few machines that need attention
+"""
+import os
+import re
+import warnings
+
+import numpy as np
+
+from trend_stats import SensorWindow
+from trend_estimation import recent_history, window_seconds
+from anomaly_detection import SENSOR_LABELS, ZSCORE_THRESHOLD
+from sensor_store import SENSOR_COLUMNS
+
+# Readings per machine the digest looks at (the newest ones)
+FLEET_MAX_READINGS = 1000
+
+# Machines described in the prompt
+FLEET_TOP_K = 10
+
+# Machines with fewer readings are listed as skipped rather than ranked
+FLEET_MIN_READINGS = 5
+
+# Score above which a machine counts as needing attention (robust standard deviations)
+FLEET_SCORE_THRESHOLD = ZSCORE_THRESHOLD
+
+# Ways a sensor can stand out, in the order of the 'components' axis
+#   spike:   latest reading vs the machine's own median
+#   drift:   change over the window vs the scatter around its linear fit
+#   outlier: machine average vs the fleet median of the same sensor
+SCORE_KINDS = ('spike', 'drift', 'outlier')
+
+# Fewer machines than this give no meaningful fleet median, so no outlier scores
+MIN_FLEET_SIZE = 3
+
+
+def _nan_median(values, axis):
+    """NaN-ignoring median along an axis via one sort (np.nanmedian loops per slice on long axes)"""
+    ordered = np.sort(values, axis=axis)  # NaN sorts last
+    count = (~np.isnan(values)).sum(axis=axis, keepdims=True)
+    lo = np.maximum((count - 1) // 2, 0)
+    hi = np.maximum(count // 2, 0)
+    median = 0.5 * (np.take_along_axis(ordered, lo, axis=axis) + np.take_along_axis(ordered, hi, axis=axis))
+    median = np.where(count > 0, median, np.nan)
+    return np.squeeze(median, axis=axis)
+
+
+def _sigma_floor(center):
+    """Smallest scale used, relative to the signal level, so constant sensors do not score infinitely"""
+    return np.maximum(np.abs(np.nan_to_num(center)) * 1e-3, 1e-6)
+
+
+def _stack(fleet_history, sensors, max_readings):
+    """
+    Newest readings of every machine in one NaN-padded array, aligned on the newest reading
+
+    Returns:
+        (machine IDs, values (m, n, k), seconds before each machine's newest reading (m, n), skipped IDs)
+    """
+    ids, windows, skipped = [], [], []
+    for machine_id, history in fleet_history.items():
+        window = SensorWindow.from_history(recent_history(history, max_readings=max_readings), sensors)
+        if len(window) < FLEET_MIN_READINGS or not window.names:
+            skipped.append(str(machine_id))
+            continue
+        ids.append(str(machine_id))
+        windows.append(window)
+
+    n = max((len(w) for w in windows), default=0)
+    values = np.full((len(windows), n, len(sensors)), np.nan)
+    t = np.full((len(windows), n), np.nan)
+    index = {name: col for col, name in enumerate(sensors)}
+    for i, window in enumerate(windows):
+        rows = len(window)
+        values[i, n - rows:][:, [index[name] for name in window.names]] = window.values
+        seconds = window_seconds(window)
+        t[i, n - rows:] = seconds - seconds[-1]
+    return ids, values, t, skipped
+
+
+def fleet_statistics(fleet_history, sensors=None, max_readings=None):
+    """
+    Per-machine trend statistics and anomaly scores for a whole fleet
+
+    Every statistic is computed for all machines and sensors at once; only the column
+    extraction runs per machine.
+
+    Args:
+        fleet_history: Dict of machine_id -> history (anything SensorWindow.from_history accepts)
+        sensors: Sensor names (defaults to the eight SENSOR_COLUMNS)
+        max_readings: Newest readings per machine considered (defaults to FLEET_MAX_READINGS)
+
+    Returns:
+        Dict with 'machines' (one dict per machine, highest 'score' first: 'machine_id', 'score',
+        'driver' {'sensor', 'kind', 'z'}, 'readings', 'sensors' {sensor -> {'current', 'mean',
+        'std', 'slope_per_hour', 'spike_z', 'drift_z', 'outlier_z'}}), 'fleet' (sensor ->
+        {'median', 'sigma'} of the machine averages), 'skipped' (machines with too few readings)
+    """
+    sensors = list(sensors or SENSOR_COLUMNS)
+    max_readings = int(max_readings or os.getenv("FLEET_MAX_READINGS", FLEET_MAX_READINGS))
+    ids, values, t, skipped = _stack(fleet_history, sensors, max_readings)
+    if not ids:
+        return {'machines': [], 'fleet': {}, 'skipped': skipped}
+
+    with warnings.catch_warnings():
+        # Sensors a machine does not report are all-NaN slices; they stay NaN and score 0
+        warnings.simplefilter('ignore', RuntimeWarning)
+        present = ~np.isnan(values)
+        count = present.sum(axis=1)
+        mean = np.nanmean(values, axis=1)
+        std = np.nanstd(values, axis=1)
+        n = values.shape[1]
+        last = n - 1 - np.argmax(present[:, ::-1, :], axis=1)
+        current = np.take_along_axis(values, last[:, None, :], axis=1)[:, 0, :]
+
+        # Robust scale of each machine's own readings (MAD, std when most readings are identical)
+        median = _nan_median(values, axis=1)
+        sigma = 1.4826 * _nan_median(np.abs(values - median[:, None, :]), axis=1)
+        sigma = np.where(sigma > 0, sigma, std)
+        sigma = np.maximum(np.nan_to_num(sigma), _sigma_floor(median))
+        spike_z = np.abs(current - median) / sigma
+
+        # Least-squares slope against time, and the residual scatter around it
+        tt = np.where(present, t[:, :, None], np.nan)
+        t_mean = np.nanmean(tt, axis=1)
+        dt = tt - t_mean[:, None, :]
+        dv = values - mean[:, None, :]
+        slope = np.nansum(dt * dv, axis=1) / np.nansum(dt * dt, axis=1)
+        slope = np.where(np.isfinite(slope), slope, 0.0)
+        residual = np.nanstd(dv - slope[:, None, :] * dt, axis=1)
+        span = np.nanmax(tt, axis=1) - np.nanmin(tt, axis=1)
+        drift_z = np.abs(slope * span) / np.maximum(np.nan_to_num(residual), _sigma_floor(mean))
+
+        # Each machine's average against the fleet's
+        if len(ids) >= MIN_FLEET_SIZE:
+            fleet_median = _nan_median(mean, axis=0)
+            fleet_sigma = 1.4826 * _nan_median(np.abs(mean - fleet_median), axis=0)
+            fleet_sigma = np.where(fleet_sigma > 0, fleet_sigma, np.nanstd(mean, axis=0))
+            # Averages of long windows agree far more closely than single readings do, so a gap
+            # smaller than the typical reading-to-reading scatter is not treated as an outlier
+            typical_sigma = _nan_median(np.where(count > 0, sigma, np.nan), axis=0)
+            fleet_sigma = np.fmax(np.fmax(fleet_sigma, typical_sigma), _sigma_floor(fleet_median))
+            outlier_z = np.abs(mean - fleet_median) / fleet_sigma
+        else:
+            fleet_median = np.nanmean(mean, axis=0)
+            fleet_sigma = np.full(len(sensors), np.nan)
+            outlier_z = np.zeros_like(mean)
+
+    components = np.nan_to_num(np.stack([spike_z, drift_z, outlier_z], axis=-1))  # (m, k, kinds)
+    components[count == 0] = 0.0
+    flat = components.reshape(len(ids), -1)
+    best = flat.argmax(axis=1)
+    score = flat[np.arange(len(ids)), best]
+    driver_sensor, driver_kind = np.divmod(best, len(SCORE_KINDS))
+
+    machines = []
+    for i in np.argsort(-score, kind='stable'):
+        machine_sensors = {}
+        for col, name in enumerate(sensors):
+            if not count[i, col]:
+                continue
+            machine_sensors[name] = {
+                'current': round(float(current[i, col]), 4),
+                'mean': round(float(mean[i, col]), 4),
+                'std': round(float(std[i, col]), 4),
+                'slope_per_hour': round(float(slope[i, col]) * 3600, 4),
+                'spike_z': round(float(components[i, col, 0]), 2),
+                'drift_z': round(float(components[i, col, 1]), 2),
+                'outlier_z': round(float(components[i, col, 2]), 2)
+            }
+        machines.append({
+            'machine_id': ids[i],
+            'score': round(float(score[i]), 2),
+            'driver': {
+                'sensor': sensors[driver_sensor[i]],
+                'kind': SCORE_KINDS[driver_kind[i]],
+                'z': round(float(score[i]), 2)
+            },
+            'readings': int(count[i].max()),
+            'sensors': machine_sensors
+        })
+
+    fleet = {
+        name: {'median': round(float(fleet_median[col]), 4),
+               'sigma': None if np.isnan(fleet_sigma[col]) else round(float(fleet_sigma[col]), 4)}
+        for col, name in enumerate(sensors)
+        if not np.isnan(fleet_median[col])
+    }
+    return {'machines': machines, 'fleet': fleet, 'skipped': skipped}
+
+
+def describe_machine(machine, fleet=None):
+    """Short local note on why a machine ranks where it does"""
+    driver = machine['driver']
+    stats = machine['sensors'].get(driver['sensor'])
+    if stats is None or driver['z'] <= 0:
+        return "No notable deviation"
+    label, unit = SENSOR_LABELS.get(driver['sensor'], (driver['sensor'], ''))
+    if driver['kind'] == 'spike':
+        return (f"{label} reading {stats['current']:.2f}{unit} is {driver['z']:.1f}σ from "
+                f"this machine's typical level")
+    if driver['kind'] == 'drift':
+        direction = 'rising' if stats['slope_per_hour'] > 0 else 'falling'
+        return f"{label} {direction} steadily ({stats['slope_per_hour']:+.2f}{unit}/h, {driver['z']:.1f}σ over the window)"
+    fleet_median = (fleet or {}).get(driver['sensor'], {}).get('median')
+    relative = f" vs fleet median {fleet_median:.2f}{unit}" if fleet_median is not None else ""
+    return f"{label} average {stats['mean']:.2f}{unit}{relative} ({driver['z']:.1f}σ outlier)"
+
+
+def digest_line(machine):
+    """Compact one-line description of a machine for the fleet prompt"""
+    ranked = sorted(
+        machine['sensors'].items(),
+        key=lambda item: max(item[1]['spike_z'], item[1]['drift_z'], item[1]['outlier_z']),
+        reverse=True
+    )
+    parts = []
+    for name, stats in ranked[:3]:
+        label, unit = SENSOR_LABELS.get(name, (name, ''))
+        parts.append(f"{label.lower()} {stats['current']:.2f}{unit} (avg {stats['mean']:.2f}, "
+                     f"{stats['slope_per_hour']:+.2f}/h)")
+    return (f"- {machine['machine_id']}: score {machine['score']:.1f}, "
+            f"{machine['driver']['sensor']} {machine['driver']['kind']}; " + ", ".join(parts))
+
+
+def parse_fleet_response(content, machine_ids):
+    """
+    Split a fleet digest response into the plant summary and per-machine notes
+
+    Expects a 'PLANT SUMMARY:' section followed by 'MACHINE NOTES:' lines of the form
+    '- <machine_id>: <note>'; anything unrecognized stays in the summary.
+
+    Returns:
+        (summary, dict of machine_id -> note)
+    """
+    known = {str(m) for m in machine_ids}
+    parts = re.split(r'(?im)^\W*machine notes\W*$', content, maxsplit=1)
+    summary = re.sub(r'(?i)^\W*plant summary\W*', '', parts[0].strip()).strip()
+    notes = {}
+    for line in (parts[1] if len(parts) > 1 else content).splitlines():
+        match = re.match(r'^\s*[-*•\d.]*\s*\**\s*([^:*]+?)\s*\**\s*:\s*\**\s*(.+?)\s*$', line)
+        if match and match.group(1) in known:
+            notes[match.group(1)] = match.group(2)
+    return summary or content.strip(), notes
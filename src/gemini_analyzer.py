@@ -3,7 +3,18 @@ Gemini Trend Analyzer
 Uses Google Gemini to analyze sensor trends and detect anomalies
 """
 import os
+import sys
+import time
 from dotenv import load_dotenv
+from llm_store import LLMResponseStore
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm_metrics import get_llm_metrics, estimate_tokens, EVENT_CALL, EVENT_ERROR, EVENT_FALLBACK, EVENT_STORE_HIT
+from anomaly_detection import detect_anomalies, describe_anomaly, SENSOR_LABELS
+from trend_gate import TrendGate, trend_snapshot
+from trend_stats import SensorWindow, summarize
+from trend_estimation import recent_history, estimate_trends, overall_direction, describe_trends
+from fleet_digest import (fleet_statistics, describe_machine, digest_line, parse_fleet_response,
+                          FLEET_TOP_K, FLEET_SCORE_THRESHOLD)
 
 load_dotenv()
 
@@ -13,17 +24,72 @@ try:
 except ImportError:
     GEMINI_AVAILABLE = False
 
+TREND_PROMPT = """Analyze this industrial machine sensor data trend:
+
+Recent Sensor Readings (last {n} readings):
+- Temperature: Current {temp_current:.1f}°C, Average {temp_avg:.1f}°C, Trend: {temp_trend}
+- Vibration: Current {vib_current:.2f} mm/s, Average {vib_avg:.2f} mm/s, Trend: {vib_trend}
+- Error Count: Current {errors_current:.0f}, Average {errors_avg:.1f}, Trend: {errors_trend}
+
+Trend by time scale (robust slope over each window):
+{scale_trends}
+
+Provide:
+1. Brief trend summary (1-2 sentences)
+2. Any anomalies detected (if any)
+3. Key observations
+
+Keep it concise and actionable."""
+
+FLEET_PROMPT = """Analyze this plant-wide digest of {machine_count} industrial machines.
+
+Fleet baseline (median of machine averages):
+{fleet_baseline}
+
+Machines ranked highest by anomaly score ({listed} of {machine_count}; score is the largest deviation in
+robust standard deviations - spike: latest reading vs the machine's own level, drift: steady change over
+the window, outlier: machine average vs the fleet):
+{machine_lines}
+
+{flagged} of {machine_count} machines score above {threshold:.1f}.
+
+Respond in exactly this format:
+PLANT SUMMARY: <2-3 sentences on the overall state of the plant>
+MACHINE NOTES:
+- <machine_id>: <one sentence: likely issue and recommended action>
+
+Write one note per listed machine. Keep it concise and actionable."""
+
+# Detected anomalies listed in the human readable 'anomalies' field (all are in 'anomaly_details')
+ANOMALY_SUMMARY_LIMIT = 5
+
+# Wording of trend_estimation directions in prompts and summaries
+TREND_LABELS = {'rising': 'increasing', 'falling': 'decreasing', 'stable': 'stable'}
+
 class GeminiAnalyzer:
     """Analyze sensor trends using Google Gemini"""
     
     def __init__(self):
         self.gemini_api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         self.model = None
+        self.model_name = 'gemini-pro'
+        self.model_params = {}
+        # Responses persisted across restarts and processes, keyed on the exact rendered prompt
+        self.response_store = LLMResponseStore()
+        # Deadline per Gemini call; repeated failures or slow calls switch to the local analysis
+        self.breaker = CircuitBreaker('gemini')
+        # Tokens, latency, errors and fallbacks for every call
+        self.metrics = get_llm_metrics()
+        # Last analysis per machine, reused until its trend statistics change materially
+        self.trend_gate = TrendGate()
+        # Machines described in one fleet digest prompt
+        self.fleet_top_k = int(os.getenv("FLEET_DIGEST_TOP_K", FLEET_TOP_K))
         
         if GEMINI_AVAILABLE and self.gemini_api_key:
             try:
                 genai.configure(api_key=self.gemini_api_key)
-                self.model = genai.GenerativeModel('gemini-pro')
+                # One model instance per analyzer so the underlying client channel is reused across calls
+                self.model = genai.GenerativeModel(self.model_name)
             except Exception as e:
                 # Safely handle error message to avoid encoding issues on Windows
                 try:
@@ -37,75 +103,293 @@ class GeminiAnalyzer:
                     pass  # Silently fail if even stderr write fails
                 self.model = None
     
-    def analyze_trends(self, sensor_history):
+    def analyze_trends(self, sensor_history, gate_key=None):
         """
         Analyze sensor trends and detect anomalies
         
         Args:
             sensor_history: List of sensor readings (dicts) or DataFrame
+            gate_key: Key under which an unchanged trend reuses the previous analysis (defaults to
+                      the history's machine_id; histories of no particular machine are not reused)
+            
+        Returns:
+            Dict with 'summary', 'anomalies' (descriptions) and 'anomaly_details' (structured
+            detections from the local statistical detector)
+        """
+        try:
+            analysis, request = self._prepare_trends(sensor_history, gate_key)
+            if request is None:
+                return analysis
+            # Generate response under the call deadline; an open breaker answers instantly locally
+            try:
+                response = self._invoke_gemini(lambda: self.model.generate_content(request['prompt']))
+            except CircuitOpenError:
+                return self._dummy_analysis(request['window'])
+            return self._finish_trends(request, response)
+        except Exception as e:
+            return self._trends_failed(e, sensor_history)
+    
+    async def aanalyze_trends(self, sensor_history, gate_key=None):
+        """
+        Async variant of analyze_trends() - awaits Gemini without holding a worker thread
+        
+        Args:
+            sensor_history: List of sensor readings (dicts) or DataFrame
+            gate_key: See analyze_trends()
+            
+        Returns:
+            Same dict as analyze_trends()
+        """
+        try:
+            analysis, request = self._prepare_trends(sensor_history, gate_key)
+            if request is None:
+                return analysis
+            try:
+                response = await self._ainvoke_gemini(lambda: self.model.generate_content_async(request['prompt']))
+            except CircuitOpenError:
+                return self._dummy_analysis(request['window'])
+            return self._finish_trends(request, response)
+        except Exception as e:
+            return self._trends_failed(e, sensor_history)
+    
+    def _prepare_trends(self, sensor_history, gate_key):
+        """
+        Everything in a trend analysis short of calling Gemini
+        
+        Returns:
+            (analysis, None) when answered locally - no model, too few readings, an unchanged
+            trend or a stored response - else (None, request) with the 'window', 'trends',
+            'gate_key', 'snapshot', 'prompt' and 'started' time the call needs
+        """
+        # Replay mode can serve stored responses even without a Gemini key
+        if not self.model and not self.response_store.replay_only:
+            return self._dummy_analysis(sensor_history), None
+        
+        # Only the longest trend scale is analyzed, so cost does not grow with the history.
+        # Every sensor column is extracted once; all statistics below work on this matrix.
+        window = SensorWindow.from_history(recent_history(sensor_history))
+        if len(window) < 5:
+            return self._dummy_analysis(window), None
+        summary = summarize(window)
+        trends = estimate_trends(window)
+        
+        # Skip Gemini entirely while the trend has not materially changed since the last analysis
+        gate_key = self._gate_key(gate_key, window)
+        snapshot = trend_snapshot(summary, trends)
+        reused = self.trend_gate.lookup(gate_key, snapshot)
+        if reused is not None:
+            content, age_s = reused
+            return self._analysis(content, window, trends, reused_age_s=age_s), None
+        
+        request = {'window': window, 'trends': trends, 'gate_key': gate_key, 'snapshot': snapshot,
+                   'prompt': self._build_prompt(summary, trends, len(window)),
+                   'started': time.perf_counter()}
+        
+        # Check the persistent response store before paying for a Gemini call
+        content = self.response_store.get(request['prompt'], self.model_name, self.model_params)
+        if content is not None:
+            self.metrics.record('gemini', self.model_name, EVENT_STORE_HIT)
+            return self._store_trends(request, content), None
+        if self.response_store.replay_only:
+            # Replay mode never calls Gemini; unseen prompts get the local analysis
+            return self._dummy_analysis(window), None
+        return None, request
+    
+    def _finish_trends(self, request, response):
+        """Record and store a Gemini trend response, then build the analysis from it"""
+        content = response.text if hasattr(response, 'text') else str(response)
+        self._record_call(request['prompt'], content, response, time.perf_counter() - request['started'])
+        self.response_store.put(request['prompt'], self.model_name, self.model_params, content)
+        return self._store_trends(request, content)
+    
+    def _store_trends(self, request, content):
+        """Remember the summary in the trend gate and build the analysis"""
+        self.trend_gate.store(request['gate_key'], request['snapshot'], content,
+                              time.perf_counter() - request['started'])
+        return self._analysis(content, request['window'], request['trends'])
+    
+    def _invoke_gemini(self, call):
+        """Run a Gemini call through the breaker, recording failures other than an open breaker"""
+        started = time.perf_counter()
+        try:
+            return self.breaker.call(call)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self.metrics.record('gemini', self.model_name, EVENT_ERROR,
+                                wall_s=time.perf_counter() - started, error=str(e))
+            raise
+    
+    async def _ainvoke_gemini(self, call):
+        """Async counterpart of _invoke_gemini; `call` returns an awaitable"""
+        started = time.perf_counter()
+        try:
+            return await self.breaker.acall(call)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            self.metrics.record('gemini', self.model_name, EVENT_ERROR,
+                                wall_s=time.perf_counter() - started, error=str(e))
+            raise
+    
+    def _trends_failed(self, error, sensor_history):
+        """Report a failed trend analysis on stderr and fall back to the local analysis"""
+        # Safely handle error message to avoid encoding issues on Windows
+        try:
+            error_msg = str(error)
+        except:
+            error_msg = "Unknown error occurred"
+        # Use a safer logging approach instead of print
+        try:
+            sys.stderr.write(f"Error analyzing trends with Gemini: {error_msg}\n")
+        except:
+            pass  # Silently fail if even stderr write fails
+        return self._dummy_analysis(sensor_history)
+    
+    @staticmethod
+    def _gate_key(gate_key, window):
+        """Trend gate key: explicit, else the window's machine; None disables reuse"""
+        if gate_key is not None:
+            return str(gate_key)
+        if window.machine_id is not None and str(window.machine_id):
+            return str(window.machine_id)
+        return None
+    
+    def _build_prompt(self, summary, trends, n):
+        """
+        Render the trend prompt from trend_stats.summarize() statistics and
+        trend_estimation.estimate_trends() slopes of an n-reading window
+        """
+        temperature = summary['temperature']
+        vibration = summary['vibration']
+        errors = summary['error_count']
+        
+        # Build prompt
+        prompt = TREND_PROMPT.format(
+            n=n,
+            temp_current=temperature['current'],
+            temp_avg=temperature['mean'],
+            temp_trend=self._trend_label(trends, 'temperature'),
+            vib_current=vibration['current'],
+            vib_avg=vibration['mean'],
+            vib_trend=self._trend_label(trends, 'vibration'),
+            errors_current=errors['current'],
+            errors_avg=errors['mean'],
+            errors_trend=self._trend_label(trends, 'error_count'),
+            scale_trends=describe_trends(trends) or "- Not enough readings"
+        )
+        return prompt
+    
+    @staticmethod
+    def _trend_label(trends, sensor):
+        """Direction of a sensor over the longest time scale estimated"""
+        return TREND_LABELS.get(overall_direction(trends, sensor), 'stable')
+    
+    def analyze_fleet(self, fleet_history, top_k=None):
+        """
+        Plant-wide trend digest of many machines with a single Gemini call
+        
+        Every machine's statistics and anomaly score are computed locally in one vectorized
+        pass; only the top_k highest scoring machines are described in the prompt.
+        
+        Args:
+            fleet_history: Dict of machine_id -> sensor readings (list of dicts, DataFrame or columns)
+            top_k: Machines described (defaults to FLEET_DIGEST_TOP_K or 10)
             
         Returns:
-            Dict with 'summary' and 'anomalies'
+            Dict with 'summary' (plant-wide), 'machines' (top_k ranked machines with statistics
+            and a 'note'), 'ranking' (every machine's score), 'fleet', 'machine_count', 'flagged',
+            'skipped' and 'status'
         """
-        if not self.model:
-            return self._dummy_analysis(sensor_history)
+        digest = fleet_statistics(fleet_history)
+        top_k = int(top_k or self.fleet_top_k)
+        if not digest['machines']:
+            return self._fleet_analysis(digest, top_k, None, status='no_data')
+        if not self.model and not self.response_store.replay_only:
+            return self._dummy_fleet_analysis(digest, top_k)
         
         try:
-            import pandas as pd
+            prompt = self._build_fleet_prompt(digest, top_k)
             
-            # Convert to DataFrame if needed
-            if isinstance(sensor_history, list):
-                df = pd.DataFrame(sensor_history)
+            started = time.perf_counter()
+            content = self.response_store.get(prompt, self.model_name, self.model_params)
+            if content is not None:
+                self.metrics.record('gemini', self.model_name, EVENT_STORE_HIT)
             else:
-                df = sensor_history
-            
-            if len(df) < 5:
-                return self._dummy_analysis(sensor_history)
+                if self.response_store.replay_only:
+                    return self._dummy_fleet_analysis(digest, top_k)
+                
+                try:
+                    response = self.breaker.call(lambda: self.model.generate_content(prompt))
+                except CircuitOpenError:
+                    return self._dummy_fleet_analysis(digest, top_k)
+                except Exception as e:
+                    self.metrics.record('gemini', self.model_name, EVENT_ERROR,
+                                        wall_s=time.perf_counter() - started, error=str(e))
+                    raise
+                
+                content = response.text if hasattr(response, 'text') else str(response)
+                self._record_call(prompt, content, response, time.perf_counter() - started)
+                self.response_store.put(prompt, self.model_name, self.model_params, content)
             
-            # Prepare summary data
-            summary_data = {
-                'temperature': {
-                    'current': df['temperature'].iloc[-1],
-                    'avg': df['temperature'].mean(),
-                    'trend': 'increasing' if df['temperature'].iloc[-1] > df['temperature'].iloc[0] else 'decreasing'
-                },
-                'vibration': {
-                    'current': df['vibration'].iloc[-1],
-                    'avg': df['vibration'].mean(),
-                    'trend': 'increasing' if df['vibration'].iloc[-1] > df['vibration'].iloc[0] else 'decreasing'
-                },
-                'error_count': {
-                    'current': df['error_count'].iloc[-1],
-                    'avg': df['error_count'].mean(),
-                    'trend': 'increasing' if df['error_count'].iloc[-1] > df['error_count'].iloc[0] else 'stable'
-                }
-            }
+            return self._fleet_analysis(digest, top_k, content)
             
-            # Build prompt
-            prompt = f"""Analyze this industrial machine sensor data trend:
-
-Recent Sensor Readings (last {len(df)} readings):
-- Temperature: Current {summary_data['temperature']['current']:.1f}°C, Average {summary_data['temperature']['avg']:.1f}°C, Trend: {summary_data['temperature']['trend']}
-- Vibration: Current {summary_data['vibration']['current']:.2f} mm/s, Average {summary_data['vibration']['avg']:.2f} mm/s, Trend: {summary_data['vibration']['trend']}
-- Error Count: Current {summary_data['error_count']['current']:.0f}, Average {summary_data['error_count']['avg']:.1f}, Trend: {summary_data['error_count']['trend']}
-
-Provide:
-1. Brief trend summary (1-2 sentences)
-2. Any anomalies detected (if any)
-3. Key observations
-
-Keep it concise and actionable."""
+        except Exception as e:
+            # Safely handle error message to avoid encoding issues on Windows
+            try:
+                error_msg = str(e)
+            except:
+                error_msg = "Unknown error occurred"
+            import sys
+            try:
+                sys.stderr.write(f"Error analyzing fleet with Gemini: {error_msg}\n")
+            except:
+                pass  # Silently fail if even stderr write fails
+            return self._dummy_fleet_analysis(digest, top_k)
+    
+    async def aanalyze_fleet(self, fleet_history, top_k=None):
+        """
+        Async variant of analyze_fleet() - awaits Gemini without holding a worker thread
+        
+        Args:
+            fleet_history: Dict of machine_id -> sensor readings
+            top_k: Machines described (defaults to FLEET_DIGEST_TOP_K or 10)
             
-            # Generate response
-            response = self.model.generate_content(prompt)
+        Returns:
+            Same dict as analyze_fleet()
+        """
+        digest = fleet_statistics(fleet_history)
+        top_k = int(top_k or self.fleet_top_k)
+        if not digest['machines']:
+            return self._fleet_analysis(digest, top_k, None, status='no_data')
+        if not self.model and not self.response_store.replay_only:
+            return self._dummy_fleet_analysis(digest, top_k)
+        
+        try:
+            prompt = self._build_fleet_prompt(digest, top_k)
             
-            content = response.text if hasattr(response, 'text') else str(response)
+            started = time.perf_counter()
+            content = self.response_store.get(prompt, self.model_name, self.model_params)
+            if content is not None:
+                self.metrics.record('gemini', self.model_name, EVENT_STORE_HIT)
+            else:
+                if self.response_store.replay_only:
+                    return self._dummy_fleet_analysis(digest, top_k)
+                
+                try:
+                    response = await self.breaker.acall(lambda: self.model.generate_content_async(prompt))
+                except CircuitOpenError:
+                    return self._dummy_fleet_analysis(digest, top_k)
+                except Exception as e:
+                    self.metrics.record('gemini', self.model_name, EVENT_ERROR,
+                                        wall_s=time.perf_counter() - started, error=str(e))
+                    raise
+                
+                content = response.text if hasattr(response, 'text') else str(response)
+                self._record_call(prompt, content, response, time.perf_counter() - started)
+                self.response_store.put(prompt, self.model_name, self.model_params, content)
             
-            return {
-                'summary': content,
-                'anomalies': self._extract_anomalies(content),
-                'status': 'analyzed'
-            }
+            return self._fleet_analysis(digest, top_k, content)
             
         except Exception as e:
             # Safely handle error message to avoid encoding issues on Windows
@@ -113,58 +397,140 @@ Keep it concise and actionable."""
                 error_msg = str(e)
             except:
                 error_msg = "Unknown error occurred"
-            # Use a safer logging approach instead of print
             import sys
             try:
-                sys.stderr.write(f"Error analyzing trends with Gemini: {error_msg}\n")
+                sys.stderr.write(f"Error analyzing fleet with Gemini: {error_msg}\n")
             except:
                 pass  # Silently fail if even stderr write fails
-            return self._dummy_analysis(sensor_history)
+            return self._dummy_fleet_analysis(digest, top_k)
     
-    def _extract_anomalies(self, text):
-        """Extract anomaly mentions from text"""
-        anomalies = []
-        text_lower = text.lower()
-        
-        if 'anomaly' in text_lower or 'unusual' in text_lower or 'abnormal' in text_lower:
-            anomalies.append("Unusual patterns detected in sensor readings")
-        if 'increasing' in text_lower and ('temperature' in text_lower or 'vibration' in text_lower):
-            anomalies.append("Rising temperature or vibration detected")
-        if 'error' in text_lower and ('high' in text_lower or 'increasing' in text_lower):
-            anomalies.append("Elevated error count observed")
-        
-        return anomalies if anomalies else ["No significant anomalies detected"]
+    def _build_fleet_prompt(self, digest, top_k):
+        """Render the fleet prompt from a fleet_statistics() result; its size depends on top_k only"""
+        machines = digest['machines']
+        baseline = "\n".join(
+            f"- {SENSOR_LABELS.get(name, (name, ''))[0]}: {stats['median']:.2f}{SENSOR_LABELS.get(name, (name, ''))[1]}"
+            for name, stats in digest['fleet'].items()
+        )
+        return FLEET_PROMPT.format(
+            machine_count=len(machines),
+            fleet_baseline=baseline or "- Not available",
+            listed=min(top_k, len(machines)),
+            machine_lines="\n".join(digest_line(m) for m in machines[:top_k]),
+            flagged=sum(1 for m in machines if m['score'] > FLEET_SCORE_THRESHOLD),
+            threshold=FLEET_SCORE_THRESHOLD
+        )
+    
+    def _fleet_analysis(self, digest, top_k, content, status='analyzed'):
+        """Result dict for a fleet digest; machines without an LLM note get the local one"""
+        machines = digest['machines']
+        summary, notes = "", {}
+        if content is not None:
+            summary, notes = parse_fleet_response(content, [m['machine_id'] for m in machines[:top_k]])
+        flagged = sum(1 for m in machines if m['score'] > FLEET_SCORE_THRESHOLD)
+        if not summary:
+            summary = self._fleet_summary(digest, flagged) if machines else "No sensor data available for analysis."
+        listed = []
+        for machine in machines[:top_k]:
+            note = notes.get(machine['machine_id'])
+            listed.append(dict(machine, note=note or describe_machine(machine, digest['fleet']),
+                               note_source='llm' if note else 'local'))
+        return {
+            'summary': summary,
+            'machines': listed,
+            'ranking': [{'machine_id': m['machine_id'], 'score': m['score'], 'driver': m['driver']}
+                        for m in machines],
+            'fleet': digest['fleet'],
+            'machine_count': len(machines),
+            'flagged': flagged,
+            'skipped': digest['skipped'],
+            'status': status
+        }
+    
+    @staticmethod
+    def _fleet_summary(digest, flagged):
+        """Local plant-wide summary text"""
+        machines = digest['machines']
+        text = f"{len(machines)} machines analyzed; {flagged} need attention (score above {FLEET_SCORE_THRESHOLD:.1f})."
+        top = machines[0]
+        if top['score'] > FLEET_SCORE_THRESHOLD:
+            text += f" Highest: {top['machine_id']} - {describe_machine(top, digest['fleet'])}."
+        return text
+    
+    def _dummy_fleet_analysis(self, digest, top_k):
+        """Fallback fleet digest from the local statistics only"""
+        self.metrics.record('gemini', self.model_name, EVENT_FALLBACK)
+        return self._fleet_analysis(digest, top_k, None, status='dummy')
+    
+    def _record_call(self, prompt, content, response, wall_s):
+        """Record a completed call, estimating tokens when the response carries no usage data"""
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        completion_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        estimated = not prompt_tokens
+        if estimated:
+            prompt_tokens, completion_tokens = estimate_tokens(prompt), estimate_tokens(content)
+        self.metrics.record('gemini', self.model_name, EVENT_CALL, prompt_tokens=prompt_tokens,
+                            completion_tokens=completion_tokens, wall_s=wall_s, estimated=estimated)
+
+    def _analysis(self, content, window, trends, reused_age_s=None):
+        """Result dict for an LLM summary; anomalies and trends always come from the current window"""
+        anomalies, details = self._detect_anomalies(window)
+        result = {
+            'summary': content,
+            'anomalies': anomalies,
+            'anomaly_details': details,
+            'trends': trends,
+            'status': 'analyzed'
+        }
+        if reused_age_s is not None:
+            result['reused_age_s'] = round(reused_age_s, 1)
+        return result
+    
+    def _detect_anomalies(self, window):
+        """Run the local statistical detector over the whole window (no LLM involved)"""
+        details = detect_anomalies(window)
+        anomalies = [describe_anomaly(a) for a in details[:ANOMALY_SUMMARY_LIMIT]]
+        return (anomalies if anomalies else ["No significant anomalies detected"]), details
     
     def _dummy_analysis(self, sensor_history):
         """Fallback dummy analysis"""
-        import pandas as pd
+        self.metrics.record('gemini', self.model_name, EVENT_FALLBACK)
         
-        if isinstance(sensor_history, list):
-            df = pd.DataFrame(sensor_history)
-        else:
-            df = sensor_history
+        window = SensorWindow.from_history(recent_history(sensor_history))
+        summary = summarize(window)
         
-        if len(df) == 0:
+        if not summary:
             return {
                 'summary': "No sensor data available for analysis.",
                 'anomalies': [],
+                'anomaly_details': [],
+                'trends': {},
                 'status': 'no_data'
             }
         
-        temp_trend = "increasing" if df['temperature'].iloc[-1] > df['temperature'].iloc[0] else "stable"
-        vib_trend = "increasing" if df['vibration'].iloc[-1] > df['vibration'].iloc[0] else "stable"
-        
-        summary = f"Sensor trends show temperature {temp_trend} and vibration {vib_trend}. "
-        summary += f"Current readings: Temp {df['temperature'].iloc[-1]:.1f}°C, Vibration {df['vibration'].iloc[-1]:.2f} mm/s."
+        trends = estimate_trends(window)
+        if 'temperature' in summary and 'vibration' in summary:
+            temperature, vibration = summary['temperature'], summary['vibration']
+            temp_trend = self._trend_label(trends, 'temperature')
+            vib_trend = self._trend_label(trends, 'vibration')
+            
+            text = f"Sensor trends show temperature {temp_trend} and vibration {vib_trend}. "
+            text += f"Current readings: Temp {temperature['current']:.1f}°C, Vibration {vibration['current']:.2f} mm/s."
+        else:
+            readings = ", ".join(
+                f"{SENSOR_LABELS.get(name, (name, ''))[0]} {stats['current']:.2f}{SENSOR_LABELS.get(name, (name, ''))[1]}"
+                for name, stats in summary.items()
+            )
+            text = f"Current readings: {readings}."
+        if trends:
+            text += "\n\n" + describe_trends(trends)
         
-        anomalies = []
-        if df['temperature'].iloc[-1] > 85:
-            anomalies.append("High temperature detected (>85°C)")
-        if df['vibration'].iloc[-1] > 5:
-            anomalies.append("Elevated vibration detected (>5 mm/s)")
+        anomalies, details = self._detect_anomalies(window)
         
         return {
-            'summary': summary,
-            'anomalies': anomalies if anomalies else ["No significant anomalies"],
+            'summary': text,
+            'anomalies': anomalies,
+            'anomaly_details': details,
+            'trends': trends,
             'status': 'dummy'
         }
@@ -0,0 +1,291 @@
+"""
+LLM Call Metrics
+Token, latency, error and cost accounting for every OpenAI and Gemini call, aggregated per
+endpoint and per machine, with a rolling NDJSON event log written by a background thread
+"""
+import os
+import json
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Which API endpoint / machine the current LLM work is for (set by callers, inherited by worker threads)
+_endpoint = contextvars.ContextVar('llm_endpoint', default=None)
+_machine_id = contextvars.ContextVar('llm_machine_id', default=None)
+
+# USD per 1K tokens (prompt, completion); override with LLM_PRICES='{"model": [prompt, completion]}'
+MODEL_PRICES = {
+    'gpt-3.5-turbo': (0.0015, 0.002),
+    'gemini-pro': (0.000125, 0.000375)
+}
+
+# Event kinds
+EVENT_CALL = 'call'
+EVENT_ERROR = 'error'
+EVENT_FALLBACK = 'fallback'
+EVENT_CACHE_HIT = 'cache_hit'
+EVENT_STORE_HIT = 'store_hit'
+
+_COUNTERS = ('calls', 'errors', 'fallbacks', 'cache_hits', 'store_hits',
+             'prompt_tokens', 'completion_tokens', 'wall_s', 'cost_usd')
+_EVENT_COUNTER = {
+    EVENT_CALL: 'calls',
+    EVENT_ERROR: 'errors',
+    EVENT_FALLBACK: 'fallbacks',
+    EVENT_CACHE_HIT: 'cache_hits',
+    EVENT_STORE_HIT: 'store_hits'
+}
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English prompts)"""
+    return len(text) // 4 + 1
+
+
+@contextmanager
+def llm_call_context(endpoint=None, machine_id=None):
+    """Attribute LLM calls made inside the block to an endpoint and/or machine"""
+    tokens = []
+    if endpoint is not None:
+        tokens.append((_endpoint, _endpoint.set(endpoint)))
+    if machine_id is not None:
+        tokens.append((_machine_id, _machine_id.set(str(machine_id))))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def set_llm_endpoint(endpoint):
+    """Attribute LLM calls in the current context (e.g. one HTTP request) to an endpoint"""
+    _endpoint.set(endpoint)
+
+
+def _default_log_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'data', 'llm_metrics.ndjson')
+
+
+def _empty_counters():
+    return {name: 0 for name in _COUNTERS}
+
+
+class LLMMetrics:
+    """Thread-safe aggregation of LLM call events"""
+
+    def __init__(self, log_path=None, log_max_bytes=None, prices=None, log_queue_max=None):
+        """
+        Args:
+            log_path: NDJSON event log (defaults to LLM_METRICS_LOG or data/llm_metrics.ndjson;
+                      set LLM_METRICS_LOG=off to disable)
+            log_max_bytes: Size at which the log rotates to '<log_path>.1'
+                           (defaults to LLM_METRICS_LOG_MAX_BYTES or 5 MB)
+            log_queue_max: Events waiting for the log writer before the oldest are dropped
+                           (defaults to LLM_METRICS_LOG_QUEUE_MAX or 10000)
+            prices: Dict of model -> (prompt, completion) USD per 1K tokens (defaults to MODEL_PRICES
+                    updated from LLM_PRICES)
+        """
+        log_path = log_path or os.getenv("LLM_METRICS_LOG") or _default_log_path()
+        self.log_path = None if log_path.lower() == 'off' else log_path
+        self.log_max_bytes = int(log_max_bytes or os.getenv("LLM_METRICS_LOG_MAX_BYTES", 5 * 1024 * 1024))
+        self.prices = dict(MODEL_PRICES)
+        if prices:
+            self.prices.update(prices)
+        elif os.getenv("LLM_PRICES"):
+            try:
+                self.prices.update({k: tuple(v) for k, v in json.loads(os.getenv("LLM_PRICES")).items()})
+            except (ValueError, TypeError):
+                pass
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        # Events are appended to the log by a writer thread, so record() never touches the
+        # file from the caller - typically the API's event loop
+        self._log_cond = threading.Condition()
+        self._log_queue = deque(maxlen=int(log_queue_max or os.getenv("LLM_METRICS_LOG_QUEUE_MAX", 10000)))
+        self._log_writing = False
+        self._log_thread = None
+        self.log_written = 0
+        self.log_dropped = 0
+        self.log_errors = 0
+        if self.log_path:
+            # Events still queued when the process exits are written rather than lost
+            atexit.register(self.flush_log)
+        self.totals = _empty_counters()
+        self.by_provider = {}
+        self.by_endpoint = {}
+        self.by_machine = {}
+
+    def cost(self, model, prompt_tokens, completion_tokens):
+        """USD cost of a call from the per-1K-token price table (0 for unknown models)"""
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000.0
+
+    def record(self, provider, model, event, prompt_tokens=0, completion_tokens=0, wall_s=0.0,
+               error=None, estimated=False, machine_ids=None):
+        """
+        Record one LLM event
+
+        Args:
+            provider: 'openai' or 'gemini'
+            model: Model name used for pricing
+            event: 'call', 'error', 'fallback', 'cache_hit' or 'store_hit'
+            prompt_tokens, completion_tokens: Token counts (calls only)
+            wall_s: Wall time of the provider call in seconds
+            error: Error message for failed calls
+            estimated: Token counts are character-based estimates rather than provider-reported
+            machine_ids: Machines served by the call (defaults to the current context's machine);
+                         tokens, time and cost are split evenly between them
+        """
+        endpoint = _endpoint.get() or 'direct'
+        if machine_ids is None:
+            machine_ids = [_machine_id.get()] if _machine_id.get() else []
+        cost = self.cost(model, prompt_tokens, completion_tokens) if event == EVENT_CALL else 0.0
+        delta = _empty_counters()
+        delta[_EVENT_COUNTER[event]] = 1
+        delta['prompt_tokens'] = prompt_tokens
+        delta['completion_tokens'] = completion_tokens
+        delta['wall_s'] = wall_s
+        delta['cost_usd'] = cost
+        if event == EVENT_ERROR:
+            # A failed call still counts as a call
+            delta['calls'] = 1
+
+        with self._lock:
+            for bucket in (self.totals,
+                           self.by_provider.setdefault(provider, _empty_counters()),
+                           self.by_endpoint.setdefault(endpoint, _empty_counters())):
+                for name, value in delta.items():
+                    bucket[name] += value
+            share = 1.0 / len(machine_ids) if machine_ids else 0.0
+            for machine_id in machine_ids:
+                bucket = self.by_machine.setdefault(str(machine_id), _empty_counters())
+                for name, value in delta.items():
+                    bucket[name] += value * share if name in ('prompt_tokens', 'completion_tokens', 'wall_s', 'cost_usd') else value
+
+        self._log({
+            'ts': time.time(),
+            'provider': provider,
+            'model': model,
+            'event': event,
+            'endpoint': endpoint,
+            'machine_ids': [str(m) for m in machine_ids],
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'estimated_tokens': estimated,
+            'wall_ms': round(wall_s * 1000, 1),
+            'cost_usd': round(cost, 6),
+            'error': error
+        })
+
+    def _log(self, entry):
+        """Queue an event for the NDJSON log (the oldest queued event is dropped when full)"""
+        if not self.log_path:
+            return
+        with self._log_cond:
+            if len(self._log_queue) == self._log_queue.maxlen:
+                self.log_dropped += 1
+            self._log_queue.append(entry)
+            if self._log_thread is None:
+                self._log_thread = threading.Thread(target=self._log_worker, name="llm-metrics-log", daemon=True)
+                self._log_thread.start()
+            self._log_cond.notify_all()
+
+    def _log_worker(self):
+        while True:
+            with self._log_cond:
+                while not self._log_queue:
+                    self._log_cond.wait()
+                batch = list(self._log_queue)
+                self._log_queue.clear()
+                self._log_writing = True
+            try:
+                self._write_log(batch)
+            finally:
+                with self._log_cond:
+                    self._log_writing = False
+                    self._log_cond.notify_all()
+
+    def _write_log(self, batch):
+        """Append queued events in one write, rotating the log once it exceeds log_max_bytes"""
+        data = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        try:
+            directory = os.path.dirname(os.path.abspath(self.log_path))
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) + len(data) > self.log_max_bytes:
+                os.replace(self.log_path, self.log_path + ".1")
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(data)
+            with self._log_cond:
+                self.log_written += len(batch)
+        except OSError:
+            with self._log_cond:
+                self.log_errors += 1
+
+    def flush_log(self, timeout=5.0):
+        """
+        Wait until every queued event has been written to the log
+
+        Returns:
+            True if the queue drained within timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._log_cond:
+            while self._log_queue or self._log_writing:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._log_thread is None:
+                    return False
+                self._log_cond.wait(remaining)
+        return True
+
+    @staticmethod
+    def _summarize(counters, elapsed_min):
+        summary = {name: (round(value, 6) if isinstance(value, float) else value) for name, value in counters.items()}
+        summary['wall_s'] = round(counters['wall_s'], 3)
+        summary['avg_latency_ms'] = round(counters['wall_s'] / counters['calls'] * 1000, 1) if counters['calls'] else 0.0
+        requests = counters['calls'] + counters['cache_hits'] + counters['store_hits'] + counters['fallbacks']
+        summary['hit_rate'] = round((counters['cache_hits'] + counters['store_hits']) / requests, 4) if requests else 0.0
+        summary['calls_per_min'] = round(counters['calls'] / elapsed_min, 3) if elapsed_min else 0.0
+        summary['cost_per_hour_usd'] = round(counters['cost_usd'] / elapsed_min * 60, 6) if elapsed_min else 0.0
+        return summary
+
+    def _log_stats(self):
+        with self._log_cond:
+            return {
+                'queued': len(self._log_queue),
+                'written': self.log_written,
+                'dropped': self.log_dropped,
+                'errors': self.log_errors
+            }
+
+    def snapshot(self):
+        """Aggregated metrics: totals and per provider, endpoint and machine"""
+        with self._lock:
+            elapsed_min = max((time.time() - self.started_at) / 60.0, 1e-9)
+            return {
+                'since': self.started_at,
+                'uptime_s': round(elapsed_min * 60, 1),
+                'log_path': self.log_path,
+                'log': self._log_stats(),
+                'totals': self._summarize(self.totals, elapsed_min),
+                'by_provider': {k: self._summarize(v, elapsed_min) for k, v in self.by_provider.items()},
+                'by_endpoint': {k: self._summarize(v, elapsed_min) for k, v in self.by_endpoint.items()},
+                'by_machine': {k: self._summarize(v, elapsed_min) for k, v in self.by_machine.items()}
+            }
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_llm_metrics():
+    """Process-wide LLMMetrics instance shared by all analyzers"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = LLMMetrics()
+        return _metrics
@@ -0,0 +1,221 @@
+"""
+LLM Response Store
+Persistent SQLite store of LLM responses keyed on the exact rendered prompt, model and parameters
+Shared by the API and the dashboard, and usable as a read-only replay source
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Store modes
+MODE_OFF = 'off'
+MODE_READWRITE = 'readwrite'
+MODE_READONLY = 'readonly'  # Replay: serve stored responses only, never call the LLM
+
+
+def _default_store_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'data', 'llm_responses.db')
+
+
+class LLMResponseStore:
+    """Persistent, size-bounded LLM response store with concurrent readers"""
+
+    def __init__(self, path=None, mode=None, max_bytes=None):
+        """
+        Args:
+            path: SQLite database file (defaults to LLM_STORE_PATH or data/llm_responses.db)
+            mode: 'readwrite', 'readonly' (replay) or 'off' (defaults to LLM_STORE_MODE or readwrite)
+            max_bytes: Total stored prompt+response bytes before least recently used entries are evicted
+                       (defaults to LLM_STORE_MAX_BYTES or 50 MB)
+        """
+        self.path = path or os.getenv("LLM_STORE_PATH") or _default_store_path()
+        self.mode = (mode or os.getenv("LLM_STORE_MODE", MODE_READWRITE)).lower()
+        if self.mode not in (MODE_OFF, MODE_READWRITE, MODE_READONLY):
+            self.mode = MODE_READWRITE
+        self.max_bytes = int(max_bytes or os.getenv("LLM_STORE_MAX_BYTES", 50 * 1024 * 1024))
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        if self.mode == MODE_READWRITE:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        model TEXT NOT NULL,
+                        prompt TEXT NOT NULL,
+                        response TEXT NOT NULL,
+                        size INTEGER NOT NULL,
+                        created REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+                self._create_size_total(conn)
+
+    @staticmethod
+    def _create_size_total(conn):
+        """
+        Keep the total stored size in a one-row table, updated by triggers in the same transaction
+        as each write, so every process sharing the file sees it without summing the responses
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_size (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    total INTEGER NOT NULL
+                )
+            """)
+            # Seeds stores written before the total was kept
+            conn.execute("INSERT OR IGNORE INTO store_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM responses")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses
+                BEGIN UPDATE store_size SET total = total + NEW.size WHERE id = 0; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses
+                BEGIN UPDATE store_size SET total = total - OLD.size + NEW.size WHERE id = 0; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses
+                BEGIN UPDATE store_size SET total = total - OLD.size WHERE id = 0; END
+            """)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    @property
+    def enabled(self):
+        return self.mode != MODE_OFF
+
+    @property
+    def replay_only(self):
+        """True when misses must not fall through to a live LLM call"""
+        return self.mode == MODE_READONLY
+
+    def _connection(self):
+        """One connection per thread so readers do not serialize on a shared handle"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                if self.mode == MODE_READONLY:
+                    conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, isolation_level=None, timeout=5.0)
+                else:
+                    conn = sqlite3.connect(self.path, isolation_level=None, timeout=5.0)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+            except sqlite3.Error:
+                return None
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(prompt, model, params=None):
+        """Hash of the exact rendered prompt, model name and sorted generation parameters"""
+        payload = json.dumps([prompt, model, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, prompt, model, params=None):
+        """
+        Look up a stored response
+
+        Returns:
+            Response text, or None on a miss (or when the store is off/unavailable)
+        """
+        if not self.enabled:
+            return None
+        conn = self._connection()
+        if conn is None:
+            return None
+        key = self.make_key(prompt, model, params)
+        try:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.mode == MODE_READWRITE:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error:
+            row = None
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def put(self, prompt, model, params, response):
+        """Store a response (no-op unless the store is read-write)"""
+        if self.mode != MODE_READWRITE or response is None:
+            return
+        conn = self._connection()
+        if conn is None:
+            return
+        now = time.time()
+        size = len(prompt.encode('utf-8')) + len(response.encode('utf-8'))
+        try:
+            # An upsert rather than INSERT OR REPLACE: REPLACE deletes the old row without firing
+            # the delete trigger, which would leave its size in the running total
+            conn.execute(
+                "INSERT INTO responses (key, model, prompt, response, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET model = excluded.model, prompt = excluded.prompt, "
+                "response = excluded.response, size = excluded.size, created = excluded.created, "
+                "last_access = excluded.last_access",
+                (self.make_key(prompt, model, params), model, prompt, response, size, now, now)
+            )
+            with self._stats_lock:
+                self.writes += 1
+            self._evict(conn)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn):
+        """Delete least recently used responses until the store is back under 90% of max_bytes"""
+        total = conn.execute("SELECT total FROM store_size WHERE id = 0").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        with self._stats_lock:
+            self.evictions += len(doomed)
+
+    def stats(self):
+        """Store metrics"""
+        entries, total = 0, 0
+        conn = self._connection() if self.enabled else None
+        if conn is not None:
+            try:
+                entries, total = conn.execute(
+                    "SELECT (SELECT COUNT(*) FROM responses), COALESCE((SELECT total FROM store_size WHERE id = 0), 0)"
+                ).fetchone()
+            except sqlite3.Error:
+                pass
+        with self._stats_lock:
+            return {
+                'mode': self.mode,
+                'path': self.path,
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,266 @@
+"""
+Sensor Data Replay
+Streams recorded sensor datasets through the prediction and alerting pipeline,
+either with the original timing or at a scaled speed (e.g. 10x, 100x)
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+# Add current directory to Python path to ensure imports work
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from ml_model import DowntimePredictor
+from automation import AutomationTrigger
+from error_codes import determine_error_code, ErrorCodes
+from sensor_loader import open_sensor_history
+from sensor_store import to_epoch_seconds
+
+# Fields that are converted to floats when reading recorded files
+SENSOR_FIELDS = [
+    'temperature', 'vibration', 'cycle_time', 'error_count',
+    'pressure', 'humidity', 'power_consumption', 'production_rate',
+    'power', 'production'
+]
+
+
+def parse_timestamp(value):
+    """Parse a recorded timestamp (ISO string, epoch seconds or datetime) into a datetime"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    try:
+        return datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def _coerce_reading(record):
+    """Convert numeric sensor fields of a raw record to floats"""
+    reading = dict(record)
+    for field in SENSOR_FIELDS:
+        value = reading.get(field)
+        if value is None or value == '' or value != value:
+            reading.pop(field, None)
+            continue
+        try:
+            reading[field] = float(value)
+        except (TypeError, ValueError):
+            reading.pop(field, None)
+    return reading
+
+
+def load_recorded_readings(path, start=None, end=None):
+    """
+    Stream readings from a recorded sensor file
+
+    Args:
+        path: JSON array (.json), NDJSON (.ndjson/.jsonl), CSV (.csv) or Parquet (.parquet) file
+        start: Optional inclusive lower time bound
+        end: Optional inclusive upper time bound
+
+    Yields:
+        Dict per reading with numeric sensor fields as floats
+    """
+    for record in open_sensor_history(path).iter_records(start, end):
+        yield _coerce_reading(record)
+
+
+def _timing_stats(values):
+    """Summarize a list of millisecond timings"""
+    if not values:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    arr = np.asarray(values, dtype=float)
+    return {
+        'mean': round(float(arr.mean()), 3),
+        'p50': round(float(np.percentile(arr, 50)), 3),
+        'p95': round(float(np.percentile(arr, 95)), 3),
+        'max': round(float(arr.max()), 3)
+    }
+
+
+class SensorReplayer:
+    """Replay recorded sensor readings through DowntimePredictor and AutomationTrigger"""
+
+    def __init__(self, predictor=None, automation=None, speed=1.0, trigger_alerts=True):
+        """
+        Args:
+            predictor: DowntimePredictor instance (trained on first use if needed)
+            automation: AutomationTrigger instance
+            speed: Playback speed multiplier (1.0 = original timing, 0 = as fast as possible)
+            trigger_alerts: Send readings through the alerting path
+        """
+        self.predictor = predictor or DowntimePredictor()
+        self.automation = automation or AutomationTrigger()
+        self.speed = speed
+        self.trigger_alerts = trigger_alerts
+
+    def iter_replay(self, readings):
+        """
+        Replay readings one at a time, pacing them by their recorded timestamps
+
+        Args:
+            readings: Iterable of sensor reading dicts
+
+        Yields:
+            Per-reading result dict (risk, error code, alert outcome and timings)
+        """
+        wall_start = None
+        first_ts = None
+
+        for index, reading in enumerate(readings):
+            ts = parse_timestamp(reading.get('timestamp'))
+            lag_ms = 0.0
+            offset_s = None
+
+            if ts is not None:
+                # Epoch seconds, so offset-aware and naive timestamps can be mixed in one recording
+                epoch_s = to_epoch_seconds(ts)
+                if first_ts is None:
+                    first_ts = epoch_s
+                    wall_start = time.perf_counter()
+                offset_s = epoch_s - first_ts
+                if self.speed and self.speed > 0:
+                    target = wall_start + offset_s / self.speed
+                    delay = target - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    lag_ms = max(0.0, (time.perf_counter() - target) * 1000)
+
+            sensor_data = {
+                'temperature': reading.get('temperature', 65),
+                'vibration': reading.get('vibration', 2.3),
+                'cycle_time': reading.get('cycle_time', 42.5),
+                'error_count': reading.get('error_count', 0)
+            }
+
+            start = time.perf_counter()
+            prediction = self.predictor.predict_risk(sensor_data)
+            predict_ms = (time.perf_counter() - start) * 1000
+
+            risk = prediction['risk']
+            error_code = determine_error_code(sensor_data, risk)
+
+            alert_result = None
+            alert_ms = 0.0
+            if self.trigger_alerts:
+                alert_sensor_data = dict(sensor_data)
+                if ts is not None:
+                    alert_sensor_data['timestamp'] = ts.isoformat()
+                start = time.perf_counter()
+                alert_result = self.automation.trigger_maintenance_alert(
+                    risk, alert_sensor_data, None, error_code
+                )
+                alert_ms = (time.perf_counter() - start) * 1000
+
+            yield {
+                'index': index,
+                'timestamp': ts.isoformat() if ts is not None else None,
+                'replay_offset_s': offset_s,
+                'risk': risk,
+                'error_code': error_code,
+                'error_severity': ErrorCodes.SEVERITY.get(error_code, 'UNKNOWN'),
+                'alert_triggered': bool(alert_result and alert_result.get('triggered')),
+                'alert_message': alert_result.get('message') if alert_result else None,
+                'predict_ms': round(predict_ms, 3),
+                'alert_ms': round(alert_ms, 3),
+                'lag_ms': round(lag_ms, 3)
+            }
+
+    def replay(self, path, log_path=None, limit=None, start=None, end=None):
+        """
+        Replay a recorded file and build a timing summary
+
+        Args:
+            path: Recorded sensor file (JSON, NDJSON, CSV or Parquet)
+            log_path: Optional NDJSON file receiving one result line per reading
+            limit: Optional maximum number of readings to replay
+            start: Optional inclusive lower time bound
+            end: Optional inclusive upper time bound
+
+        Returns:
+            Dict with replay timing summary
+        """
+        if not self.predictor.trained:
+            self.predictor.train()
+
+        predict_times = []
+        alert_times = []
+        lags = []
+        error_codes = {}
+        alerts_triggered = 0
+        high_risk = 0
+        first_offset = None
+        last_offset = None
+
+        log_file = open(log_path, 'w', encoding='utf-8') if log_path else None
+        wall_start = time.perf_counter()
+        try:
+            for result in self.iter_replay(load_recorded_readings(path, start, end)):
+                if log_file:
+                    log_file.write(json.dumps(result) + '\n')
+
+                predict_times.append(result['predict_ms'])
+                alert_times.append(result['alert_ms'])
+                lags.append(result['lag_ms'])
+                error_codes[result['error_code']] = error_codes.get(result['error_code'], 0) + 1
+                if result['alert_triggered']:
+                    alerts_triggered += 1
+                if result['risk'] >= 75:
+                    high_risk += 1
+                if result['replay_offset_s'] is not None:
+                    if first_offset is None:
+                        first_offset = result['replay_offset_s']
+                    last_offset = result['replay_offset_s']
+
+                if limit and len(predict_times) >= limit:
+                    break
+        finally:
+            if log_file:
+                log_file.close()
+
+        wall_time = time.perf_counter() - wall_start
+        recorded_span = (last_offset - first_offset) if first_offset is not None else 0.0
+        count = len(predict_times)
+
+        return {
+            'source': path,
+            'readings': count,
+            'speed': self.speed,
+            'wall_time_s': round(wall_time, 3),
+            'recorded_span_s': round(recorded_span, 3),
+            'effective_speed': round(recorded_span / wall_time, 2) if wall_time > 0 and recorded_span else None,
+            'throughput_per_s': round(count / wall_time, 2) if wall_time > 0 else None,
+            'high_risk_readings': high_risk,
+            'alerts_triggered': alerts_triggered,
+            'error_codes': error_codes,
+            'predict_ms': _timing_stats(predict_times),
+            'alert_ms': _timing_stats(alert_times),
+            'lag_ms': _timing_stats(lags)
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded sensor data through the prediction and alerting pipeline")
+    parser.add_argument("path", help="Recorded sensor file (.json, .ndjson/.jsonl, .csv or .parquet)")
+    parser.add_argument("--start", default=None, help="Replay only readings at or after this timestamp")
+    parser.add_argument("--end", default=None, help="Replay only readings at or before this timestamp")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed (1 = original timing, 10 = 10x, 0 = as fast as possible)")
+    parser.add_argument("--log", dest="log_path", default=None, help="Write per-reading results to this NDJSON file")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum number of readings to replay")
+    parser.add_argument("--no-alerts", action="store_true", help="Skip the n8n alerting path")
+    args = parser.parse_args()
+
+    replayer = SensorReplayer(speed=args.speed, trigger_alerts=not args.no_alerts)
+    summary = replayer.replay(args.path, log_path=args.log_path, limit=args.limit, start=args.start, end=args.end)
+    print(json.dumps(summary, indent=2))
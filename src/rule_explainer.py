@@ -0,0 +1,317 @@
+"""
+Rule-Based Explainer
+Deterministic root cause and recommended action composed from error codes, per-sensor
+attributions, deviations from baseline and trend direction - no LLM on the request path
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from error_codes import ErrorCodes, determine_error_code
+from anomaly_detection import SENSOR_LABELS
+from trend_estimation import estimate_trends, overall_direction
+
+# Nominal operating point and normal band half-width per sensor (matches the live generator)
+BASELINES = {
+    'temperature': {'baseline': 65.0, 'scale': 5.0},
+    'vibration': {'baseline': 2.3, 'scale': 0.5},
+    'cycle_time': {'baseline': 42.5, 'scale': 3.0},
+    'error_count': {'baseline': 0.3, 'scale': 1.0}
+}
+
+# Error code whose cause/action describes a sensor when it is the main driver
+SENSOR_ERROR_CODES = {
+    'temperature': ErrorCodes.HIGH_TEMPERATURE,
+    'vibration': ErrorCodes.HIGH_VIBRATION,
+    'error_count': ErrorCodes.HIGH_ERROR_COUNT,
+    'cycle_time': ErrorCodes.SLOW_CYCLE_TIME
+}
+
+
+class RuleExplainer:
+    """Compose explanations from ErrorCodes tables and the reading itself"""
+
+    def __init__(self, baselines=None):
+        """
+        Args:
+            baselines: Per-sensor dicts with 'baseline' and 'scale' (defaults to BASELINES)
+        """
+        self.baselines = baselines or BASELINES
+
+    def attributions(self, prediction_result, sensor_data):
+        """
+        Share of the current risk attributed to each sensor
+
+        Model feature importance weighted by how far the reading is outside its normal band,
+        normalized to sum to 1.
+        """
+        importance = prediction_result.get('feature_importance', {}) or {}
+        weights = {}
+        for name, spec in self.baselines.items():
+            value = sensor_data.get(name)
+            if value is None:
+                continue
+            deviation = max(0.0, (float(value) - spec['baseline']) / spec['scale'])
+            weights[name] = importance.get(name, 1.0 / len(self.baselines)) * deviation
+        total = sum(weights.values())
+        if total <= 0:
+            # Nothing out of band: fall back to the model's own importance
+            total = sum(importance.get(name, 0) for name in weights) or 1.0
+            weights = {name: importance.get(name, 0) for name in weights}
+        return {name: round(w / total, 4) for name, w in sorted(weights.items(), key=lambda x: x[1], reverse=True)}
+
+    def trends(self, history):
+        """Direction per sensor ('rising', 'falling' or 'stable') from estimate_trends, sensors without data left out"""
+        estimates = estimate_trends(history)
+        directions = {name: overall_direction(estimates, name) for name in self.baselines}
+        return {name: direction for name, direction in directions.items() if direction}
+
+    def deltas(self, sensor_data):
+        """Difference of each reading from its baseline"""
+        return {
+            name: round(float(sensor_data[name]) - spec['baseline'], 3)
+            for name, spec in self.baselines.items()
+            if sensor_data.get(name) is not None
+        }
+
+    def explain(self, prediction_result, sensor_data, history=None, error_code=None):
+        """
+        Build a deterministic explanation
+
+        Args:
+            prediction_result: Dict with 'risk' and 'feature_importance'
+            sensor_data: Dict with sensor readings
+            history: Optional list of recent readings (oldest first) for trend direction
+            error_code: Optional error code (determined from the reading if omitted)
+
+        Returns:
+            Dict with 'root_cause', 'recommended_action', 'error_code', 'attributions',
+            'deltas' and 'trends'
+        """
+        risk = prediction_result.get('risk', 0)
+        if error_code is None:
+            error_code = determine_error_code(sensor_data, risk)
+        attributions = self.attributions(prediction_result, sensor_data)
+        deltas = self.deltas(sensor_data)
+        trends = self.trends(history) if history else {}
+
+        drivers = [name for name, share in attributions.items() if share > 0 and deltas.get(name, 0) > 0][:2]
+        driver_text = "; ".join(self._describe(name, sensor_data[name], deltas[name], trends.get(name))
+                                for name in drivers)
+
+        description = ErrorCodes.DESCRIPTIONS.get(error_code, "Unknown error")
+        if error_code == ErrorCodes.UNKNOWN and drivers:
+            # No threshold crossed: explain through the strongest sensor instead of the generic code
+            cause = ErrorCodes.CAUSES[SENSOR_ERROR_CODES[drivers[0]]]
+        else:
+            cause = ErrorCodes.CAUSES.get(error_code, ErrorCodes.CAUSES[ErrorCodes.UNKNOWN])
+        root_cause = f"Downtime risk {risk}% ({error_code} {description}). Likely cause: {cause}."
+        if driver_text:
+            root_cause += f" Main drivers: {driver_text}."
+        else:
+            root_cause += " All monitored sensors are within their normal range."
+
+        actions = [ErrorCodes.ACTIONS.get(error_code, ErrorCodes.ACTIONS[ErrorCodes.UNKNOWN])]
+        if drivers and SENSOR_ERROR_CODES[drivers[0]] != error_code:
+            secondary = ErrorCodes.ACTIONS[SENSOR_ERROR_CODES[drivers[0]]]
+            actions.append(secondary[0].lower() + secondary[1:])
+        if any(trends.get(name) == 'rising' for name in drivers):
+            actions.append("readings are still rising, so act before the next shift")
+        recommended_action = "; ".join(actions)
+        recommended_action = recommended_action[0].upper() + recommended_action[1:] + "."
+
+        return {
+            'root_cause': root_cause,
+            'recommended_action': recommended_action,
+            'error_code': error_code,
+            'attributions': attributions,
+            'deltas': deltas,
+            'trends': trends
+        }
+
+    def _describe(self, name, value, delta, trend):
+        baseline = self.baselines[name]['baseline']
+        label, unit = SENSOR_LABELS.get(name, (name, ''))
+        text = f"{label.lower()} {float(value):.1f}{unit} ({delta:+.1f}{unit} vs baseline {baseline:.1f}{unit}"
+        if trend:
+            text += f", {trend}"
+        return text + ")"
+
+
+# Enrichment states
+ENRICHMENT_PENDING = 'pending'
+ENRICHMENT_DONE = 'enriched'
+ENRICHMENT_FAILED = 'failed'
+ENRICHMENT_RULES_ONLY = 'rules_only'  # No enrichment requested (or no LLM configured)
+ENRICHMENT_SKIPPED = 'skipped'        # Enrichment queue was full
+
+
+def _default_enrichment_path():
+    # Same file as the LLM response store (llm_store.py)
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'data', 'llm_responses.db')
+
+
+def _json_default(value):
+    """numpy scalars and other numbers in rule results"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class EnrichmentQueue:
+    """
+    Background LLM enrichment of rule explanations, fetchable later by explanation ID
+
+    Explanations are kept in SQLite (by default the LLM response store's file), so any API
+    worker process can answer for an explanation another one produced.
+    """
+
+    def __init__(self, enrich_fn, path=None, max_workers=None, max_entries=None, max_pending=None):
+        """
+        Args:
+            enrich_fn: Callable(prediction_result, sensor_data) returning an explanation dict
+            path: SQLite database file (defaults to the LLM response store's: LLM_STORE_PATH
+                  or data/llm_responses.db)
+            max_workers: Concurrent enrichment jobs (defaults to ENRICHMENT_WORKERS or 2)
+            max_entries: Explanations remembered before the oldest are dropped
+                         (defaults to ENRICHMENT_MAX_ENTRIES or 1000)
+            max_pending: Enrichments waiting or running in this process before further ones are
+                         skipped (defaults to ENRICHMENT_MAX_PENDING or 64)
+        """
+        self.enrich_fn = enrich_fn
+        self.path = path or os.getenv("LLM_STORE_PATH") or _default_enrichment_path()
+        self.max_workers = int(max_workers or os.getenv("ENRICHMENT_WORKERS", 2))
+        self.max_entries = int(max_entries or os.getenv("ENRICHMENT_MAX_ENTRIES", 1000))
+        self.max_pending = int(max_pending or os.getenv("ENRICHMENT_MAX_PENDING", 64))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="enrichment")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS explanations (
+                explanation_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                rules TEXT NOT NULL,
+                enriched TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_explanations_created ON explanations (created)")
+
+    def _connection(self):
+        """One connection per thread; WAL lets every worker process share the file"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def submit(self, rule_result, prediction_result, sensor_data, enrich=True):
+        """
+        Record a rule explanation and optionally queue its LLM enrichment
+
+        Returns:
+            (explanation_id, status) - status is 'pending', 'rules_only', or 'skipped' when
+            max_pending enrichments are already queued
+        """
+        explanation_id = uuid.uuid4().hex
+        with self._lock:
+            if not enrich:
+                status = ENRICHMENT_RULES_ONLY
+            elif self._pending >= self.max_pending:
+                status = ENRICHMENT_SKIPPED
+                self.skipped += 1
+            else:
+                status = ENRICHMENT_PENDING
+                self._pending += 1
+                self.submitted += 1
+
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO explanations (explanation_id, status, rules, created, updated) VALUES (?, ?, ?, ?, ?)",
+            (explanation_id, status, json.dumps(rule_result, default=_json_default), now, now)
+        )
+        # Keep the newest max_entries explanations
+        conn.execute(
+            "DELETE FROM explanations WHERE created < "
+            "(SELECT created FROM explanations ORDER BY created DESC LIMIT 1 OFFSET ?)",
+            (self.max_entries - 1,)
+        )
+        if status == ENRICHMENT_PENDING:
+            # Runs in a copy of the caller's context so per-request context variables carry over
+            self._executor.submit(contextvars.copy_context().run, self._run,
+                                  explanation_id, prediction_result, sensor_data)
+        return explanation_id, status
+
+    def _run(self, explanation_id, prediction_result, sensor_data):
+        try:
+            enriched = self.enrich_fn(prediction_result, sensor_data)
+            status = ENRICHMENT_DONE
+        except Exception:
+            enriched, status = None, ENRICHMENT_FAILED
+        try:
+            self._connection().execute(
+                "UPDATE explanations SET status = ?, enriched = ?, updated = ? WHERE explanation_id = ?",
+                (status, json.dumps(enriched, default=_json_default) if enriched is not None else None,
+                 time.time(), explanation_id)
+            )
+        except sqlite3.Error:
+            status = ENRICHMENT_FAILED
+        with self._lock:
+            self._pending -= 1
+            if status == ENRICHMENT_DONE:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def get(self, explanation_id):
+        """Current state of an explanation, or None if unknown or expired"""
+        row = self._connection().execute(
+            "SELECT status, rules, enriched FROM explanations WHERE explanation_id = ?", (explanation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'explanation_id': explanation_id,
+            'status': row[0],
+            'rules': json.loads(row[1]),
+            'enriched': json.loads(row[2]) if row[2] is not None else None
+        }
+
+    def stats(self):
+        """Queue metrics ('pending' is this process's queue, 'entries' is shared)"""
+        try:
+            entries = self._connection().execute("SELECT COUNT(*) FROM explanations").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        with self._lock:
+            return {
+                'path': self.path,
+                'entries': entries,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'skipped': self.skipped
+            }
@@ -0,0 +1,501 @@
+"""
+Sensor History Loader
+Streams large sensor history files in time-bounded chunks instead of loading them whole
+Supports NDJSON, CSV, Parquet (columnar) and legacy JSON array files
+"""
+import os
+import io
+import re
+import csv
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+from dateutil import tz
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Rows per sparse index checkpoint for text formats
+INDEX_STRIDE = 5000
+INDEX_VERSION = 3
+
+_NDJSON_TS_PATTERN = re.compile(rb'"timestamp"\s*:\s*(?:"([^"]*)"|(-?\d+(?:\.\d+)?))')
+
+# ISO strings ending in a UTC offset ('Z', '+02:00', '-0500')
+_OFFSET_PATTERN = r'(?:Z|[+-]\d{2}:?\d{2})$'
+
+
+def detect_format(path):
+    """Detect the history file format from its extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.ndjson', '.jsonl'):
+        return 'ndjson'
+    if extension == '.csv':
+        return 'csv'
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension == '.json':
+        return 'json'
+    raise ValueError(f"Unsupported sensor history format: {extension or path}")
+
+
+def _to_local(parsed):
+    """Offset-aware datetimes as naive local wall-clock times"""
+    return parsed.dt.tz_convert(tz.tzlocal()).dt.tz_localize(None)
+
+
+def to_timestamp_ns(value):
+    """
+    Convert a datetime, ISO string, pandas Timestamp or epoch seconds into naive local-time
+    nanoseconds (None passes through)
+
+    Naive values are local time, as in sensor_store.to_epoch_seconds.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float, np.number)):
+        ts = pd.Timestamp(value, unit='s', tz='UTC')
+    else:
+        ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert(tz.tzlocal()).tz_localize(None)
+    return int(ts.value)
+
+
+def _split_csv_line(line):
+    """Fields of one CSV line; quoted fields may contain commas"""
+    if b'"' not in line:
+        return [field.strip() for field in line.rstrip(b'\r\n').split(b',')]
+    row = next(csv.reader([line.rstrip(b'\r\n').decode('utf-8')]), [])
+    return [field.strip().encode('utf-8') for field in row]
+
+
+def _parse_timestamps(values):
+    """
+    Vectorized timestamp parsing into a Series of naive local-time datetimes, NaT when unparseable
+
+    Naive ISO strings are taken as local time (as sensor_store.to_epoch_seconds reads them);
+    strings with a UTC offset and numeric epoch seconds are converted to local time.
+    """
+    series = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return _to_local(series) if series.dt.tz is not None else series
+    epoch = pd.to_numeric(series, errors='coerce')
+    numeric = epoch.notna()
+    text = series.astype(str).str.strip()
+    aware = ~numeric & text.str.contains(_OFFSET_PATTERN, regex=True)
+    naive = ~numeric & ~aware
+
+    parsed = pd.Series(pd.NaT, index=series.index, dtype='datetime64[ns]')
+    if naive.any():
+        parsed[naive] = pd.to_datetime(text[naive], format='ISO8601', errors='coerce')
+    if aware.any():
+        parsed[aware] = _to_local(pd.to_datetime(text[aware], format='ISO8601', errors='coerce', utc=True))
+    if numeric.any():
+        parsed[numeric] = _to_local(pd.to_datetime(epoch[numeric], unit='s', utc=True))
+    return parsed
+
+
+class SensorHistorySource:
+    """Chunked, time-range aware reader for a sensor history file"""
+
+    def __init__(self, path, chunk_size=50000, index_stride=INDEX_STRIDE):
+        """
+        Args:
+            path: History file (.ndjson/.jsonl, .csv, .parquet or .json)
+            chunk_size: Approximate number of rows per yielded chunk
+            index_stride: Rows per sparse index checkpoint for text formats
+        """
+        self.path = os.path.abspath(path)
+        self.format = detect_format(path)
+        self.chunk_size = chunk_size
+        self.index_stride = index_stride
+        self._csv_header = b''
+        self._json_df = None
+        self.sorted = True
+        self.blocks = []
+
+        if self.format == 'parquet':
+            self._build_parquet_index()
+        elif self.format == 'json':
+            self._build_json_index()
+        else:
+            self._load_or_build_text_index()
+
+    @property
+    def row_count(self):
+        """Total number of rows in the file"""
+        return sum(block['rows'] for block in self.blocks)
+
+    def time_bounds(self):
+        """Return (first, last) timestamps in the file, or (None, None) when empty"""
+        mins = [b['min'] for b in self.blocks if b['min'] is not None]
+        maxs = [b['max'] for b in self.blocks if b['max'] is not None]
+        if not mins:
+            return None, None
+        return pd.Timestamp(min(mins)), pd.Timestamp(max(maxs))
+
+    # ------------------------------------------------------------------
+    # Index construction
+    # ------------------------------------------------------------------
+
+    def _index_path(self):
+        return self.path + '.idx.json'
+
+    def _load_or_build_text_index(self):
+        """Load the cached sparse index if it matches the file, otherwise rebuild it"""
+        stat = os.stat(self.path)
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if (cached.get('version') == INDEX_VERSION and cached.get('size') == stat.st_size
+                    and cached.get('mtime') == stat.st_mtime and cached.get('stride') == self.index_stride):
+                self.blocks = cached['blocks']
+                self.sorted = cached['sorted']
+                self._csv_header = cached.get('csv_header', '').encode('utf-8')
+                return
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self._build_text_index()
+
+        try:
+            with open(self._index_path(), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': INDEX_VERSION,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'stride': self.index_stride,
+                    'sorted': self.sorted,
+                    'csv_header': self._csv_header.decode('utf-8'),
+                    'blocks': self.blocks
+                }, f)
+        except OSError:
+            pass  # Read-only location: keep the index in memory only
+
+    def _build_text_index(self):
+        """One pass over an NDJSON/CSV file recording byte offsets and min/max timestamp per block"""
+        blocks = []
+        ts_column = None
+
+        with open(self.path, 'rb') as f:
+            offset = 0
+            if self.format == 'csv':
+                self._csv_header = f.readline()
+                offset = len(self._csv_header)
+                header = _split_csv_line(self._csv_header)
+                ts_column = header.index(b'timestamp') if b'timestamp' in header else None
+
+            block_start = offset
+            block_ts = []
+            for line in f:
+                offset += len(line)
+                if not line.strip():
+                    continue
+                block_ts.append(self._extract_timestamp(line, ts_column))
+                if len(block_ts) >= self.index_stride:
+                    blocks.append(self._make_block(block_start, offset, block_ts))
+                    block_start = offset
+                    block_ts = []
+            if block_ts:
+                blocks.append(self._make_block(block_start, offset, block_ts))
+
+        self.blocks = blocks
+        self.sorted = all(b['sorted'] for b in blocks) and all(
+            prev['max'] is None or nxt['min'] is None or prev['max'] <= nxt['min']
+            for prev, nxt in zip(blocks, blocks[1:])
+        )
+
+    def _extract_timestamp(self, line, ts_column):
+        """Pull the raw timestamp string out of a line without parsing the whole record"""
+        if self.format == 'csv':
+            if ts_column is None:
+                return None
+            fields = _split_csv_line(line)
+            return fields[ts_column].decode('utf-8') if ts_column < len(fields) else None
+        match = _NDJSON_TS_PATTERN.search(line)
+        if match:
+            return (match.group(1) if match.group(1) is not None else match.group(2)).decode('utf-8')
+        value = json.loads(line).get('timestamp')
+        return str(value) if value is not None else None
+
+    def _make_block(self, start, end, raw_timestamps):
+        """Describe one index block by byte range, row count and timestamp range"""
+        ts = _parse_timestamps(raw_timestamps)
+        valid = ts.dropna()
+        values = valid.values.astype('datetime64[ns]').astype(np.int64)
+        return {
+            'start': start,
+            'end': end,
+            'rows': len(raw_timestamps),
+            'min': int(values.min()) if len(values) else None,
+            'max': int(values.max()) if len(values) else None,
+            'sorted': bool(np.all(np.diff(values) >= 0))
+        }
+
+    def _build_parquet_index(self):
+        """Use row group statistics as sorted-chunk metadata"""
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required to read Parquet sensor history")
+        self._parquet = pq.ParquetFile(self.path)
+        metadata = self._parquet.metadata
+        schema_names = self._parquet.schema_arrow.names
+        ts_index = schema_names.index('timestamp') if 'timestamp' in schema_names else None
+
+        blocks = []
+        for i in range(metadata.num_row_groups):
+            row_group = metadata.row_group(i)
+            block = {'start': i, 'end': i + 1, 'rows': row_group.num_rows, 'min': None, 'max': None, 'sorted': True}
+            if ts_index is not None:
+                stats = row_group.column(ts_index).statistics
+                if stats is not None and stats.has_min_max:
+                    block['min'] = to_timestamp_ns(stats.min)
+                    block['max'] = to_timestamp_ns(stats.max)
+            blocks.append(block)
+
+        self.blocks = blocks
+        self.sorted = all(
+            prev['max'] is not None and nxt['min'] is not None and prev['max'] <= nxt['min']
+            for prev, nxt in zip(blocks, blocks[1:])
+        )
+
+    def _build_json_index(self):
+        """Legacy JSON arrays cannot be streamed; load once and index as a single block"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        df = pd.DataFrame(data)
+        if len(df) and 'timestamp' in df.columns:
+            df['timestamp'] = _parse_timestamps(df['timestamp']).values
+            df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        self._json_df = df
+        values = df['timestamp'].dropna().values.astype(np.int64) if 'timestamp' in df.columns else []
+        self.blocks = [{
+            'start': 0,
+            'end': len(df),
+            'rows': len(df),
+            'min': int(values.min()) if len(values) else None,
+            'max': int(values.max()) if len(values) else None,
+            'sorted': True
+        }]
+        self.sorted = True
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def _select_blocks(self, start_ns, end_ns):
+        """Blocks whose timestamp range overlaps [start_ns, end_ns]"""
+        selected = []
+        for block in self.blocks:
+            if block['min'] is None:
+                selected.append(block)
+                continue
+            if end_ns is not None and block['min'] > end_ns:
+                continue
+            if start_ns is not None and block['max'] < start_ns:
+                continue
+            selected.append(block)
+        return selected
+
+    def _group_blocks(self, blocks):
+        """Merge adjacent blocks into reads of roughly chunk_size rows"""
+        groups = []
+        current = []
+        rows = 0
+        for block in blocks:
+            contiguous = current and current[-1]['end'] == block['start']
+            if current and (not contiguous or rows + block['rows'] > self.chunk_size):
+                groups.append(current)
+                current = []
+                rows = 0
+            current.append(block)
+            rows += block['rows']
+        if current:
+            groups.append(current)
+        return groups
+
+    def _read_group(self, group, columns):
+        """Parse one group of contiguous blocks into a DataFrame"""
+        if self.format == 'json':
+            df = self._json_df.iloc[group[0]['start']:group[-1]['end']]
+            return df[columns].copy() if columns else df.copy()
+
+        if self.format == 'parquet':
+            read_columns = None
+            if columns:
+                read_columns = list(dict.fromkeys(['timestamp'] + columns))
+            table = self._parquet.read_row_groups([b['start'] for b in group], columns=read_columns)
+            df = table.to_pandas()
+        else:
+            with open(self.path, 'rb') as f:
+                f.seek(group[0]['start'])
+                buf = f.read(group[-1]['end'] - group[0]['start'])
+            if self.format == 'csv':
+                df = pd.read_csv(io.BytesIO(self._csv_header + buf))
+            else:
+                df = pd.DataFrame([json.loads(line) for line in buf.splitlines() if line.strip()])
+
+        if 'timestamp' in df.columns:
+            if not pd.api.types.is_datetime64_any_dtype(df['timestamp']) or df['timestamp'].dt.tz is not None:
+                df['timestamp'] = _parse_timestamps(df['timestamp']).values
+        if columns:
+            df = df[[c for c in columns if c in df.columns]]
+        return df
+
+    def _filter_range(self, df, start_ns, end_ns):
+        """Drop rows outside [start_ns, end_ns]"""
+        if not len(df) or 'timestamp' not in df.columns or (start_ns is None and end_ns is None):
+            return df
+        ts = df['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        mask = np.ones(len(df), dtype=bool)
+        if start_ns is not None:
+            mask &= ts >= start_ns
+        if end_ns is not None:
+            mask &= ts <= end_ns
+        return df[mask]
+
+    @staticmethod
+    def _rows_within(block, start_ns, end_ns):
+        """Rows of a block known to fall inside [start_ns, end_ns]; 0 when the block straddles a bound"""
+        if start_ns is None and end_ns is None:
+            return block['rows']
+        if block['min'] is None:
+            return 0
+        if start_ns is not None and block['min'] < start_ns:
+            return 0
+        if end_ns is not None and block['max'] > end_ns:
+            return 0
+        return block['rows']
+
+    def _iter_blocks(self, blocks, columns, start_ns, end_ns):
+        """Read the given blocks group by group, yielding filtered DataFrames"""
+        if columns:
+            columns = list(dict.fromkeys(['timestamp'] + list(columns)))
+        for group in self._group_blocks(blocks):
+            df = self._filter_range(self._read_group(group, columns), start_ns, end_ns)
+            if len(df):
+                yield df.reset_index(drop=True)
+
+    def _empty_frame(self, columns):
+        return pd.DataFrame(columns=list(dict.fromkeys(['timestamp'] + list(columns or []))))
+
+    def iter_chunks(self, start=None, end=None, columns=None):
+        """
+        Stream the rows within [start, end] as DataFrame chunks
+
+        Args:
+            start: Optional inclusive lower time bound
+            end: Optional inclusive upper time bound
+            columns: Optional list of columns to return ('timestamp' is always included)
+
+        Yields:
+            DataFrames of up to roughly chunk_size rows; ordered by time if the file is sorted
+        """
+        start_ns = to_timestamp_ns(start)
+        end_ns = to_timestamp_ns(end)
+        blocks = self._select_blocks(start_ns, end_ns)
+        yield from self._iter_blocks(blocks, columns, start_ns, end_ns)
+
+    def iter_records(self, start=None, end=None):
+        """Stream rows within [start, end] one dict at a time"""
+        for chunk in self.iter_chunks(start, end):
+            for record in chunk.to_dict('records'):
+                yield record
+
+    def read_range(self, start=None, end=None, columns=None):
+        """Read all rows within [start, end] into a single time-sorted DataFrame"""
+        chunks = list(self.iter_chunks(start, end, columns))
+        if not chunks:
+            return self._empty_frame(columns)
+        df = pd.concat(chunks, ignore_index=True)
+        if not self.sorted and 'timestamp' in df.columns:
+            df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        return df
+
+    def head(self, n, start=None, columns=None):
+        """First n readings at or after start, reading only the leading blocks"""
+        if not self.sorted:
+            return self.read_range(start, None, columns).head(n)
+        start_ns = to_timestamp_ns(start)
+        needed = []
+        rows = 0
+        for block in self._select_blocks(start_ns, None):
+            needed.append(block)
+            # A block straddling start contributes only some rows, so it does not count towards n
+            rows += self._rows_within(block, start_ns, None)
+            if rows >= n:
+                break
+        chunks = list(self._iter_blocks(needed, columns, start_ns, None))
+        if not chunks:
+            return self._empty_frame(columns)
+        return pd.concat(chunks, ignore_index=True).head(n)
+
+    def tail(self, n, end=None, columns=None):
+        """Last n readings at or before end, reading only the trailing blocks"""
+        if not self.sorted:
+            return self.read_range(None, end, columns).tail(n).reset_index(drop=True)
+        end_ns = to_timestamp_ns(end)
+        needed = []
+        rows = 0
+        for block in reversed(self._select_blocks(None, end_ns)):
+            needed.insert(0, block)
+            rows += self._rows_within(block, None, end_ns)
+            if rows >= n:
+                break
+        chunks = list(self._iter_blocks(needed, columns, None, end_ns))
+        if not chunks:
+            return self._empty_frame(columns)
+        return pd.concat(chunks, ignore_index=True).tail(n).reset_index(drop=True)
+
+
+def open_sensor_history(path, **kwargs):
+    """Open a sensor history file for chunked, time-range reads"""
+    return SensorHistorySource(path, **kwargs)
+
+
+def convert_to_parquet(source_path, dest_path, row_group_size=100000):
+    """
+    Convert a sensor history file into Parquet with one row group per chunk
+
+    Row group min/max statistics on 'timestamp' are what make time-range reads skip data,
+    so the source should be sorted by time.
+    """
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required to write Parquet sensor history")
+    source = SensorHistorySource(source_path, chunk_size=row_group_size)
+    writer = None
+    try:
+        for chunk in source.iter_chunks():
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(dest_path, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table, row_group_size=row_group_size)
+    finally:
+        if writer is not None:
+            writer.close()
+    return dest_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or convert a sensor history file")
+    parser.add_argument("path", help="Sensor history file (.ndjson/.jsonl, .csv, .parquet or .json)")
+    parser.add_argument("--to-parquet", dest="parquet_path", default=None, help="Convert the file to Parquet at this path")
+    args = parser.parse_args()
+
+    if args.parquet_path:
+        convert_to_parquet(args.path, args.parquet_path)
+        print(f"Wrote {args.parquet_path}")
+    else:
+        source = open_sensor_history(args.path)
+        first, last = source.time_bounds()
+        print(f"Format: {source.format}")
+        print(f"Rows: {source.row_count} in {len(source.blocks)} blocks (sorted: {source.sorted})")
+        print(f"Time range: {first} - {last}")
@@ -0,0 +1,448 @@
+"""
+Sensor Reading Store
+Embedded SQLite (WAL mode) time-series store for sensor readings per machine
+Maintains 1-minute and 1-hour min/max/mean rollups incrementally at write time
+"""
+import os
+import time
+import atexit
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+# Canonical sensor columns stored for every reading
+SENSOR_COLUMNS = [
+    'temperature', 'vibration', 'cycle_time', 'error_count',
+    'pressure', 'humidity', 'power', 'production'
+]
+_SENSOR_INDEX = {name: i for i, name in enumerate(SENSOR_COLUMNS)}
+
+# Alternate field names used by the dashboard and the sample data file
+SENSOR_ALIASES = {
+    'power_consumption': 'power',
+    'production_rate': 'production'
+}
+
+# Rollup tiers: name -> bucket width in seconds
+ROLLUP_TIERS = {
+    '1m': 60,
+    '1h': 3600
+}
+
+# Upper bound on points returned by a history query; coarser resolutions are used beyond it
+MAX_QUERY_POINTS = 10000
+
+# Retention per tier in seconds, relative to the newest stored reading
+DEFAULT_RETENTION = {
+    'raw': 7 * 86400,
+    '1m': 90 * 86400,
+    '1h': 5 * 365 * 86400
+}
+
+
+def _default_store_path():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'data', 'sensor_store.db')
+
+
+def to_epoch_seconds(value):
+    """Convert a reading timestamp (ISO string, datetime or epoch) into epoch seconds; naive values are local time"""
+    if value is None or value == '':
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if hasattr(value, 'to_pydatetime'):
+        # Before the datetime check: pandas reads a naive Timestamp as UTC, datetime as local time
+        return value.to_pydatetime().timestamp()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class SensorStore:
+    """Persist sensor readings per machine with batched writes and incremental rollups"""
+
+    def __init__(self, path=None, batch_size=5000, flush_interval_s=1.0, retention=None,
+                 retention_interval_s=60.0):
+        """
+        Args:
+            path: SQLite database file (defaults to SENSOR_STORE_PATH or data/sensor_store.db)
+            batch_size: Buffered readings that trigger a flush
+            flush_interval_s: Maximum age of buffered readings before a flush on the next append
+            retention: Dict of tier ('raw', '1m', '1h') -> seconds of history to keep
+            retention_interval_s: Minimum seconds between retention sweeps
+        """
+        self.path = path or os.getenv("SENSOR_STORE_PATH") or _default_store_path()
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.retention = dict(DEFAULT_RETENTION)
+        if retention:
+            self.retention.update(retention)
+        self.retention_interval_s = retention_interval_s
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._last_retention = 0.0
+        self.readings_written = 0
+
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        self._create_schema()
+        self._prepare_statements()
+
+        atexit.register(self.close)
+
+    def _create_schema(self):
+        sensor_defs = ", ".join(f"{s} REAL" for s in SENSOR_COLUMNS)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS readings (
+                machine_id TEXT NOT NULL,
+                ts REAL NOT NULL,
+                {sensor_defs}
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_readings_machine_ts ON readings (machine_id, ts)")
+
+        rollup_defs = ", ".join(
+            f"{s}_n INTEGER NOT NULL DEFAULT 0, {s}_sum REAL, {s}_min REAL, {s}_max REAL"
+            for s in SENSOR_COLUMNS
+        )
+        for tier in ROLLUP_TIERS:
+            self._conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS rollup_{tier} (
+                    machine_id TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    {rollup_defs},
+                    PRIMARY KEY (machine_id, bucket)
+                ) WITHOUT ROWID
+            """)
+
+    def _prepare_statements(self):
+        columns = ", ".join(SENSOR_COLUMNS)
+        placeholders = ", ".join("?" for _ in range(len(SENSOR_COLUMNS) + 2))
+        self._insert_raw_sql = f"INSERT INTO readings (machine_id, ts, {columns}) VALUES ({placeholders})"
+
+        rollup_columns = []
+        updates = []
+        for s in SENSOR_COLUMNS:
+            rollup_columns += [f"{s}_n", f"{s}_sum", f"{s}_min", f"{s}_max"]
+            updates += [
+                f"{s}_n = {s}_n + excluded.{s}_n",
+                f"{s}_sum = COALESCE({s}_sum, 0) + COALESCE(excluded.{s}_sum, 0)",
+                f"{s}_min = MIN(COALESCE({s}_min, excluded.{s}_min), COALESCE(excluded.{s}_min, {s}_min))",
+                f"{s}_max = MAX(COALESCE({s}_max, excluded.{s}_max), COALESCE(excluded.{s}_max, {s}_max))"
+            ]
+        rollup_placeholders = ", ".join("?" for _ in range(len(rollup_columns) + 2))
+        self._upsert_rollup_sql = {
+            tier: (
+                f"INSERT INTO rollup_{tier} (machine_id, bucket, {', '.join(rollup_columns)}) "
+                f"VALUES ({rollup_placeholders}) "
+                f"ON CONFLICT (machine_id, bucket) DO UPDATE SET {', '.join(updates)}"
+            )
+            for tier in ROLLUP_TIERS
+        }
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+
+    def _to_row(self, machine_id, reading):
+        values = [None] * len(SENSOR_COLUMNS)
+        for key, value in reading.items():
+            key = SENSOR_ALIASES.get(key, key)
+            if key in _SENSOR_INDEX and value is not None:
+                values[_SENSOR_INDEX[key]] = float(value)
+        return (str(machine_id), to_epoch_seconds(reading.get('timestamp')), *values)
+
+    def append(self, machine_id, reading):
+        """Buffer one reading; flushes when the batch is full or the buffer is older than flush_interval_s"""
+        self.append_many(machine_id, [reading])
+
+    def append_many(self, machine_id, readings):
+        """
+        Buffer readings for a machine
+
+        Args:
+            machine_id: Machine identifier
+            readings: Iterable of reading dicts (timestamp plus any of the sensor fields)
+
+        Returns:
+            Number of readings buffered
+        """
+        rows = [self._to_row(machine_id, reading) for reading in readings]
+        with self._lock:
+            self._pending.extend(rows)
+            if (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval_s):
+                self.flush()
+        return len(rows)
+
+    def flush(self):
+        """Write buffered readings and their rollup increments in one transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return 0
+            rows = self._pending
+            self._pending = []
+
+            rollups = self._aggregate(rows)
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(self._insert_raw_sql, rows)
+                for tier, tier_rows in rollups.items():
+                    self._conn.executemany(self._upsert_rollup_sql[tier], tier_rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.readings_written += len(rows)
+
+            if time.monotonic() - self._last_retention >= self.retention_interval_s:
+                self.enforce_retention()
+            return len(rows)
+
+    def _aggregate(self, rows):
+        """Reduce a batch of raw rows into per (machine, bucket) rollup increments for every tier"""
+        machine_ids = np.array([row[0] for row in rows], dtype=object)
+        ts = np.fromiter((row[1] for row in rows), dtype=float, count=len(rows))
+        values = np.array([row[2:] for row in rows], dtype=float)  # None -> nan
+        present = ~np.isnan(values)
+        sums = np.where(present, values, 0.0)
+        mins = np.where(present, values, np.inf)
+        maxs = np.where(present, values, -np.inf)
+
+        machine_keys, machine_codes = np.unique(machine_ids, return_inverse=True)
+        result = {}
+        for tier, width in ROLLUP_TIERS.items():
+            buckets = (np.floor(ts / width) * width).astype(np.int64)
+            order = np.lexsort((buckets, machine_codes))
+            keys = np.stack([machine_codes[order], buckets[order]], axis=1)
+            starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)])
+
+            counts = np.add.reduceat(present[order].astype(np.int64), starts, axis=0)
+            group_sums = np.add.reduceat(sums[order], starts, axis=0)
+            group_mins = np.minimum.reduceat(mins[order], starts, axis=0)
+            group_maxs = np.maximum.reduceat(maxs[order], starts, axis=0)
+
+            tier_rows = []
+            for g, start in enumerate(starts):
+                row = [machine_keys[keys[start, 0]], int(keys[start, 1])]
+                for s in range(len(SENSOR_COLUMNS)):
+                    n = int(counts[g, s])
+                    if n:
+                        row += [n, float(group_sums[g, s]), float(group_mins[g, s]), float(group_maxs[g, s])]
+                    else:
+                        row += [0, None, None, None]
+                tier_rows.append(row)
+            result[tier] = tier_rows
+        return result
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def select_tier(resolution_s):
+        """
+        Pick the coarsest stored tier whose bucket width does not exceed the requested resolution
+
+        Returns:
+            Tuple of (tier name, bucket width in seconds); ('raw', 0) when no rollup is fine enough
+        """
+        tier, width = 'raw', 0
+        for name, tier_width in sorted(ROLLUP_TIERS.items(), key=lambda item: item[1]):
+            if tier_width <= resolution_s:
+                tier, width = name, tier_width
+        return tier, width
+
+    def query(self, machine_id, sensors=None, start=None, end=None, resolution_s=60):
+        """
+        Time-range history query served from the coarsest rollup tier that satisfies the resolution
+
+        Args:
+            machine_id: Machine identifier
+            sensors: List of sensor names (defaults to all sensors)
+            start: Range start (ISO string, datetime or epoch seconds; defaults to 24h before end)
+            end: Range end (defaults to now)
+            resolution_s: Target bucket width in seconds (0 returns raw readings, at most the
+                          newest MAX_QUERY_POINTS of them)
+
+        Returns:
+            Columnar dict: 'timestamps' (epoch seconds of bucket starts) plus per-sensor
+            'mean', 'min', 'max' and 'count' arrays, and 'truncated' (older raw readings in
+            the range were left out)
+        """
+        sensors = [SENSOR_ALIASES.get(s, s) for s in (sensors or SENSOR_COLUMNS)]
+        unknown = [s for s in sensors if s not in _SENSOR_INDEX]
+        if unknown:
+            raise ValueError(f"Unknown sensors: {', '.join(unknown)}")
+
+        end_s = to_epoch_seconds(end) if end is not None else time.time()
+        start_s = to_epoch_seconds(start) if start is not None else end_s - 86400
+        if start_s > end_s:
+            raise ValueError("start must not be after end")
+
+        # Bound the result size regardless of the requested resolution
+        resolution_s = max(int(resolution_s or 0), 0)
+        min_resolution = int(np.ceil((end_s - start_s) / MAX_QUERY_POINTS))
+        if resolution_s and resolution_s < min_resolution:
+            resolution_s = min_resolution
+        tier, width = self.select_tier(resolution_s)
+        if width:
+            # Whole tier buckets per output bucket, so none is split across two points
+            resolution_s = -(-resolution_s // width) * width
+
+        self.flush()
+        with self._lock:
+            if tier == 'raw' and not resolution_s:
+                columns = ", ".join(f"{s}, {s}, {s}, ({s} IS NOT NULL)" for s in sensors)
+                # Newest readings first so a capped range keeps its recent end; one extra row tells
+                # whether anything was cut
+                rows = self._conn.execute(
+                    f"SELECT ts, {columns} FROM readings WHERE machine_id = ? AND ts >= ? AND ts <= ? "
+                    f"ORDER BY ts DESC LIMIT {MAX_QUERY_POINTS + 1}",
+                    (str(machine_id), start_s, end_s)
+                ).fetchall()
+                truncated = len(rows) > MAX_QUERY_POINTS
+                rows = rows[:MAX_QUERY_POINTS][::-1]
+            elif tier == 'raw':
+                truncated = False
+                columns = ", ".join(f"AVG({s}), MIN({s}), MAX({s}), COUNT({s})" for s in sensors)
+                rows = self._conn.execute(
+                    f"SELECT CAST(ts / {resolution_s} AS INTEGER) * {resolution_s} AS b, {columns} "
+                    f"FROM readings WHERE machine_id = ? AND ts >= ? AND ts <= ? GROUP BY b ORDER BY b",
+                    (str(machine_id), start_s, end_s)
+                ).fetchall()
+            else:
+                truncated = False
+                columns = ", ".join(
+                    f"SUM({s}_sum) / NULLIF(SUM({s}_n), 0), MIN({s}_min), MAX({s}_max), SUM({s}_n)"
+                    for s in sensors
+                )
+                rows = self._conn.execute(
+                    f"SELECT (bucket / {resolution_s}) * {resolution_s} AS b, {columns} "
+                    f"FROM rollup_{tier} WHERE machine_id = ? AND bucket >= ? AND bucket <= ? GROUP BY b ORDER BY b",
+                    (str(machine_id), int(start_s // width) * width, end_s)
+                ).fetchall()
+
+        result = {
+            'machine_id': str(machine_id),
+            'tier': tier,
+            'resolution_s': resolution_s,
+            'start': start_s,
+            'end': end_s,
+            'truncated': truncated,
+            'timestamps': [row[0] for row in rows],
+            'sensors': {}
+        }
+        for i, sensor in enumerate(sensors):
+            offset = 1 + i * 4
+            result['sensors'][sensor] = {
+                'mean': [row[offset] for row in rows],
+                'min': [row[offset + 1] for row in rows],
+                'max': [row[offset + 2] for row in rows],
+                'count': [int(row[offset + 3] or 0) for row in rows]
+            }
+        return result
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def enforce_retention(self):
+        """
+        Delete raw readings and rollups older than their tier's retention
+
+        Ages are measured from the newest stored reading, so backfilled or replayed
+        historical data is not discarded on arrival. The sweep runs per machine so every
+        lookup and delete is a range on the (machine_id, ts) / (machine_id, bucket) keys
+        rather than a scan of the whole table.
+        """
+        with self._lock:
+            self._last_retention = time.monotonic()
+            # Rollups are written in the same transaction as raw readings, so the (small) rollup
+            # tier kept longest lists every machine that still has raw readings
+            tier = max(ROLLUP_TIERS, key=lambda name: self.retention.get(name) or float('inf'))
+            machine_ids = [row[0] for row in self._conn.execute(f"SELECT DISTINCT machine_id FROM rollup_{tier}")]
+            newest = None
+            for machine_id in machine_ids:
+                machine_newest = self._conn.execute(
+                    "SELECT MAX(ts) FROM readings WHERE machine_id = ?", (machine_id,)
+                ).fetchone()[0]
+                if machine_newest is not None and (newest is None or machine_newest > newest):
+                    newest = machine_newest
+            if newest is None:
+                return 0
+
+            deleted = 0
+            self._conn.execute("BEGIN")
+            try:
+                for machine_id in machine_ids:
+                    if self.retention.get('raw'):
+                        cursor = self._conn.execute(
+                            "DELETE FROM readings WHERE machine_id = ? AND ts < ?",
+                            (machine_id, newest - self.retention['raw'])
+                        )
+                        deleted += cursor.rowcount
+                    for tier in ROLLUP_TIERS:
+                        if self.retention.get(tier):
+                            cursor = self._conn.execute(
+                                f"DELETE FROM rollup_{tier} WHERE machine_id = ? AND bucket < ?",
+                                (machine_id, newest - self.retention[tier])
+                            )
+                            deleted += cursor.rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return deleted
+
+    # ------------------------------------------------------------------
+    # Housekeeping
+    # ------------------------------------------------------------------
+
+    def machines(self):
+        """List machine IDs that have stored rollups"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT machine_id FROM rollup_1h ORDER BY machine_id").fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self):
+        """Row counts per table and buffered readings"""
+        with self._lock:
+            stats = {
+                'path': self.path,
+                'pending': len(self._pending),
+                'readings_written': self.readings_written,
+                'raw_rows': self._conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0]
+            }
+            for tier in ROLLUP_TIERS:
+                stats[f'rollup_{tier}_rows'] = self._conn.execute(f"SELECT COUNT(*) FROM rollup_{tier}").fetchone()[0]
+            return stats
+
+    def close(self):
+        """Flush buffered readings and close the database"""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+                self._conn = None
+
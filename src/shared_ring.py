@@ -0,0 +1,403 @@
+"""
+Shared Reading Ring Buffer
+Recent sensor readings per machine in a multiprocessing.shared_memory segment,
+so every API worker process sees the same latest windows without IPC round-trips
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+from sensor_store import SENSOR_COLUMNS, SENSOR_ALIASES, to_epoch_seconds
+
+# Fixed record layout shared by all processes
+READING_DTYPE = np.dtype([('ts', '<f8')] + [(name, '<f4') for name in SENSOR_COLUMNS])
+
+# Per-machine directory entry; 'seq' is the seqlock counter (odd while a write is in progress)
+SLOT_DTYPE = np.dtype([
+    ('machine_id', 'S64'),
+    ('used', '<u8'),
+    ('seq', '<u8'),
+    ('count', '<u8')
+])
+
+HEADER_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('max_machines', '<u8'),
+    ('capacity', '<u8'),
+    ('record_size', '<u8')
+])
+
+RING_MAGIC = 0x46434F50494C4F54  # "FCOPILOT"
+
+# Longest machine ID a slot holds, in UTF-8 bytes
+MACHINE_ID_BYTES = SLOT_DTYPE['machine_id'].itemsize
+
+
+def encode_machine_id(machine_id):
+    """
+    Slot key of a machine ID
+
+    Raises:
+        ValueError: The ID is longer than MACHINE_ID_BYTES in UTF-8 (truncating it could make
+                    two machines share a slot)
+    """
+    key = str(machine_id).encode('utf-8')
+    if len(key) > MACHINE_ID_BYTES:
+        raise ValueError(f"Machine ID is {len(key)} bytes long; the shared reading ring holds at most {MACHINE_ID_BYTES}")
+    return key
+
+
+def _untrack(shm):
+    """Stop this process's resource tracker from unlinking the segment when it exits"""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+class SharedReadingRing:
+    """Fixed-size ring of recent readings per machine, shared across processes"""
+
+    def __init__(self, name=None, capacity=None, max_machines=None):
+        """
+        Args:
+            name: Shared memory segment name (defaults to SENSOR_RING_NAME)
+            capacity: Readings kept per machine (defaults to SENSOR_RING_CAPACITY or 1024)
+            max_machines: Machine slots in the segment (defaults to SENSOR_RING_MACHINES or 256)
+        """
+        self.name = name or os.getenv("SENSOR_RING_NAME", "factory_copilot_ring")
+        self.capacity = int(capacity or os.getenv("SENSOR_RING_CAPACITY", 1024))
+        self.max_machines = int(max_machines or os.getenv("SENSOR_RING_MACHINES", 256))
+        self._slot_cache = {}
+        self._thread_lock = threading.Lock()
+        self._sole_writer = False
+        self.recovered = 0
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f"{self.name}.lock"), 'a+b')
+
+        with self._writer_lock(write=False):
+            self._shm = self._create_or_attach()
+
+        offset = 0
+        self._header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self._shm.buf, offset=offset)
+        offset += HEADER_DTYPE.itemsize
+        self.capacity = int(self._header['capacity'][0])
+        self.max_machines = int(self._header['max_machines'][0])
+        self._slots = np.ndarray((self.max_machines,), dtype=SLOT_DTYPE, buffer=self._shm.buf, offset=offset)
+        offset += SLOT_DTYPE.itemsize * self.max_machines
+        self._data = np.ndarray((self.max_machines, self.capacity), dtype=READING_DTYPE,
+                                buffer=self._shm.buf, offset=offset)
+
+    def _segment_size(self):
+        return (HEADER_DTYPE.itemsize + SLOT_DTYPE.itemsize * self.max_machines
+                + READING_DTYPE.itemsize * self.max_machines * self.capacity)
+
+    def _create_or_attach(self):
+        """Attach to an existing segment (keeping its layout) or create and initialize a new one"""
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=False)
+            _untrack(shm)
+            header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+            if int(header['magic'][0]) != RING_MAGIC or int(header['record_size'][0]) != READING_DTYPE.itemsize:
+                del header
+                shm.close()
+                raise RuntimeError(f"Shared memory segment '{self.name}' has an incompatible layout")
+            del header
+            return shm
+        except FileNotFoundError:
+            pass
+
+        try:
+            shm = shared_memory.SharedMemory(name=self.name, create=True, size=self._segment_size())
+        except FileExistsError:
+            # Created by another process in the meantime (only possible without fcntl)
+            return self._create_or_attach()
+        _untrack(shm)
+        shm.buf[:] = b'\x00' * shm.size
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header['max_machines'] = self.max_machines
+        header['capacity'] = self.capacity
+        header['record_size'] = READING_DTYPE.itemsize
+        header['magic'] = RING_MAGIC
+        del header
+        return shm
+
+    def _writer_lock(self, write=True):
+        """
+        Serialize writers across processes; readers never take this lock
+
+        Without fcntl there is no lock writers can take turns on, so the first process to write
+        becomes the ring's only writer (see _claim_sole_writer) and writes from any other process
+        are refused. write=False only serializes threads, for attaching to the segment.
+        """
+        ring = self
+
+        class _Lock:
+            def __enter__(self):
+                ring._thread_lock.acquire()
+                try:
+                    if FCNTL_AVAILABLE:
+                        fcntl.flock(ring._lock_file.fileno(), fcntl.LOCK_EX)
+                    elif write:
+                        ring._claim_sole_writer()
+                except BaseException:
+                    ring._thread_lock.release()
+                    raise
+
+            def __exit__(self, *exc):
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(ring._lock_file.fileno(), fcntl.LOCK_UN)
+                ring._thread_lock.release()
+
+        return _Lock()
+
+    def _claim_sole_writer(self):
+        """
+        Make this process the ring's only writer by locking the lock file until it exits (the OS
+        drops the lock when the process dies, so a crashed writer can be replaced)
+
+        Raises:
+            RuntimeError: Another live process already writes to the ring
+        """
+        if self._sole_writer:
+            return
+        try:
+            if msvcrt is None:
+                raise OSError("no file locking available")
+            self._lock_file.seek(0)
+            msvcrt.locking(self._lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as e:
+            raise RuntimeError(
+                f"Shared reading ring '{self.name}' is written by another process; without fcntl "
+                f"only one process may write to it ({e})"
+            ) from e
+        self._sole_writer = True
+
+    # ------------------------------------------------------------------
+    # Slots
+    # ------------------------------------------------------------------
+
+    def _find_slot(self, machine_id):
+        try:
+            key = encode_machine_id(machine_id)
+        except ValueError:
+            return None  # Too long to ever have been given a slot
+        slot = self._slot_cache.get(key)
+        if slot is not None:
+            return slot
+        matches = np.flatnonzero((self._slots['used'] == 1) & (self._slots['machine_id'] == key))
+        if len(matches):
+            self._slot_cache[key] = int(matches[0])
+            return int(matches[0])
+        return None
+
+    def _claim_slot(self, machine_id):
+        """Find or allocate the slot for a machine; caller holds the writer lock"""
+        key = encode_machine_id(machine_id)
+        slot = self._find_slot(machine_id)
+        if slot is not None:
+            return slot
+        free = np.flatnonzero(self._slots['used'] == 0)
+        if not len(free):
+            raise RuntimeError(f"Shared reading ring is full ({self.max_machines} machines)")
+        slot = int(free[0])
+        self._slots['machine_id'][slot] = key
+        self._slots['seq'][slot] = 0
+        self._slots['count'][slot] = 0
+        self._slots['used'][slot] = 1
+        return slot
+
+    def _recover_stale(self, slot):
+        """
+        Repair a slot left mid-write by a writer that died; caller holds the writer lock
+
+        Holding the lock means no write is in progress, so an odd sequence counter is stale.
+        The slot's records may be torn, so its window is emptied and the counter made even.
+
+        Returns:
+            True if the slot needed repair
+        """
+        seq = int(self._slots['seq'][slot])
+        if not seq % 2:
+            return False
+        self._slots['count'][slot] = 0
+        self._slots['seq'][slot] = seq + 1
+        self.recovered += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def _to_records(self, readings):
+        records = np.zeros(len(readings), dtype=READING_DTYPE)
+        for name in SENSOR_COLUMNS:
+            records[name] = np.nan
+        for i, reading in enumerate(readings):
+            records['ts'][i] = to_epoch_seconds(reading.get('timestamp'))
+            for key, value in reading.items():
+                key = SENSOR_ALIASES.get(key, key)
+                if key in READING_DTYPE.names and key != 'ts' and value is not None:
+                    records[key][i] = value
+        return records
+
+    def append(self, machine_id, reading):
+        """Append one reading for a machine"""
+        return self.append_many(machine_id, [reading])
+
+    def append_many(self, machine_id, readings):
+        """
+        Append readings for a machine using the seqlock protocol
+
+        The slot's sequence counter is made odd before the records are written and even
+        afterwards, so lock-free readers can detect and retry torn reads.
+
+        Returns:
+            Number of readings appended
+
+        Raises:
+            ValueError: machine_id is longer than MACHINE_ID_BYTES
+            RuntimeError: The ring is full, or another process is its only writer (without fcntl)
+        """
+        encode_machine_id(machine_id)
+        records = self._to_records(list(readings))
+        if len(records) > self.capacity:
+            records = records[-self.capacity:]
+        n = len(records)
+        if not n:
+            return 0
+
+        with self._writer_lock():
+            slot = self._claim_slot(machine_id)
+            self._recover_stale(slot)
+            seq = int(self._slots['seq'][slot])
+            count = int(self._slots['count'][slot])
+            self._slots['seq'][slot] = seq + 1
+            positions = (count + np.arange(n)) % self.capacity
+            self._data[slot, positions] = records
+            self._slots['count'][slot] = count + n
+            self._slots['seq'][slot] = seq + 2
+        return n
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def latest(self, machine_id, n=50, max_retries=100):
+        """
+        Copy the most recent readings for a machine without taking any lock
+
+        Args:
+            machine_id: Machine identifier
+            n: Number of readings (capped at the ring capacity)
+            max_retries: Attempts before giving up on a slot under constant writes
+
+        Returns:
+            Structured NumPy array (READING_DTYPE), oldest first; empty if the machine is unknown
+        """
+        slot = self._find_slot(machine_id)
+        if slot is None:
+            return np.zeros(0, dtype=READING_DTYPE)
+        n = min(int(n), self.capacity)
+
+        window = self._read_window(slot, n, max_retries)
+        if window is None and (FCNTL_AVAILABLE or self._sole_writer):
+            # Odd for this long, the writer may have died mid-write: once the writer lock is
+            # held no write is in progress, so a still-odd counter can be repaired. Without fcntl
+            # a reader never claims the writer role for this; the next write repairs the slot
+            with self._writer_lock():
+                self._recover_stale(slot)
+            window = self._read_window(slot, n, max_retries)
+        if window is None:
+            raise TimeoutError(f"Could not read a consistent window for machine '{machine_id}'")
+        return window
+
+    def _read_window(self, slot, n, max_retries):
+        """Seqlock read of a slot's latest n readings, or None if no attempt saw a stable counter"""
+        for _ in range(max_retries):
+            seq_before = int(self._slots['seq'][slot])
+            if seq_before % 2:
+                time.sleep(0)
+                continue
+            count = int(self._slots['count'][slot])
+            available = min(n, count)
+            positions = (count - available + np.arange(available)) % self.capacity
+            window = self._data[slot, positions].copy()
+            if int(self._slots['seq'][slot]) == seq_before:
+                return window
+        return None
+
+    def latest_records(self, machine_id, n=50):
+        """Most recent readings as a list of dicts (ISO timestamps, missing sensors omitted)"""
+        window = self.latest(machine_id, n)
+        records = []
+        for row in window:
+            record = {'timestamp': datetime.fromtimestamp(float(row['ts'])).isoformat()}
+            for name in SENSOR_COLUMNS:
+                value = float(row[name])
+                if not np.isnan(value):
+                    record[name] = value
+            records.append(record)
+        return records
+
+    def machines(self):
+        """Machine IDs with a slot in the ring"""
+        used = self._slots[self._slots['used'] == 1]
+        return [m.decode('utf-8') for m in used['machine_id']]
+
+    def close(self):
+        """Detach this process from the segment"""
+        self._header = self._slots = self._data = None
+        self._shm.close()
+        self._lock_file.close()
+
+    def unlink(self):
+        """Remove the segment for all processes"""
+        try:
+            # unlink() unregisters from the resource tracker, which _untrack already did
+            from multiprocessing import resource_tracker
+            resource_tracker.register(self._shm._name, 'shared_memory')
+        except Exception:
+            pass
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        try:
+            os.remove(self._lock_file.name)
+        except OSError:
+            pass
+
+
+def open_shared_ring(**kwargs):
+    """Create or attach to the shared ring, returning None where shared memory is unavailable"""
+    try:
+        return SharedReadingRing(**kwargs)
+    except Exception as e:
+        # Safely handle error message to avoid encoding issues on Windows
+        try:
+            error_msg = str(e)
+        except:
+            error_msg = "Unknown error occurred"
+        try:
+            sys.stderr.write(f"Warning: Could not open shared reading ring: {error_msg}\n")
+        except:
+            pass  # Silently fail if even stderr write fails
+        return None
@@ -0,0 +1,160 @@
+"""
+Single-Flight Request Coalescing
+Concurrent callers asking for the same key share one in-flight call instead of each making their own
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    """One in-flight call and the outcome every waiter receives"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Thread-safe call deduplication keyed on a hashable request key"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Run fn() once for all concurrent callers with the same key
+
+        The first caller (the leader) executes fn; callers arriving while it runs wait for
+        its outcome. An exception raised by fn is re-raised in every waiter.
+
+        Args:
+            key: Hashable request key
+            fn: Zero-argument callable producing the result
+            timeout: Seconds a waiting caller blocks before giving up (None waits indefinitely);
+                     the leader itself is bounded only by fn
+
+        Returns:
+            Result of fn()
+
+        Raises:
+            TimeoutError: A waiting caller's timeout elapsed before the leader finished
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight call")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            # Forget the call before waking waiters so later callers start a fresh one
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """Coalescing metrics"""
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executions': self.executions,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'timeouts': self.timeouts
+            }
+
+
+class AsyncSingleFlight:
+    """Call deduplication for coroutines on one event loop"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def do(self, key, coro_fn, timeout=None):
+        """
+        Await coro_fn() once for all concurrent callers with the same key
+
+        Args:
+            key: Hashable request key
+            coro_fn: Zero-argument callable returning an awaitable
+            timeout: Seconds a waiting caller blocks before giving up (None waits indefinitely)
+
+        Returns:
+            Result of coro_fn()
+
+        Raises:
+            TimeoutError: A waiting caller's timeout elapsed before the leader finished
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                # Shielded so a waiter timing out or being cancelled does not cancel the shared call
+                return await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight call")
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executions += 1
+        try:
+            result = await coro_fn()
+        except asyncio.CancelledError:
+            # Waiters get an error instead of being cancelled themselves
+            future.set_exception(RuntimeError("In-flight call was cancelled"))
+            future.exception()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            future.exception()  # Mark retrieved so a call without waiters does not warn
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._calls.pop(key, None)
+
+    def stats(self):
+        """Coalescing metrics"""
+        return {
+            'in_flight': len(self._calls),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'timeouts': self.timeouts
+        }
@@ -0,0 +1,356 @@
+"""
+Trend Estimation
+Robust slopes at several time scales (last minute, hour, shift) and LTTB downsampling, so trend
+analysis and chart cost stay bounded however long the sensor history grows
+"""
+import os
+import warnings
+
+import numpy as np
+
+from sensor_store import to_epoch_seconds
+from trend_stats import SensorWindow, ReadingTimestamps
+from anomaly_detection import SENSOR_LABELS
+
+# (name, seconds) from shortest to longest
+TREND_SCALES = (
+    ('minute', 60.0),
+    ('hour', 3600.0),
+    ('shift', 8 * 3600.0)
+)
+
+# Bucket means a scale is reduced to before fitting; Theil-Sen compares every pair of them
+SLOPE_POINTS = 64
+
+# Sampling interval assumed when readings carry no timestamps
+DEFAULT_INTERVAL_S = 1.0
+
+
+def _seconds_at(timestamps, index):
+    return to_epoch_seconds(timestamps[index])
+
+
+def _length(sensor_history):
+    """Number of readings (a dict of columns counts rows, not keys)"""
+    if isinstance(sensor_history, dict):
+        for value in sensor_history.values():
+            if isinstance(value, (list, tuple, np.ndarray)):
+                return len(value)
+        return 0
+    return len(sensor_history)
+
+
+def _slice(sensor_history, start):
+    """Readings from position `start` on, in the same shape as the input"""
+    if isinstance(sensor_history, SensorWindow):
+        timestamps = sensor_history.timestamps
+        return SensorWindow(sensor_history.values[start:], sensor_history.names,
+                            timestamps[start:] if timestamps is not None else None, sensor_history.machine_id)
+    if hasattr(sensor_history, 'iloc'):
+        return sensor_history.iloc[start:]
+    if isinstance(sensor_history, dict):
+        return {k: (v[start:] if isinstance(v, (list, tuple, np.ndarray)) else v) for k, v in sensor_history.items()}
+    return sensor_history[start:]
+
+
+def _timestamp_accessor(sensor_history):
+    """Sequence of raw timestamps indexable by reading position, or None"""
+    if isinstance(sensor_history, SensorWindow):
+        return sensor_history.timestamps
+    if hasattr(sensor_history, 'columns'):
+        return sensor_history['timestamp'].to_numpy() if 'timestamp' in sensor_history.columns else None
+    if isinstance(sensor_history, dict):
+        return sensor_history.get('timestamp', sensor_history.get('timestamps'))
+    if len(sensor_history) and isinstance(sensor_history[0], dict) and 'timestamp' in sensor_history[0]:
+        return ReadingTimestamps(sensor_history)
+    return None
+
+
+def recent_history(sensor_history, horizon_s=None, max_readings=None):
+    """
+    Tail of a history window that trend analysis needs
+
+    Readings older than the longest trend scale cannot change any estimate, so they are dropped
+    before columns are extracted. The cut-off is found by binary search over the timestamps
+    (oldest first), parsing O(log n) of them, so the cost does not grow with the history.
+
+    Args:
+        sensor_history: List of reading dicts, DataFrame, dict of column arrays or SensorWindow
+        horizon_s: Seconds of history kept (defaults to the longest TREND_SCALES entry)
+        max_readings: Hard cap on readings kept (defaults to TREND_MAX_READINGS or 50000)
+
+    Returns:
+        The most recent part of the input, in the same shape
+    """
+    horizon_s = horizon_s or TREND_SCALES[-1][1]
+    max_readings = int(max_readings or os.getenv("TREND_MAX_READINGS", 50000))
+    n = _length(sensor_history)
+    start = max(0, n - max_readings)
+    timestamps = _timestamp_accessor(sensor_history) if n else None
+    if timestamps is not None:
+        try:
+            cutoff = _seconds_at(timestamps, n - 1) - horizon_s
+            lo, hi = start, n - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if _seconds_at(timestamps, mid) < cutoff:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            start = lo
+        except (TypeError, ValueError):
+            pass  # Unparseable timestamps: the reading cap alone bounds the window
+    return _slice(sensor_history, start) if start else sensor_history
+
+
+def window_seconds(window):
+    """Epoch seconds of every reading in a SensorWindow (evenly spaced if it has no timestamps)"""
+    n = len(window)
+    timestamps = window.timestamps
+    if timestamps is None:
+        return np.arange(n, dtype=float) * DEFAULT_INTERVAL_S
+    if isinstance(timestamps, np.ndarray):
+        if timestamps.dtype.kind in 'iuf':
+            return timestamps.astype(float)
+        if timestamps.dtype.kind == 'M':
+            return timestamps.astype('datetime64[us]').astype(np.int64) / 1e6
+    if isinstance(timestamps, ReadingTimestamps):
+        raw = [reading.get('timestamp') for reading in timestamps.readings]
+    else:
+        raw = [timestamps[i] for i in range(n)]
+    if raw and isinstance(raw[0], (int, float)):
+        try:
+            return np.array(raw, dtype=float)
+        except (TypeError, ValueError):
+            pass
+    if raw and isinstance(raw[0], str):
+        try:
+            # numpy parses naive ISO strings in C; offsets ('Z', '+02:00') take the slow path below
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', DeprecationWarning)
+                return np.array(raw).astype('datetime64[us]').astype(np.int64) / 1e6
+        except (ValueError, TypeError, DeprecationWarning):
+            pass
+    try:
+        return np.fromiter((to_epoch_seconds(ts) for ts in raw), dtype=float, count=n)
+    except (TypeError, ValueError):
+        return np.arange(n, dtype=float) * DEFAULT_INTERVAL_S
+
+
+def bucket_means(t, values, n_buckets=SLOPE_POINTS):
+    """
+    Reduce a series to n_buckets equal-count buckets (mean time, NaN-aware mean value)
+
+    Args:
+        t: Float array (n,)
+        values: Float array (n, k)
+
+    Returns:
+        (t, values) with at most n_buckets rows
+    """
+    n = len(t)
+    if n <= n_buckets:
+        return t, values
+    starts = np.linspace(0, n, n_buckets + 1).astype(int)[:-1]
+    counts = np.diff(np.append(starts, n))
+    t_mean = np.add.reduceat(t, starts) / counts
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+    present_counts = np.add.reduceat(present, starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return t_mean, sums / present_counts
+
+
+def least_squares_slopes(t, values):
+    """Ordinary least-squares slope of every column against t (NaN readings ignored)"""
+    present = ~np.isnan(values)
+    counts = present.sum(axis=0)
+    t_col = np.where(present, t[:, None], 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t_mean = t_col.sum(axis=0) / counts
+        v_mean = np.where(present, values, 0.0).sum(axis=0) / counts
+        dt = np.where(present, t[:, None] - t_mean, 0.0)
+        dv = np.where(present, values - v_mean, 0.0)
+        return (dt * dv).sum(axis=0) / (dt * dt).sum(axis=0)
+
+
+def theil_sen_slopes(t, values):
+    """Theil-Sen slope of every column: the median of all pairwise slopes (robust to outliers)"""
+    i, j = np.triu_indices(len(t), 1)
+    dt = t[j] - t[i]
+    usable = dt > 0
+    i, j, dt = i[usable], j[usable], dt[usable]
+    if not len(dt):
+        return np.full(values.shape[1], np.nan)
+    with warnings.catch_warnings():
+        # Columns without two readings have only NaN slopes
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian((values[j] - values[i]) / dt[:, None], axis=0)
+
+
+def estimate_trends(sensor_history, scales=TREND_SCALES, points=SLOPE_POINTS):
+    """
+    Trend of every sensor at several time scales
+
+    Each scale takes the readings of its last `seconds` (oldest first), reduces them to
+    `points` bucket means and fits a Theil-Sen slope; the least-squares slope is reported
+    alongside. A change over the window smaller than the scatter (scaled median absolute
+    deviation) of the bucket means around the fit counts as stable. Scales that would see
+    exactly the same readings as a shorter one are skipped, so a 50-reading window reports
+    only what it can actually tell.
+
+    Args:
+        sensor_history: List of reading dicts, DataFrame, dict of column arrays or SensorWindow
+        scales: (name, seconds) pairs, shortest first
+        points: Bucket means per scale
+
+    Returns:
+        Dict of scale -> {'span_s', 'readings', 'sensors': {sensor -> {'direction' ('rising',
+        'falling' or 'stable'), 'change' (over the span, in sensor units), 'slope_per_hour',
+        'ls_slope_per_hour'}}}
+    """
+    window = SensorWindow.from_history(sensor_history)
+    n = len(window)
+    if n < 3 or not window.names:
+        return {}
+    # Relative to the newest reading so fitted levels do not lose precision to epoch offsets
+    t = window_seconds(window)
+    t = t - t[-1]
+    values = window.values
+    trends = {}
+    previous_start = None
+    for name, seconds in scales:
+        start = int(np.searchsorted(t, t[-1] - seconds, side='left'))
+        if n - start < 3 or start == previous_start:
+            continue
+        previous_start = start
+        t_b, v_b = bucket_means(t[start:], values[start:], points)
+        robust = theil_sen_slopes(t_b, v_b)
+        ls = least_squares_slopes(t_b, v_b)
+        span_s = float(t[-1] - t[start])
+        change = robust * span_s
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            level = np.nanmedian(v_b - robust * t_b[:, None], axis=0)
+            # Scaled median absolute deviation: as robust to dropouts as the slope it is compared to
+            scatter = 1.4826 * np.nanmedian(np.abs(v_b - (level + robust * t_b[:, None])), axis=0)
+            mean = np.nanmean(v_b, axis=0)
+        noise = np.maximum(np.nan_to_num(scatter), np.abs(np.nan_to_num(mean)) * 1e-3)
+        sensors = {}
+        for col, sensor in enumerate(window.names):
+            if np.isnan(change[col]):
+                continue
+            if change[col] > noise[col]:
+                direction = 'rising'
+            elif change[col] < -noise[col]:
+                direction = 'falling'
+            else:
+                direction = 'stable'
+            sensors[sensor] = {
+                'direction': direction,
+                'change': round(float(change[col]), 4),
+                'slope_per_hour': round(float(robust[col]) * 3600, 4),
+                'ls_slope_per_hour': round(float(ls[col]) * 3600, 4)
+            }
+        trends[name] = {'span_s': round(span_s, 1), 'readings': n - start, 'sensors': sensors}
+    return trends
+
+
+def overall_direction(trends, sensor):
+    """Direction of a sensor at the longest scale estimated, or None"""
+    for scale in reversed(list(trends)):
+        stats = trends[scale]['sensors'].get(sensor)
+        if stats:
+            return stats['direction']
+    return None
+
+
+def describe_trends(trends):
+    """Compact text, one line per scale, for prompts and summaries (size independent of history length)"""
+    lines = []
+    for scale, info in trends.items():
+        parts = []
+        for sensor, stats in info['sensors'].items():
+            label, unit = SENSOR_LABELS.get(sensor, (sensor, ''))
+            if stats['direction'] == 'stable':
+                parts.append(f"{label.lower()} stable")
+            else:
+                parts.append(f"{label.lower()} {stats['direction']} {stats['change']:+.2f}{unit}")
+        lines.append(f"- Last {scale} ({info['readings']} readings over {info['span_s']:.0f}s): " + ", ".join(parts))
+    return "\n".join(lines)
+
+
+def lttb_indices(t, values, n_out):
+    """
+    Largest-Triangle-Three-Buckets selection of n_out reading positions
+
+    Keeps the first and last reading and, per bucket, the reading forming the largest triangle
+    with the previously kept reading and the next bucket's average. With several columns the
+    triangle areas of the range-normalized columns are summed, so one set of positions (one
+    shared time axis) preserves the shape of every sensor.
+
+    Args:
+        t: Float array (n,), increasing
+        values: Float array (n,) or (n, k)
+        n_out: Positions to keep
+
+    Returns:
+        Int array of positions, increasing
+    """
+    n = len(t)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    y = values.reshape(n, -1).astype(float)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanmin(y, axis=0), np.nanmax(y, axis=0)
+    scale = np.where(high > low, high - low, 1.0)
+    y = np.nan_to_num((y - np.nan_to_num(low)) / scale)
+    span = t[-1] - t[0]
+    x = (t - t[0]) / (span if span > 0 else 1.0)
+
+    # n_out - 2 buckets between the fixed first and last readings: [edges[b], edges[b + 1])
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    counts = np.diff(edges)
+    next_x = np.append(np.add.reduceat(x[:n - 1], edges[:-1]) / counts, x[-1])[1:]
+    next_y = np.vstack([np.add.reduceat(y[:n - 1], edges[:-1], axis=0) / counts[:, None], y[-1:]])[1:]
+
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        area = np.abs((x[a] - next_x[b]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi, None]) * (next_y[b] - y[a])).sum(axis=1)
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def downsample(sensor_history, max_points=None):
+    """
+    LTTB-downsample a history window for charts or prompts
+
+    Args:
+        sensor_history: List of reading dicts, DataFrame, dict of column arrays or SensorWindow
+        max_points: Readings kept (defaults to CHART_MAX_POINTS or 500)
+
+    Returns:
+        The kept readings, in the same shape as the input (unchanged if already small enough)
+    """
+    max_points = int(max_points or os.getenv("CHART_MAX_POINTS", 500))
+    if _length(sensor_history) <= max_points:
+        return sensor_history
+    window = SensorWindow.from_history(sensor_history)
+    keep = lttb_indices(window_seconds(window), window.values, max_points)
+    if isinstance(sensor_history, SensorWindow):
+        timestamps = window.timestamps
+        if timestamps is not None:
+            timestamps = [timestamps[i] for i in keep]
+        return SensorWindow(window.values[keep], window.names, timestamps, window.machine_id)
+    if hasattr(sensor_history, 'iloc'):
+        return sensor_history.iloc[keep]
+    if isinstance(sensor_history, dict):
+        return {k: (np.asarray(v)[keep] if isinstance(v, (list, tuple, np.ndarray)) else v)
+                for k, v in sensor_history.items()}
+    return [sensor_history[i] for i in keep]
@@ -0,0 +1,170 @@
+"""
+Trend Change Gate
+Reuse the last Gemini trend analysis of a machine until its summary statistics change
+materially or the analysis gets too old
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+# Largest change per statistic that still counts as "the same trend", in sensor units.
+# 'mean' is the window average, 'current' the latest reading (noisier, so its band is wider).
+DEFAULT_TOLERANCES = {
+    'temperature': {'mean': 1.0, 'current': 3.0},    # °C
+    'vibration': {'mean': 0.2, 'current': 0.5},      # mm/s
+    'error_count': {'mean': 0.5, 'current': 2.0}     # count
+}
+
+# Tolerance for sensors without an entry above, as a fraction of the stored value
+RELATIVE_TOLERANCES = {'mean': 0.02, 'current': 0.05}
+
+# Smallest tolerance derived from RELATIVE_TOLERANCES, for values near zero
+MIN_RELATIVE_TOLERANCE = 0.01
+
+
+def trend_snapshot(summary, trends=None):
+    """
+    Statistics the gate compares
+
+    Args:
+        summary: trend_stats.summarize() result (dict of sensor -> statistics)
+        trends: Optional trend_estimation.estimate_trends() result; its per-scale directions
+                are part of the snapshot, so a reversal at any scale invalidates a stored analysis
+
+    Returns:
+        Dict of sensor -> {'mean', 'current'} for every sensor in the summary, plus
+        'directions': {sensor -> {scale -> direction}} when trends are given
+    """
+    snapshot = {
+        name: {'mean': stats['mean'], 'current': stats['current']}
+        for name, stats in summary.items()
+    }
+    if trends:
+        directions = {}
+        for scale, info in trends.items():
+            for name, stats in info['sensors'].items():
+                directions.setdefault(name, {})[scale] = stats['direction']
+        snapshot['directions'] = directions
+    return snapshot
+
+
+def _env_tolerances():
+    raw = os.getenv("TREND_GATE_TOLERANCES")
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+class TrendGate:
+    """Thread-safe per-machine memory of the last analyzed trend snapshot"""
+
+    def __init__(self, tolerances=None, max_age_s=None, max_entries=None):
+        """
+        Args:
+            tolerances: Dict of sensor -> {statistic: tolerance} merged over DEFAULT_TOLERANCES
+                        (defaults to TREND_GATE_TOLERANCES, a JSON object of the same shape)
+            max_age_s: Seconds after which an analysis is refreshed even if nothing changed
+                       (defaults to TREND_GATE_MAX_AGE_S or 120; 0 disables the gate)
+            max_entries: Machines remembered before the least recently used is dropped
+                         (defaults to TREND_GATE_MAX_ENTRIES or 256)
+        """
+        self.tolerances = {name: dict(tol) for name, tol in DEFAULT_TOLERANCES.items()}
+        for name, tol in (tolerances or _env_tolerances() or {}).items():
+            self.tolerances.setdefault(name, {}).update(tol)
+        self.max_age_s = float(os.getenv("TREND_GATE_MAX_AGE_S", 120) if max_age_s is None else max_age_s)
+        self.max_entries = int(max_entries or os.getenv("TREND_GATE_MAX_ENTRIES", 256))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.calls_avoided = 0
+        self.refreshes = {'new': 0, 'expired': 0, 'changed': 0, 'ungated': 0}
+        self.saved_latency_s = 0.0
+
+    def tolerance(self, name, stat, value):
+        """Allowed change of one statistic: configured, else relative to its stored value"""
+        limit = self.tolerances.get(name, {}).get(stat)
+        if limit is not None:
+            return limit
+        return max(abs(value) * RELATIVE_TOLERANCES.get(stat, 0.0), MIN_RELATIVE_TOLERANCE)
+
+    def changed(self, previous, current):
+        """First statistic or trend direction that changed materially, as 'sensor.stat', or None"""
+        names = [n for n in dict.fromkeys(list(previous) + list(current)) if n != 'directions']
+        for name in names:
+            before, after = previous.get(name), current.get(name)
+            if before is None or after is None:
+                return name
+            for stat, value in before.items():
+                if abs(after[stat] - value) > self.tolerance(name, stat, value):
+                    return f"{name}.{stat}"
+        before, after = previous.get('directions', {}), current.get('directions', {})
+        for name in dict.fromkeys(list(before) + list(after)):
+            if before.get(name) != after.get(name):
+                return f"{name}.direction"
+        return None
+
+    def lookup(self, key, snapshot):
+        """
+        Return the stored analysis for key if the trend has not materially changed
+
+        The snapshot is compared with the one the stored analysis was made from (not the last
+        one seen), so slow drift accumulates until it crosses a tolerance.
+
+        Args:
+            key: Machine the analysis is for; None (history of no particular machine) is never gated
+            snapshot: trend_snapshot() of the window to analyze
+
+        Returns:
+            (content, age_s) of the reusable analysis, or None when a fresh one is needed
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.checks += 1
+            if key is None:
+                self.refreshes['ungated'] += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is None or not self.max_age_s:
+                self.refreshes['new'] += 1
+                return None
+            stored_snapshot, content, stored_at, latency_s = entry
+            age_s = now - stored_at
+            if age_s > self.max_age_s:
+                self.refreshes['expired'] += 1
+                return None
+            if self.changed(stored_snapshot, snapshot):
+                self.refreshes['changed'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.calls_avoided += 1
+            self.saved_latency_s += latency_s
+            return content, age_s
+
+    def store(self, key, snapshot, content, latency_s=0.0):
+        """Remember a fresh analysis and the snapshot it was made from (not for a None key)"""
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = (snapshot, content, time.monotonic(), latency_s)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """Gate metrics"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_age_s': self.max_age_s,
+                'tolerances': self.tolerances,
+                'checks': self.checks,
+                'calls_avoided': self.calls_avoided,
+                'avoided_rate': round(self.calls_avoided / self.checks, 4) if self.checks else 0.0,
+                'refreshes': dict(self.refreshes),
+                'saved_latency_s': round(self.saved_latency_s, 3)
+            }
@@ -0,0 +1,239 @@
+"""
+Trend Analysis Jobs
+Queue trend analyses on a bounded worker pool and return a job ID immediately; clients poll
+or subscribe for the result. Identical submissions still queued or running share one job.
+"""
+import os
+import time
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+def _timing_stats(values):
+    """Summarize a list of second timings"""
+    if not values:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    arr = np.asarray(values, dtype=float)
+    return {
+        'mean': round(float(arr.mean()), 3),
+        'p50': round(float(np.percentile(arr, 50)), 3),
+        'p95': round(float(np.percentile(arr, 95)), 3),
+        'max': round(float(arr.max()), 3)
+    }
+
+
+class TrendJobQueue:
+    """Background trend analyses, fetchable later by job ID"""
+
+    def __init__(self, analyze_fn, max_workers=None, max_queue=None, max_entries=None, latency_window=500):
+        """
+        Args:
+            analyze_fn: Callable(sensor_history) returning a trend analysis dict
+            max_workers: Concurrent analyses (defaults to TREND_JOB_WORKERS or 4)
+            max_queue: Jobs waiting for a worker before submissions are rejected
+                       (defaults to TREND_JOB_MAX_QUEUE or 256)
+            max_entries: Finished jobs remembered before the oldest are dropped
+                         (defaults to TREND_JOB_MAX_ENTRIES or 1000)
+            latency_window: Finished jobs the latency statistics are computed over
+        """
+        self.analyze_fn = analyze_fn
+        self.max_workers = int(max_workers or os.getenv("TREND_JOB_WORKERS", 4))
+        self.max_queue = int(max_queue or os.getenv("TREND_JOB_MAX_QUEUE", 256))
+        self.max_entries = int(max_entries or os.getenv("TREND_JOB_MAX_ENTRIES", 1000))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="trend-job")
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._listeners = {}
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._busy_s = 0.0
+        self._started = time.monotonic()
+        self._wait_s = deque(maxlen=latency_window)
+        self._run_s = deque(maxlen=latency_window)
+        self._total_s = deque(maxlen=latency_window)
+        self.submitted = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def submit(self, key, load_history, machine_id=None):
+        """
+        Queue a trend analysis unless an identical one is already queued or running
+
+        Args:
+            key: Hashable identity of the submission; equal keys share one job while it is in flight
+            load_history: Callable returning the sensor history to analyze, run on the worker
+                          so that loading a stored time range does not delay the response
+            machine_id: Machine the job belongs to, for display
+
+        Returns:
+            (job_id, deduplicated)
+
+        Raises:
+            QueueFullError: max_queue jobs are already waiting for a worker
+        """
+        with self._lock:
+            job_id = self._inflight.get(key)
+            if job_id is not None:
+                self.deduplicated += 1
+                return job_id, True
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"Trend job queue is full ({self.max_queue} jobs waiting)")
+
+            job_id = uuid.uuid4().hex
+            self._entries[job_id] = {
+                'job_id': job_id,
+                'machine_id': machine_id,
+                'status': JOB_QUEUED,
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'wait_s': None,
+                'run_s': None,
+                'result': None,
+                'error': None
+            }
+            self._inflight[key] = job_id
+            self._queued += 1
+            self.submitted += 1
+            self._evict()
+        # Runs in a copy of the caller's context so per-request context variables carry over
+        self._executor.submit(contextvars.copy_context().run, self._run, job_id, key, load_history,
+                              time.monotonic())
+        return job_id, False
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond max_entries (caller holds the lock)"""
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        for job_id in [j for j, e in self._entries.items() if e['status'] in FINISHED_STATES][:excess]:
+            del self._entries[job_id]
+            self._listeners.pop(job_id, None)
+
+    def _run(self, job_id, key, load_history, queued_at):
+        started = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(job_id)
+            self._queued -= 1
+            self._running += 1
+            if entry is not None:
+                entry['status'] = JOB_RUNNING
+                entry['started_at'] = time.time()
+                entry['wait_s'] = round(started - queued_at, 3)
+        self._notify(job_id)
+
+        try:
+            result, error = self.analyze_fn(load_history()), None
+        except Exception as e:
+            result, error = None, str(e)
+
+        finished = time.monotonic()
+        with self._lock:
+            self._running -= 1
+            self._busy_s += finished - started
+            self._inflight.pop(key, None)
+            self._wait_s.append(started - queued_at)
+            self._run_s.append(finished - started)
+            self._total_s.append(finished - queued_at)
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            entry = self._entries.get(job_id)
+            if entry is not None:
+                entry['status'] = JOB_DONE if error is None else JOB_FAILED
+                entry['finished_at'] = time.time()
+                entry['run_s'] = round(finished - started, 3)
+                entry['result'] = result
+                entry['error'] = error
+        self._notify(job_id)
+
+    def _notify(self, job_id):
+        """Pass the job's current state to its subscribers; finished jobs release them"""
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return
+            snapshot = dict(entry)
+            listeners = list(self._listeners.get(job_id, ()))
+            if snapshot['status'] in FINISHED_STATES:
+                self._listeners.pop(job_id, None)
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception:
+                pass
+
+    def get(self, job_id):
+        """Current state of a job, or None if unknown or expired"""
+        with self._lock:
+            entry = self._entries.get(job_id)
+            return dict(entry) if entry is not None else None
+
+    def subscribe(self, job_id, listener):
+        """
+        Call listener(state) on every status change of a job until it finishes
+
+        The listener runs on a worker thread and must not block. A job that has already
+        finished is not subscribed to; the caller gets its final state from the return value.
+
+        Returns:
+            The job's current state, or None if unknown or expired
+        """
+        with self._lock:
+            entry = self._entries.get(job_id)
+            if entry is None:
+                return None
+            if entry['status'] not in FINISHED_STATES:
+                self._listeners.setdefault(job_id, []).append(listener)
+            return dict(entry)
+
+    def unsubscribe(self, job_id, listener):
+        """Stop calling listener for a job (e.g. after the client went away)"""
+        with self._lock:
+            listeners = self._listeners.get(job_id)
+            if listeners and listener in listeners:
+                listeners.remove(listener)
+                if not listeners:
+                    del self._listeners[job_id]
+
+    def stats(self):
+        """Queue depth, worker utilization and job latency"""
+        with self._lock:
+            uptime_s = time.monotonic() - self._started
+            return {
+                'entries': len(self._entries),
+                'queue_depth': self._queued,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'workers': self.max_workers,
+                'utilization': round(self._running / self.max_workers, 4),
+                'busy_ratio': round(min(self._busy_s / (self.max_workers * uptime_s), 1.0), 4) if uptime_s else 0.0,
+                'submitted': self.submitted,
+                'deduplicated': self.deduplicated,
+                'rejected': self.rejected,
+                'completed': self.completed,
+                'failed': self.failed,
+                'wait_s': _timing_stats(list(self._wait_s)),
+                'run_s': _timing_stats(list(self._run_s)),
+                'latency_s': _timing_stats(list(self._total_s))
+            }
@@ -0,0 +1,225 @@
+"""
+Trend Statistics
+Extract sensor columns from a history window once into a contiguous matrix and summarize
+every sensor in one vectorized pass - no DataFrame construction on the request path
+"""
+import threading
+from collections import OrderedDict
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+
+from sensor_store import SENSOR_COLUMNS, SENSOR_ALIASES
+
+# Windows recently extracted from lists of reading dicts, so a history handed to several
+# detectors (or re-analyzed unchanged) is read out of its dicts once
+LIST_WINDOW_CACHE_SIZE = 16
+_list_windows = OrderedDict()
+_list_windows_lock = threading.Lock()
+
+
+def _list_matrix(readings, sensors):
+    """Columns of a list of reading dicts as an (n, k) float array plus the sensors found"""
+    n = len(readings)
+    # Every reading's keys, so a sensor missing from the first and last reading is still found
+    seen = set().union(*readings)
+    # Resolve each sensor to the key spelling the readings use (e.g. 'power_consumption')
+    keys, present = [], []
+    for s in sensors:
+        key = s if s in seen else next((a for a, target in SENSOR_ALIASES.items()
+                                        if target == s and a in seen), None)
+        if key is not None:
+            keys.append(key)
+            present.append(s)
+    if not keys:
+        return np.empty((n, 0)), present
+
+    getter = itemgetter(*keys)
+    try:
+        if len(keys) == 1:
+            values = np.fromiter(map(getter, readings), dtype=float, count=n)
+        else:
+            # One flat pass over all readings; None becomes NaN
+            values = np.fromiter(chain.from_iterable(map(getter, readings)), dtype=float, count=n * len(keys))
+        return values.reshape(n, len(keys)), present
+    except KeyError:
+        pass
+    # Some readings lack some sensors: fall back to per-column lookups
+    columns = [np.fromiter((r.get(key) for r in readings), dtype=float, count=n) for key in keys]
+    return np.column_stack(columns), present
+
+
+class SensorWindow:
+    """A history window as one float matrix (n readings x k sensors), NaN where a reading is missing"""
+
+    def __init__(self, values, names, timestamps=None, machine_id=None):
+        """
+        Args:
+            values: Float array (n, k)
+            names: Sensor name of each column
+            timestamps: Sequence indexable by reading position, or None
+            machine_id: Machine the window belongs to (latest reading's), or None
+        """
+        self.values = values
+        self.names = list(names)
+        self.timestamps = timestamps
+        self.machine_id = machine_id
+
+    @classmethod
+    def from_history(cls, sensor_history, sensors=None):
+        """
+        Extract sensor columns from a history window
+
+        Args:
+            sensor_history: List of reading dicts, DataFrame, dict of column arrays, or a SensorWindow
+            sensors: Sensor names (defaults to the eight SENSOR_COLUMNS); sensors the input does not
+                     report at all (absent or always null) are left out
+
+        Returns:
+            SensorWindow
+        """
+        if isinstance(sensor_history, SensorWindow):
+            return sensor_history if sensors is None else sensor_history.select(sensors)
+        sensors = list(sensors or SENSOR_COLUMNS)
+        timestamps = machine_id = cache_key = None
+
+        if hasattr(sensor_history, 'columns'):
+            columns = {SENSOR_ALIASES.get(c, c): c for c in sensor_history.columns}
+            present = [s for s in sensors if s in columns]
+            values = sensor_history[[columns[s] for s in present]].to_numpy(dtype=float, na_value=np.nan)
+            values = values.reshape(len(sensor_history), len(present))
+            if 'timestamp' in sensor_history.columns:
+                timestamps = sensor_history['timestamp'].to_numpy()
+            if 'machine_id' in sensor_history.columns and len(sensor_history):
+                machine_id = sensor_history['machine_id'].iloc[-1]
+        elif isinstance(sensor_history, dict):
+            keys = {SENSOR_ALIASES.get(c, c): c for c in sensor_history}
+            present = [s for s in sensors if s in keys]
+            n = len(sensor_history[keys[present[0]]]) if present else 0
+            values = (np.column_stack([np.asarray(sensor_history[keys[s]], dtype=float) for s in present])
+                      if present else np.empty((n, 0)))
+            timestamps = sensor_history.get('timestamp', sensor_history.get('timestamps'))
+            machine_id = sensor_history.get('machine_id')
+            if isinstance(machine_id, (list, tuple, np.ndarray)):
+                machine_id = machine_id[-1] if len(machine_id) else None
+        else:
+            readings = sensor_history if isinstance(sensor_history, list) else list(sensor_history)
+            if not readings:
+                return cls(np.empty((0, 0)), [])
+            # Keyed on the first and last reading objects: appending or sliding the history changes
+            # them, editing a reading in place does not
+            cache_key = (id(readings[0]), id(readings[-1]), len(readings), tuple(sensors))
+            with _list_windows_lock:
+                cached = _list_windows.get(cache_key)
+                if cached is not None and cached[0] is readings[0] and cached[1] is readings[-1]:
+                    _list_windows.move_to_end(cache_key)
+                    return cached[2]
+            values, present = _list_matrix(readings, sensors)
+            if 'timestamp' in readings[0]:
+                # Looked up per reading only when needed (see timestamp())
+                timestamps = ReadingTimestamps(readings)
+            machine_id = readings[-1].get('machine_id')
+
+        reported = ~np.isnan(values).all(axis=0) if len(values) else np.ones(len(present), dtype=bool)
+        if not reported.all():
+            values = values[:, reported]
+            present = [name for name, keep in zip(present, reported) if keep]
+        window = cls(np.ascontiguousarray(values), present, timestamps,
+                     str(machine_id) if machine_id is not None else None)
+        if cache_key is not None:
+            # Read-only, since every caller given this history shares the window
+            window.values.flags.writeable = False
+            with _list_windows_lock:
+                _list_windows[cache_key] = (readings[0], readings[-1], window)
+                if len(_list_windows) > LIST_WINDOW_CACHE_SIZE:
+                    _list_windows.popitem(last=False)
+        return window
+
+    def __len__(self):
+        return len(self.values)
+
+    def column(self, name):
+        """Readings of one sensor, or None if the window does not report it"""
+        if name not in self.names:
+            return None
+        return self.values[:, self.names.index(name)]
+
+    def select(self, sensors):
+        """Window restricted to the given sensors (in that order, missing ones left out)"""
+        idx = [self.names.index(s) for s in sensors if s in self.names]
+        return SensorWindow(self.values[:, idx], [self.names[i] for i in idx], self.timestamps, self.machine_id)
+
+    def timestamp(self, index):
+        """Timestamp of one reading (ISO string for datetime values), or None"""
+        if self.timestamps is None:
+            return None
+        value = self.timestamps[index]
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if isinstance(value, np.datetime64):
+            return str(value)
+        return value.item() if isinstance(value, np.generic) else value
+
+
+class ReadingTimestamps:
+    """Timestamps of a list of reading dicts, read lazily by position"""
+
+    def __init__(self, readings):
+        self.readings = readings
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ReadingTimestamps(self.readings[index])
+        return self.readings[index].get('timestamp')
+
+    def __len__(self):
+        return len(self.readings)
+
+
+def summarize(window):
+    """
+    Summary statistics of every sensor in one vectorized pass
+
+    Args:
+        window: SensorWindow (or anything SensorWindow.from_history accepts)
+
+    Returns:
+        Dict of sensor -> {'count', 'first', 'current', 'mean', 'min', 'max', 'std', 'change'}
+        where 'first' / 'current' are the oldest and newest non-missing readings and
+        'change' is current - first
+    """
+    window = SensorWindow.from_history(window)
+    values = window.values
+    n, k = values.shape if values.ndim == 2 else (0, 0)
+    if not n or not k:
+        return {}
+
+    missing = np.isnan(values)
+    if missing.any():
+        present = ~missing
+        count = present.sum(axis=0)
+        cols = np.arange(k)
+        first = values[np.argmax(present, axis=0), cols]
+        current = values[n - 1 - np.argmax(present[::-1], axis=0), cols]
+        # from_history drops all-missing columns, so the nan-reductions never see an empty column
+        mean = np.nanmean(values, axis=0)
+        low = np.nanmin(values, axis=0)
+        high = np.nanmax(values, axis=0)
+        std = np.nanstd(values, axis=0)
+    else:
+        count = np.full(k, n)
+        first = values[0]
+        current = values[-1]
+        mean = values.mean(axis=0)
+        low = values.min(axis=0)
+        high = values.max(axis=0)
+        std = values.std(axis=0)
+
+    stats = zip(count.tolist(), first.tolist(), current.tolist(), mean.tolist(),
+                low.tolist(), high.tolist(), std.tolist())
+    return {
+        name: {'count': c, 'first': f, 'current': cur, 'mean': m, 'min': lo, 'max': hi,
+               'std': sd, 'change': cur - f}
+        for name, (c, f, cur, m, lo, hi, sd) in zip(window.names, stats)
+    }
@@ -0,0 +1,26 @@
+"""
+Test setup: src/ modules import each other by flat name, and every on-disk store is pointed
+at a temporary directory so tests never touch data/ or call real providers
+"""
+import os
+import sys
+import tempfile
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+_TMP = tempfile.mkdtemp(prefix='factory-copilot-tests-')
+os.environ.update({
+    'LLM_STORE_PATH': os.path.join(_TMP, 'llm_store.db'),
+    'LLM_METRICS_LOG': os.path.join(_TMP, 'llm_metrics.ndjson'),
+    'SENSOR_STORE_PATH': os.path.join(_TMP, 'sensor_store.db'),
+    'ALERT_OUTBOX_PATH': os.path.join(_TMP, 'alert_outbox.db'),
+    'SENSOR_RING_NAME': f'factory_copilot_test_{os.getpid()}',
+    # Empty values keep load_dotenv() from filling real credentials in from a local .env
+    'OPENAI_API_KEY': '',
+    'OPENAI_KEY': '',
+    'GEMINI_API_KEY': '',
+    'GOOGLE_API_KEY': '',
+    'N8N_WEBHOOK_URL': '',
+})
@@ -0,0 +1,108 @@
+"""Batched alert digests: flush on size, interval and close"""
+import threading
+import time
+
+import pytest
+
+from alert_digest import AlertDigest, FLUSH_CLOSE, FLUSH_INTERVAL, FLUSH_SIZE
+from automation import AutomationTrigger
+
+
+def alert(machine_id, severity='HIGH', error_code='E001', risk=80):
+    return {'machine_id': machine_id, 'error_severity': severity, 'error_code': error_code, 'risk_score': risk}
+
+
+class Recorder:
+    def __init__(self, result=None):
+        self.digests = []
+        self.sent = threading.Event()
+        self.result = result or {'success': True}
+
+    def __call__(self, digest):
+        self.digests.append(digest)
+        self.sent.set()
+        return self.result
+
+
+@pytest.fixture
+def make_digest():
+    digests = []
+
+    def make(flush_fn, **kwargs):
+        digest = AlertDigest(flush_fn, **kwargs)
+        digests.append(digest)
+        return digest
+
+    yield make
+    for digest in digests:
+        digest.close()
+
+
+def test_full_buffer_is_sent_at_once(make_digest):
+    recorder = Recorder()
+    digest = make_digest(recorder, interval_s=60, max_items=3)
+
+    entries = [digest.add(alert(f'm{i}')) for i in range(4)]
+
+    assert recorder.sent.wait(5)
+    assert [e['position'] for e in entries] == [1, 2, 3, 1]
+    assert entries[2]['flush_in_s'] == 0.0
+    sent = recorder.digests[0]
+    assert sent['digest_id'] == entries[0]['digest_id'] != entries[3]['digest_id']
+    assert sent['alert_count'] == 3 and sent['machines'] == ['m0', 'm1', 'm2']
+    assert digest.stats()['flush_reasons'][FLUSH_SIZE] == 1
+    assert digest.stats()['buffered_now'] == 1
+
+
+def test_oldest_alert_waits_at_most_the_interval(make_digest):
+    recorder = Recorder()
+    digest = make_digest(recorder, interval_s=0.05, max_items=10)
+
+    started = time.monotonic()
+    digest.add(alert('m1', severity='MEDIUM', error_code='E002', risk=60))
+    digest.add(alert('m2', severity='HIGH', error_code='E001', risk=85))
+
+    assert recorder.sent.wait(5)
+    assert time.monotonic() - started < 2.0
+    sent = recorder.digests[0]
+    assert sent['highest_severity'] == 'HIGH'
+    assert sent['max_risk_score'] == 85
+    assert sent['error_codes'] == {'E002': 1, 'E001': 1}
+    assert digest.stats()['flush_reasons'][FLUSH_INTERVAL] == 1
+
+
+def test_close_sends_what_is_buffered_and_counts_failures(make_digest):
+    def broken(digest):
+        raise RuntimeError("webhook down")
+
+    digest = make_digest(broken, interval_s=60, max_items=10)
+    digest.add(alert('m1'))
+    digest.add(alert('m2'))
+    digest.close()
+
+    stats = digest.stats()
+    assert stats['flush_reasons'][FLUSH_CLOSE] == 1
+    assert stats['digests_failed'] == 1 and stats['alerts_sent'] == 2
+    assert 'webhook down' in stats['last_flush']['message']
+    assert stats['buffered_now'] == 0
+
+
+def test_trigger_batches_alerts_but_sends_critical_at_once(monkeypatch):
+    monkeypatch.setenv('N8N_WEBHOOK_URL', 'http://n8n.invalid/webhook')
+    payloads = []
+    monkeypatch.setattr(AutomationTrigger, '_send_payload',
+                        lambda self, payload: payloads.append(payload) or {'success': True, 'status_code': 200})
+    trigger = AutomationTrigger(use_outbox=False, suppress=False, use_digest=True)
+    try:
+        batched = [trigger.trigger_maintenance_alert(80, {'machine_id': m}, error_code='E001') for m in ('m1', 'm2')]
+        critical = trigger.trigger_maintenance_alert(95, {'machine_id': 'm3'}, error_code='E005')
+
+        assert all(r['batched'] for r in batched)
+        assert not critical.get('batched')
+        assert [p['machine_id'] for p in payloads] == ['m3']
+
+        trigger.digest.flush()
+        assert payloads[-1]['alert_type'] == 'maintenance_digest'
+        assert payloads[-1]['machines'] == ['m1', 'm2']
+    finally:
+        trigger.digest.close()
@@ -0,0 +1,74 @@
+"""Durable alert outbox: retries and dead letters"""
+import time
+
+import pytest
+
+from alert_outbox import AlertOutbox, STATUS_DEAD, STATUS_DELIVERED
+
+
+def wait_for(outbox, alert_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        alert = outbox.get(alert_id)
+        if alert is not None and alert['status'] == status:
+            return alert
+        time.sleep(0.01)
+    raise AssertionError(f"{alert_id} never reached {status}: {outbox.get(alert_id)}")
+
+
+def eventually(predicate, timeout=5.0):
+    """on_dead runs on the worker just after the dead state is stored"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def make_outbox(tmp_path):
+    outboxes = []
+
+    def make(send_fn, **kwargs):
+        kwargs.setdefault('base_delay_s', 0.01)
+        kwargs.setdefault('poll_interval_s', 0.05)
+        outbox = AlertOutbox(send_fn, path=str(tmp_path / 'outbox.db'), **kwargs)
+        outboxes.append(outbox)
+        return outbox
+
+    yield make
+    for outbox in outboxes:
+        outbox.close()
+
+
+def test_transient_failures_are_retried_until_delivered(make_outbox):
+    results = [{'success': False, 'status_code': 503}, {'success': False, 'status_code': 429}, {'success': True}]
+    outbox = make_outbox(lambda payload: results.pop(0))
+
+    alert = wait_for(outbox, outbox.enqueue({'error_code': 'E001'}), STATUS_DELIVERED)
+
+    assert alert['attempts'] == 3
+    assert outbox.stats()['retried'] == 2
+
+
+def test_dead_letters_call_on_dead(make_outbox):
+    dead = []
+    outbox = make_outbox(lambda payload: {'success': False, 'status_code': 503, 'message': 'down'},
+                         max_attempts=2, on_dead=dead.append)
+
+    alert = wait_for(outbox, outbox.enqueue({'error_code': 'E001'}), STATUS_DEAD)
+
+    assert alert['attempts'] == 2 and alert['last_error'] == 'down'
+    eventually(lambda: dead)
+    assert dead == [{'error_code': 'E001'}]
+
+
+def test_rejected_alert_is_dead_at_once_and_callback_errors_are_contained(make_outbox):
+    def broken_callback(payload):
+        raise RuntimeError("callback failed")
+
+    outbox = make_outbox(lambda payload: {'success': False, 'status_code': 400}, on_dead=broken_callback)
+
+    first = wait_for(outbox, outbox.enqueue({'n': 1}), STATUS_DEAD)
+    # The worker survived the callback error
+    wait_for(outbox, outbox.enqueue({'n': 2}), STATUS_DEAD)
+    assert first['attempts'] == 1
@@ -0,0 +1,123 @@
+"""Per-machine alert cool-downs, escalation and hysteresis clearing"""
+import time
+
+import pytest
+
+from alert_outbox import STATUS_DEAD
+from alert_suppression import AlertSuppressor
+from automation import AutomationTrigger
+
+T0 = 1_700_000_000.0
+
+
+@pytest.fixture
+def suppressor():
+    return AlertSuppressor(cooldowns={'HIGH': 900, 'CRITICAL': 300}, clear_risk=65, clear_after_s=60)
+
+
+def test_repeat_within_cool_down_is_suppressed_then_renotified(suppressor):
+    assert suppressor.check('m1', 'E001', now=T0)['decision'] == 'new'
+    held = suppressor.check('m1', 'E001', now=T0 + 100)
+    again = suppressor.check('m1', 'E001', now=T0 + 900)
+
+    assert not held['send'] and held['suppressed_count'] == 1
+    assert again['decision'] == 'renotify' and again['suppressed_count'] == 1
+
+
+def test_higher_severity_escalates_through_the_cool_down(suppressor):
+    suppressor.check('m1', 'E001', now=T0)
+
+    assert suppressor.check('m1', 'E005', now=T0 + 10)['decision'] == 'escalated'
+    assert suppressor.check('m2', 'E001', now=T0 + 10)['decision'] == 'new'
+
+
+def test_clearing_needs_risk_to_stay_low(suppressor):
+    suppressor.check('m1', 'E001', now=T0)
+
+    assert not suppressor.observe('m1', 50, now=T0 + 10)
+    # Risk between the clear level and the alert threshold restarts the clock
+    assert not suppressor.observe('m1', 70, now=T0 + 40)
+    assert not suppressor.observe('m1', 50, now=T0 + 50)
+    assert not suppressor.observe('m1', 50, now=T0 + 100)
+    assert suppressor.observe('m1', 50, now=T0 + 110)
+    assert suppressor.check('m1', 'E001', now=T0 + 120)['decision'] == 'new'
+
+
+def test_alert_interrupts_clearing(suppressor):
+    suppressor.check('m1', 'E001', now=T0)
+    suppressor.observe('m1', 50, now=T0 + 10)
+    suppressor.check('m1', 'E001', now=T0 + 30)
+
+    assert not suppressor.observe('m1', 50, now=T0 + 75)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def rejecting_trigger(monkeypatch, tmp_path):
+    monkeypatch.setenv('N8N_WEBHOOK_URL', 'http://n8n.invalid/webhook')
+    monkeypatch.setenv('ALERT_OUTBOX_PATH', str(tmp_path / 'outbox.db'))
+    monkeypatch.setenv('ALERT_OUTBOX_BASE_DELAY_S', '0.01')
+    monkeypatch.setattr(AutomationTrigger, '_send_payload',
+                        lambda self, payload: {'success': False, 'status_code': 400, 'message': 'rejected'})
+    triggers = []
+
+    def make(**kwargs):
+        trigger = AutomationTrigger(use_outbox=True, suppress=True, **kwargs)
+        triggers.append(trigger)
+        return trigger
+
+    yield make
+    for trigger in triggers:
+        trigger.outbox.close()
+        if trigger.digest is not None:
+            trigger.digest.close()
+
+
+def test_dead_lettered_alert_releases_its_cool_down(rejecting_trigger):
+    trigger = rejecting_trigger()
+
+    first = trigger.trigger_maintenance_alert(90, {'machine_id': 'm1'}, error_code='E001')
+    wait_for(lambda: trigger.outbox.get(first['alert_id'])['status'] == STATUS_DEAD)
+    wait_for(lambda: trigger.suppressor.stats()['active_alerts'] == 0)
+    second = trigger.trigger_maintenance_alert(90, {'machine_id': 'm1'}, error_code='E001')
+
+    assert second.get('queued') and not second.get('suppressed')
+
+
+def test_dead_lettered_digest_releases_every_alert(rejecting_trigger):
+    trigger = rejecting_trigger(use_digest=True)
+
+    for machine in ('m1', 'm2'):
+        assert trigger.trigger_maintenance_alert(90, {'machine_id': machine}, error_code='E001')['batched']
+    assert trigger.suppressor.stats()['active_alerts'] == 2
+    digest_id = trigger.digest.flush()['alert_id']
+
+    wait_for(lambda: trigger.outbox.get(digest_id)['status'] == STATUS_DEAD)
+    wait_for(lambda: trigger.suppressor.stats()['active_alerts'] == 0)
+
+
+def test_failed_enqueue_releases_its_cool_down(rejecting_trigger, monkeypatch):
+    trigger = rejecting_trigger()
+
+    def unavailable(payload, alert_id=None):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(trigger.outbox, 'enqueue', unavailable)
+    failed = trigger.trigger_maintenance_alert(90, {'machine_id': 'm1'}, error_code='E001')
+
+    assert not failed['success']
+    assert trigger.suppressor.stats()['active_alerts'] == 0
+
+
+def test_suppression_is_opt_in(monkeypatch):
+    monkeypatch.delenv('ALERT_SUPPRESSION', raising=False)
+    assert AutomationTrigger(use_outbox=False, use_digest=False).suppressor is None
+
+    monkeypatch.setenv('ALERT_SUPPRESSION', 'true')
+    assert AutomationTrigger(use_outbox=False, use_digest=False).suppressor is not None
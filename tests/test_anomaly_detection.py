@@ -0,0 +1,103 @@
+"""Local anomaly detection: spikes, shifts and the per-window time budget"""
+import gc
+import time
+
+import numpy as np
+import pytest
+
+from anomaly_detection import detect_anomalies, SENSOR_LABELS
+from trend_stats import SensorWindow
+
+N = 1000
+# Best time of one detect_anomalies call over a 1000 x 8 window, timed like timeit (best of
+# several batches, garbage collector off)
+BUDGET_MS = 1.0
+
+
+def columns(seed, n=N):
+    rng = np.random.default_rng(seed)
+    return {
+        'temperature': 70 + rng.normal(size=n),
+        'vibration': 2 + 0.1 * rng.normal(size=n),
+        'cycle_time': 30 + rng.normal(size=n),
+        'error_count': rng.poisson(5.0, n).astype(float),
+        'pressure': 100 + rng.normal(size=n),
+        'humidity': 40 + rng.normal(size=n),
+        'power': 500 + 5 * rng.normal(size=n),
+        'production': 90 + rng.normal(size=n),
+    }
+
+
+def window(seed, n=N):
+    data = columns(seed, n)
+    return SensorWindow(np.column_stack([data[s] for s in SENSOR_LABELS]), list(SENSOR_LABELS))
+
+
+def readings(seed, n=N):
+    data = columns(seed, n)
+    return [{'timestamp': f'2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}', 'machine_id': 'm1',
+             **{s: float(data[s][i]) for s in SENSOR_LABELS}} for i in range(n)]
+
+
+def column(w, sensor):
+    return w.values[:, w.names.index(sensor)]
+
+
+def test_reading_far_from_its_trailing_window_is_a_spike():
+    w = window(1)
+    column(w, 'temperature')[600] += 8
+
+    spikes = [a for a in detect_anomalies(w) if a['sensor'] == 'temperature' and a['method'] == 'zscore']
+
+    assert [(a['index'], a['direction']) for a in spikes] == [(600, 'increase')]
+
+
+def test_error_burst_is_a_spike():
+    w = window(1)
+    column(w, 'error_count')[600] = 40
+
+    spikes = [a for a in detect_anomalies(w) if a['sensor'] == 'error_count' and a['method'] == 'zscore']
+
+    assert [(a['index'], a['direction']) for a in spikes] == [(600, 'increase')]
+
+
+def test_level_shift_is_a_change_point():
+    w = window(2)
+    column(w, 'pressure')[700:] -= 2
+
+    found = [a for a in detect_anomalies(w) if a['sensor'] == 'pressure']
+
+    assert {'ewma', 'cusum'} <= {a['method'] for a in found}
+    assert all(a['direction'] == 'decrease' for a in found)
+    change = next(a for a in found if a['method'] == 'cusum')
+    assert 690 <= change['start_index'] <= 710
+
+
+def test_missing_readings_are_not_anomalous():
+    w = window(3)
+    column(w, 'temperature')[::7] = np.nan
+    column(w, 'temperature')[600] = 80
+
+    found = [a for a in detect_anomalies(w) if a['sensor'] == 'temperature']
+
+    assert {a['index'] for a in found} == {600}
+    assert 'zscore' in {a['method'] for a in found}
+    assert found[0]['baseline'] == pytest.approx(70, abs=0.2)
+
+
+@pytest.mark.parametrize('source', [window, readings])
+def test_budget_for_a_1000_reading_window(source):
+    history = source(0)
+    detect_anomalies(history)
+    batches = []
+    gc.disable()
+    try:
+        for _ in range(30):
+            start = time.perf_counter()
+            for _ in range(10):
+                detect_anomalies(history)
+            batches.append((time.perf_counter() - start) / 10)
+    finally:
+        gc.enable()
+
+    assert min(batches) * 1e3 < BUDGET_MS
@@ -0,0 +1,115 @@
+"""Async explanations await the provider's async client on the event loop"""
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip('langchain')
+
+from ai_explainer import AIExplainer
+from circuit_breaker import CircuitBreaker
+
+PREDICTION = {'risk': 66.0, 'feature_importance': {'vibration': 0.8, 'temperature': 0.2}}
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class AsyncOnlyChain:
+    def __init__(self, delay_s=0.02):
+        self.delay_s = delay_s
+        self.threads = []
+
+    def invoke(self, variables, config=None):
+        raise AssertionError("sync client used from aexplain")
+
+    async def ainvoke(self, variables, config=None):
+        self.threads.append(threading.current_thread())
+        await asyncio.sleep(self.delay_s)
+        return Message("Root Cause: Loose mounting bolts. Recommended Action: Torque the mounts.")
+
+
+def make_explainer(chain, deadline_s=5.0):
+    explainer = AIExplainer()
+    explainer.llm = object()
+    explainer.chain = chain
+    explainer.breaker = CircuitBreaker('openai-async-test', deadline_s=deadline_s)
+    return explainer
+
+
+def test_concurrent_aexplain_shares_one_call_on_the_loop_thread():
+    chain = AsyncOnlyChain()
+    explainer = make_explainer(chain)
+    sensors = {'temperature': 66.0, 'vibration': 7.7, 'cycle_time': 39.0, 'error_count': 0}
+
+    async def main():
+        return await asyncio.gather(*(explainer.aexplain(PREDICTION, sensors) for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert results == [{'root_cause': 'Loose mounting bolts.', 'recommended_action': 'Torque the mounts.'}] * 5
+    assert chain.threads == [threading.main_thread()]
+    assert explainer.async_single_flight.stats()['coalesced'] == 4
+
+
+def test_slow_async_call_falls_back_at_the_deadline():
+    explainer = make_explainer(AsyncOnlyChain(delay_s=5.0), deadline_s=0.05)
+    sensors = {'temperature': 66.0, 'vibration': 9.9, 'cycle_time': 39.0, 'error_count': 0}
+
+    result = asyncio.run(asyncio.wait_for(explainer.aexplain(PREDICTION, sensors), 2.0))
+
+    assert result['root_cause'] and result['root_cause'] != 'Loose mounting bolts.'
+    assert explainer.breaker.stats()['timeouts'] == 1
+
+
+class Reply:
+    def __init__(self, text):
+        self.text = text
+
+
+class GeminiModel:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def generate_content(self, prompt):
+        self.calls.append('sync')
+        return self._reply()
+
+    async def generate_content_async(self, prompt):
+        self.calls.append('async')
+        await asyncio.sleep(0)
+        return self._reply()
+
+    def _reply(self):
+        if self.fail:
+            raise RuntimeError("quota exceeded")
+        return Reply("Temperature is climbing steadily.")
+
+
+def trend_history(offset):
+    return [{'timestamp': f'2024-01-01T00:00:{i:02d}', 'machine_id': f'gemini-{offset}',
+             'temperature': offset + 0.5 * i, 'vibration': 2.0, 'error_count': 0} for i in range(30)]
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_sync_and_async_trend_analysis_agree(fail):
+    from gemini_analyzer import GeminiAnalyzer
+
+    results = []
+    # Distinct histories per run so the response store and trend gate miss
+    base = 700.0 if fail else 600.0
+    for offset, run in ((base, lambda a, h: a.analyze_trends(h)),
+                        (base + 50, lambda a, h: asyncio.run(a.aanalyze_trends(h)))):
+        analyzer = GeminiAnalyzer()
+        analyzer.model = GeminiModel(fail=fail)
+        analyzer.breaker = CircuitBreaker(f'gemini-{offset}', deadline_s=5.0)
+        results.append((run(analyzer, trend_history(offset)), analyzer.model.calls))
+
+    (sync, sync_calls), (async_, async_calls) = results
+    assert (sync_calls, async_calls) == (['sync'], ['async'])
+    assert sync['status'] == async_['status'] == ('dummy' if fail else 'analyzed')
+    if not fail:
+        assert sync['summary'] == async_['summary'] == "Temperature is climbing steadily."
@@ -0,0 +1,133 @@
+"""Circuit breaker: deadlines, opening, half-open probes and instant fallback"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+
+def failing():
+    raise RuntimeError("provider error")
+
+
+def make_breaker(**kwargs):
+    kwargs.setdefault('failure_threshold', 2)
+    kwargs.setdefault('reset_timeout_s', 0.05)
+    kwargs.setdefault('deadline_s', 1.0)
+    return CircuitBreaker('test', **kwargs)
+
+
+def test_consecutive_failures_open_the_breaker():
+    breaker = make_breaker()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            breaker.call(failing)
+
+    assert breaker.state == STATE_OPEN
+    called = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: called.append(1))
+    assert called == []
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = make_breaker()
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+    assert breaker.call(lambda: 'ok') == 'ok'
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+
+    assert breaker.state == STATE_CLOSED
+
+
+def test_call_past_its_deadline_releases_the_caller():
+    breaker = make_breaker(failure_threshold=1, deadline_s=0.05)
+    release = threading.Event()
+
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        breaker.call(lambda: release.wait(5))
+    release.set()
+
+    assert time.monotonic() - started < 1.0
+    assert breaker.state == STATE_OPEN
+    assert breaker.stats()['timeouts'] == 1
+
+
+def test_slow_successes_count_as_failures():
+    breaker = make_breaker(failure_threshold=1, slow_call_s=0.01)
+
+    assert breaker.call(lambda: time.sleep(0.02) or 'late') == 'late'
+    assert breaker.state == STATE_OPEN
+    assert breaker.stats()['slow_calls'] == 1
+
+
+def test_half_open_admits_one_probe_that_decides():
+    breaker = make_breaker(failure_threshold=1)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert breaker.allow_request()
+    assert breaker.state == STATE_HALF_OPEN
+    # A second caller is turned away while the probe is out
+    assert not breaker.allow_request()
+    breaker.record_success(0.0)
+    assert breaker.state == STATE_CLOSED
+
+    breaker.record_failure()
+    time.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        breaker.call(failing)
+    assert breaker.state == STATE_OPEN
+    assert breaker.stats()['times_opened'] == 3
+
+
+def test_async_deadline_and_cancelled_probe():
+    breaker = make_breaker(failure_threshold=1, deadline_s=0.05)
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def main():
+        with pytest.raises(TimeoutError):
+            await breaker.acall(slow)
+        assert breaker.state == STATE_OPEN
+
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(breaker.acall(slow, deadline_s=0))
+        await asyncio.sleep(0)
+        assert breaker.state == STATE_HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(main())
+    # The cancelled caller did not judge the provider, and the next probe may go ahead
+    assert breaker.state == STATE_HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_open_breaker_answers_explain_with_the_template():
+    pytest.importorskip('langchain')
+    from ai_explainer import AIExplainer
+
+    class UnreachableChain:
+        def invoke(self, variables, config=None):
+            raise AssertionError("the provider must not be called while the breaker is open")
+
+    explainer = AIExplainer()
+    explainer.llm = object()
+    explainer.chain = UnreachableChain()
+    explainer.breaker = make_breaker(failure_threshold=1, reset_timeout_s=60)
+    explainer.breaker.record_failure()
+
+    started = time.monotonic()
+    result = explainer.explain({'risk': 77.0, 'feature_importance': {'vibration': 1.0}},
+                               {'temperature': 64.0, 'vibration': 6.3, 'cycle_time': 51.0, 'error_count': 4})
+
+    assert time.monotonic() - started < 0.5
+    assert result['root_cause'] and result['recommended_action']
@@ -0,0 +1,65 @@
+"""Background enrichment of rule explanations"""
+import threading
+import time
+
+from rule_explainer import EnrichmentQueue
+
+RULES = {'root_cause': 'Temperature high', 'recommended_action': 'Check cooling.'}
+
+
+def wait_for(queue, explanation_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        entry = queue.get(explanation_id)
+        if entry is not None and entry['status'] == status:
+            return entry
+        time.sleep(0.01)
+    raise AssertionError(f"{explanation_id} never reached {status}: {queue.get(explanation_id)}")
+
+
+def test_explanation_is_visible_to_another_worker(tmp_path):
+    path = str(tmp_path / 'store.db')
+    worker_a = EnrichmentQueue(lambda p, s: {'root_cause': 'LLM cause', 'recommended_action': 'LLM action'}, path=path)
+    worker_b = EnrichmentQueue(lambda p, s: None, path=path)
+
+    explanation_id, status = worker_a.submit(RULES, {'risk': 80}, {'temperature': 90})
+    assert status == 'pending'
+
+    entry = wait_for(worker_b, explanation_id, 'enriched')
+    assert entry['rules'] == RULES
+    assert entry['enriched']['root_cause'] == 'LLM cause'
+
+
+def test_full_queue_skips_enrichment(tmp_path):
+    release = threading.Event()
+
+    def slow_enrich(prediction, sensors):
+        release.wait(5)
+        return {'root_cause': 'late', 'recommended_action': 'late'}
+
+    queue = EnrichmentQueue(slow_enrich, path=str(tmp_path / 'store.db'), max_workers=1, max_pending=2)
+    statuses = [queue.submit(RULES, {}, {})[1] for _ in range(4)]
+    release.set()
+
+    assert statuses == ['pending', 'pending', 'skipped', 'skipped']
+    assert queue.stats()['skipped'] == 2
+
+
+def test_failed_enrichment_and_rules_only(tmp_path):
+    def broken(prediction, sensors):
+        raise RuntimeError("No LLM explanation available")
+
+    queue = EnrichmentQueue(broken, path=str(tmp_path / 'store.db'))
+    failed_id, _ = queue.submit(RULES, {}, {})
+    rules_id, status = queue.submit(RULES, {}, {}, enrich=False)
+
+    assert wait_for(queue, failed_id, 'failed')['enriched'] is None
+    assert status == 'rules_only' and queue.get(rules_id)['status'] == 'rules_only'
+
+
+def test_oldest_entries_are_dropped(tmp_path):
+    queue = EnrichmentQueue(lambda p, s: None, path=str(tmp_path / 'store.db'), max_entries=3)
+    ids = [queue.submit(RULES, {}, {}, enrich=False)[0] for _ in range(5)]
+
+    assert queue.get(ids[0]) is None
+    assert all(queue.get(i) is not None for i in ids[-3:])
@@ -0,0 +1,83 @@
+"""Batched fleet explanations: several machines per LLM request"""
+import json
+import re
+import threading
+
+import pytest
+
+pytest.importorskip('langchain')
+
+from ai_explainer import AIExplainer
+from circuit_breaker import CircuitBreaker
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class BatchChain:
+    """Answers for every machine in the prompt except those in `skip`"""
+
+    def __init__(self, skip=()):
+        self.skip = set(skip)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def invoke(self, variables, config=None):
+        machine_ids = re.findall(r'^Machine (\S+):', variables['machines'], re.MULTILINE)
+        with self._lock:
+            self.requests.append(machine_ids)
+        return Message(json.dumps([
+            {'machine_id': m, 'root_cause': f'{m} cause', 'recommended_action': f'{m} action'}
+            for m in machine_ids if m not in self.skip
+        ]))
+
+
+def items(count, offset):
+    # Distinct readings per test so the explanation cache and response store miss
+    return [{'machine_id': f'm{i}',
+             'prediction_result': {'risk': 60.0 + i, 'feature_importance': {'temperature': 0.7, 'vibration': 0.3}},
+             'sensor_data': {'temperature': offset + 3.1 * i, 'vibration': 3.0, 'cycle_time': 40.0, 'error_count': 1}}
+            for i in range(count)]
+
+
+def make_explainer(chain):
+    explainer = AIExplainer()
+    explainer.llm = object()
+    explainer.batch_chain = chain
+    explainer.breaker = CircuitBreaker('openai-batch-test', deadline_s=5.0)
+    return explainer
+
+
+def test_machines_share_requests_within_the_token_budget():
+    chain = BatchChain()
+    explainer = make_explainer(chain)
+
+    results = explainer.explain_batch(items(12, offset=100.0), token_budget=400)
+
+    assert list(results) == [f'm{i}' for i in range(12)]
+    assert all(r['source'] == 'llm' and r['root_cause'] == f'{m} cause' for m, r in results.items())
+    assert 1 < len(chain.requests) < 12
+    assert sorted(m for request in chain.requests for m in request) == sorted(results)
+
+
+def test_machines_missing_from_the_reply_fall_back_alone():
+    explainer = make_explainer(BatchChain(skip={'m1'}))
+
+    results = explainer.explain_batch(items(3, offset=200.0))
+
+    assert [r['source'] for r in results.values()] == ['llm', 'fallback', 'llm']
+    assert results['m1']['root_cause']
+
+
+def test_repeated_machines_come_from_the_cache():
+    chain = BatchChain()
+    explainer = make_explainer(chain)
+    batch = items(4, offset=300.0)
+    explainer.explain_batch(batch)
+
+    again = explainer.explain_batch(batch)
+
+    assert len(chain.requests) == 1
+    assert {r['source'] for r in again.values()} == {'cache'}
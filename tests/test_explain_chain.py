@@ -0,0 +1,44 @@
+"""The explanation prompt and chain are built once per explainer"""
+import pytest
+
+pytest.importorskip('langchain')
+
+import ai_explainer
+from ai_explainer import AIExplainer
+from circuit_breaker import CircuitBreaker
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+
+class RecordingChain:
+    def __init__(self):
+        self.variables = []
+
+    def invoke(self, variables, config=None):
+        self.variables.append(variables)
+        return Message("Root Cause: Coolant flow is low. Recommended Action: Flush the coolant loop.")
+
+
+def test_explain_reuses_the_prompt_built_at_startup(monkeypatch):
+    explainer = AIExplainer()
+    explainer.llm = object()
+    explainer.chain = RecordingChain()
+    explainer.breaker = CircuitBreaker('openai-chain-test', deadline_s=5.0)
+    prompt = explainer.prompt
+
+    def rebuilt(*args, **kwargs):
+        raise AssertionError("prompt template rebuilt per call")
+
+    monkeypatch.setattr(ai_explainer.ChatPromptTemplate, 'from_messages', rebuilt)
+    first = explainer.explain({'risk': 71.0, 'feature_importance': {'temperature': 0.9, 'vibration': 0.1}},
+                              {'temperature': 141.0, 'vibration': 2.2, 'cycle_time': 44.0, 'error_count': 0})
+    second = explainer.explain({'risk': 48.0, 'feature_importance': {'cycle_time': 1.0}},
+                               {'temperature': 55.0, 'vibration': 1.1, 'cycle_time': 77.0, 'error_count': 3})
+
+    assert explainer.prompt is prompt
+    assert [v['temp'] for v in explainer.chain.variables] == [141.0, 55.0]
+    assert first == {'root_cause': 'Coolant flow is low.', 'recommended_action': 'Flush the coolant loop.'}
+    assert second == first
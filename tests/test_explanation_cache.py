@@ -0,0 +1,48 @@
+"""Explanation cache: situation signatures, TTL and LRU bounds"""
+import time
+
+from explanation_cache import ExplanationCache, explanation_signature
+
+PREDICTION = {'risk': 82.0, 'feature_importance': {'temperature': 0.6, 'vibration': 0.3, 'cycle_time': 0.1}}
+SENSORS = {'temperature': 91.0, 'vibration': 4.2, 'cycle_time': 33.0, 'error_count': 2}
+
+
+def test_nearby_readings_share_a_signature():
+    nearby = dict(SENSORS, temperature=91.4, vibration=4.1)
+
+    assert explanation_signature(PREDICTION, SENSORS) == explanation_signature(dict(PREDICTION, risk=85.0), nearby)
+
+
+def test_material_changes_change_the_signature():
+    base = explanation_signature(PREDICTION, SENSORS)
+
+    assert explanation_signature(dict(PREDICTION, risk=92.0), SENSORS) != base
+    assert explanation_signature(PREDICTION, dict(SENSORS, temperature=97.0)) != base
+    reordered = dict(PREDICTION, feature_importance={'temperature': 0.1, 'vibration': 0.3, 'cycle_time': 0.6})
+    assert explanation_signature(reordered, SENSORS) != base
+    assert explanation_signature(PREDICTION, SENSORS, error_code='E999') != base
+
+
+def test_entries_expire():
+    cache = ExplanationCache(max_entries=4, ttl_s=0.05)
+    cache.put('k', {'root_cause': 'heat'}, latency_s=1.5)
+
+    assert cache.get('k') == {'root_cause': 'heat'}
+    time.sleep(0.08)
+    assert cache.get('k') is None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expired']) == (1, 1, 1)
+    assert stats['saved_latency_s'] == 1.5
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ExplanationCache(max_entries=2, ttl_s=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
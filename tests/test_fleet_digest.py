@@ -0,0 +1,94 @@
+"""Fleet-level trend digest: ranking machines and one Gemini call for the plant"""
+import numpy as np
+
+from fleet_digest import fleet_statistics, parse_fleet_response
+from gemini_analyzer import GeminiAnalyzer
+
+N = 200
+
+
+def columns(seed, n=N, **overrides):
+    rng = np.random.default_rng(seed)
+    history = {
+        'timestamp': 1_700_000_000 + np.arange(n) * 10.0,
+        'temperature': 70 + rng.normal(0, 0.5, n),
+        'vibration': 2 + rng.normal(0, 0.05, n),
+        'cycle_time': 30 + rng.normal(0, 0.5, n),
+    }
+    history.update(overrides)
+    return history
+
+
+def fleet(size=8, seed=0):
+    return {f'm{i}': columns(seed * 100 + i) for i in range(size)}
+
+
+def test_each_kind_of_deviation_ranks_its_machine_first():
+    spike = fleet()
+    spike['m3']['temperature'][-1] = 95.0
+    drift = fleet()
+    drift['m5']['vibration'] = drift['m5']['vibration'] + np.linspace(0, 1.5, N)
+    outlier = fleet()
+    outlier['m6']['cycle_time'] = outlier['m6']['cycle_time'] + 8
+
+    for history, machine, sensor, kind in ((spike, 'm3', 'temperature', 'spike'),
+                                          (drift, 'm5', 'vibration', 'drift'),
+                                          (outlier, 'm6', 'cycle_time', 'outlier')):
+        top = fleet_statistics(history, sensors=['temperature', 'vibration', 'cycle_time'])['machines'][0]
+        assert (top['machine_id'], top['driver']['sensor'], top['driver']['kind']) == (machine, sensor, kind)
+
+
+def test_short_histories_are_skipped_and_small_fleets_have_no_outliers():
+    history = fleet(size=2)
+    history['m9'] = columns(9, n=3)
+    history['m0']['cycle_time'] = history['m0']['cycle_time'] + 8
+
+    digest = fleet_statistics(history, sensors=['temperature', 'vibration', 'cycle_time'])
+
+    assert digest['skipped'] == ['m9']
+    assert all(s['outlier_z'] == 0 for m in digest['machines'] for s in m['sensors'].values())
+
+
+def test_parse_fleet_response():
+    content = ("PLANT SUMMARY:\nTwo machines need attention.\n\nMACHINE NOTES:\n"
+               "- m3: Temperature spike, check cooling.\n- **m5**: Vibration creeping up.\n- m99: unknown")
+
+    summary, notes = parse_fleet_response(content, ['m3', 'm5'])
+
+    assert summary == "Two machines need attention."
+    assert notes == {'m3': 'Temperature spike, check cooling.', 'm5': 'Vibration creeping up.'}
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class RecordingModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt):
+        self.prompts.append(prompt)
+        return Response("PLANT SUMMARY:\nm3 runs hot.\nMACHINE NOTES:\n- m3: Inspect the cooling loop.")
+
+
+def test_one_call_describes_only_the_top_machines():
+    analyzer = GeminiAnalyzer()
+    analyzer.model = RecordingModel()
+    small, large = fleet(size=5, seed=1), fleet(size=40, seed=2)
+    for history in (small, large):
+        history['m3']['temperature'][-1] = 95.0
+
+    result = analyzer.analyze_fleet(large, top_k=4)
+    analyzer.analyze_fleet(small, top_k=4)
+
+    assert len(analyzer.model.prompts) == 2
+    assert result['machine_count'] == 40 and len(result['ranking']) == 40
+    assert [m['machine_id'] for m in result['machines']][0] == 'm3'
+    assert len(result['machines']) == 4
+    assert result['machines'][0]['note'] == 'Inspect the cooling loop.'
+    assert result['machines'][1]['note_source'] == 'local'
+    # The prompt lists top_k machines however large the fleet is
+    large_lines, small_lines = (sum(line.startswith('- m') for line in p.splitlines()) for p in analyzer.model.prompts)
+    assert large_lines == small_lines == 4
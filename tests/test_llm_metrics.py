@@ -0,0 +1,81 @@
+"""LLM call metrics and their NDJSON event log"""
+import json
+import os
+import threading
+
+import pytest
+
+from llm_metrics import LLMMetrics, EVENT_CALL, EVENT_CACHE_HIT
+
+
+def read_log(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def blocked_writer(monkeypatch):
+    """Hold the log writer inside its first write until the returned event is set"""
+    release = threading.Event()
+    entered = threading.Event()
+    write = LLMMetrics._write_log
+
+    def slow_write(self, batch):
+        entered.set()
+        release.wait(5)
+        write(self, batch)
+
+    monkeypatch.setattr(LLMMetrics, '_write_log', slow_write)
+    return entered, release
+
+
+def test_record_does_not_wait_for_the_log(tmp_path, blocked_writer):
+    entered, release = blocked_writer
+    metrics = LLMMetrics(log_path=str(tmp_path / 'metrics.ndjson'))
+
+    metrics.record('openai', 'gpt-3.5-turbo', EVENT_CALL, prompt_tokens=100, completion_tokens=50, wall_s=0.2)
+    assert entered.wait(5)
+    # The writer is stuck; recording carries on regardless
+    metrics.record('openai', 'gpt-3.5-turbo', EVENT_CACHE_HIT)
+    assert metrics.snapshot()['totals']['cache_hits'] == 1
+    release.set()
+
+    assert metrics.flush_log()
+    entries = read_log(tmp_path / 'metrics.ndjson')
+    assert [e['event'] for e in entries] == [EVENT_CALL, EVENT_CACHE_HIT]
+    assert entries[0]['prompt_tokens'] == 100
+
+
+def test_full_queue_drops_the_oldest_events(tmp_path, blocked_writer):
+    entered, release = blocked_writer
+    metrics = LLMMetrics(log_path=str(tmp_path / 'metrics.ndjson'), log_queue_max=3)
+
+    metrics.record('gemini', 'gemini-pro', EVENT_CALL, error='first')
+    assert entered.wait(5)
+    for i in range(10):
+        metrics.record('gemini', 'gemini-pro', EVENT_CALL, error=str(i))
+    release.set()
+
+    assert metrics.flush_log()
+    assert [e['error'] for e in read_log(tmp_path / 'metrics.ndjson')] == ['first', '7', '8', '9']
+    assert metrics.snapshot()['log'] == {'queued': 0, 'written': 4, 'dropped': 7, 'errors': 0}
+
+
+def test_log_rotates(tmp_path):
+    path = tmp_path / 'metrics.ndjson'
+    metrics = LLMMetrics(log_path=str(path), log_max_bytes=1000)
+
+    for _ in range(20):
+        metrics.record('openai', 'gpt-3.5-turbo', EVENT_CALL, prompt_tokens=10)
+        assert metrics.flush_log()
+
+    assert os.path.exists(str(path) + '.1')
+    assert os.path.getsize(path) <= 1000
+
+
+def test_log_off(tmp_path):
+    metrics = LLMMetrics(log_path='off')
+    metrics.record('openai', 'gpt-3.5-turbo', EVENT_CALL)
+
+    assert metrics.snapshot()['log_path'] is None
+    assert metrics.flush_log()
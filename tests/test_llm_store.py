@@ -0,0 +1,73 @@
+"""Size-bounded LLM response store"""
+import sqlite3
+
+from llm_store import LLMResponseStore
+
+
+def size_of(prompt, response):
+    return len(prompt.encode('utf-8')) + len(response.encode('utf-8'))
+
+
+def summed(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_put_does_not_sum_the_store(tmp_path):
+    store = LLMResponseStore(path=str(tmp_path / 'store.db'), mode='readwrite', max_bytes=10_000)
+    statements = []
+    store._connection().set_trace_callback(statements.append)
+
+    store.put('prompt', 'model', {}, 'response')
+
+    assert not [s for s in statements if 'SUM(' in s.upper()]
+    assert store.stats()['bytes'] == size_of('prompt', 'response')
+
+
+def test_total_follows_replacements_and_other_processes(tmp_path):
+    path = str(tmp_path / 'store.db')
+    first = LLMResponseStore(path=path, mode='readwrite', max_bytes=10_000)
+    second = LLMResponseStore(path=path, mode='readwrite', max_bytes=10_000)
+
+    first.put('p1', 'model', {}, 'a' * 100)
+    first.put('p1', 'model', {}, 'a' * 10)
+    second.put('p2', 'model', {}, 'b' * 50)
+
+    assert first.stats()['bytes'] == second.stats()['bytes'] == summed(path) == 2 + 10 + 2 + 50
+    assert first.stats()['entries'] == 2
+
+
+def test_least_recently_used_entries_are_evicted_past_the_cap(tmp_path):
+    path = str(tmp_path / 'store.db')
+    store = LLMResponseStore(path=path, mode='readwrite', max_bytes=1000)
+    for i in range(10):
+        store.put(f'p{i}', 'model', {}, 'x' * 98)
+    store.get('p0', 'model', {})
+
+    store.put('p10', 'model', {}, 'x' * 197)
+
+    assert store.stats()['bytes'] == summed(path) <= 900
+    assert store.get('p0', 'model', {}) is not None
+    assert store.get('p1', 'model', {}) is None
+    assert store.stats()['evictions'] == 3
+
+
+def test_existing_store_is_seeded_with_its_total(tmp_path):
+    path = str(tmp_path / 'store.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE responses (key TEXT PRIMARY KEY, model TEXT NOT NULL, prompt TEXT NOT NULL,
+                                response TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL,
+                                last_access REAL NOT NULL)
+    """)
+    conn.execute("INSERT INTO responses VALUES ('k', 'model', 'p', 'r', 400, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = LLMResponseStore(path=path, mode='readwrite', max_bytes=10_000)
+    store.put('p2', 'model', {}, 'r2')
+
+    assert store.stats()['bytes'] == 404
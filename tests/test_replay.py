@@ -0,0 +1,27 @@
+"""Replay pacing of recorded readings"""
+from datetime import datetime, timezone
+
+from replay import SensorReplayer
+
+
+class FixedRiskPredictor:
+    trained = True
+
+    def predict_risk(self, sensor_data):
+        return {'risk': 10.0}
+
+
+def test_mixed_aware_and_naive_timestamps_are_paced():
+    naive = datetime(2024, 1, 1, 12, 0, 0)
+    readings = [
+        {'timestamp': naive.isoformat(), 'temperature': 70.0},
+        # The same clock, 30 s later, written with the local UTC offset
+        {'timestamp': datetime.fromtimestamp(naive.timestamp() + 30, timezone.utc).isoformat(), 'temperature': 71.0},
+        {'timestamp': naive.timestamp() + 60, 'temperature': 72.0},
+        {'temperature': 73.0},
+    ]
+    replayer = SensorReplayer(predictor=FixedRiskPredictor(), automation=object(), speed=0, trigger_alerts=False)
+
+    offsets = [result['replay_offset_s'] for result in replayer.iter_replay(readings)]
+
+    assert offsets == [0.0, 30.0, 60.0, None]
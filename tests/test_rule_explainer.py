@@ -0,0 +1,34 @@
+"""Rule explanations take trend directions and labels from the shared trend and anomaly modules"""
+import numpy as np
+
+from rule_explainer import RuleExplainer
+from trend_estimation import estimate_trends, overall_direction
+
+PREDICTION = {'risk': 72.0, 'feature_importance': {'temperature': 0.7, 'vibration': 0.3}}
+
+
+def history(n=60, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{'timestamp': f'2024-01-01T00:{i // 60:02d}:{i % 60:02d}', 'temperature': 70 + 0.3 * i + rng.normal(0, 0.2),
+             'vibration': 2.3 + rng.normal(0, 0.05), 'cycle_time': 42.0, 'error_count': 0}
+            for i in range(n)]
+
+
+def test_trends_follow_estimate_trends():
+    readings = history()
+
+    trends = RuleExplainer().trends(readings)
+
+    estimates = estimate_trends(readings)
+    assert trends == {name: overall_direction(estimates, name) for name in trends}
+    assert trends['temperature'] == 'rising' and trends['vibration'] == 'stable'
+
+
+def test_rising_driver_is_described_with_its_label():
+    readings = history()
+
+    result = RuleExplainer().explain(PREDICTION, readings[-1], history=readings)
+
+    assert f"temperature {readings[-1]['temperature']:.1f}°C" in result['root_cause']
+    assert 'rising' in result['root_cause']
+    assert 'still rising' in result['recommended_action']
@@ -0,0 +1,114 @@
+"""Sparse block index and time-bounded reads of sensor history files"""
+import json
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from sensor_loader import open_sensor_history
+from sensor_store import to_epoch_seconds
+
+T0 = datetime(2024, 1, 1)
+ROWS = 10000
+STRIDE = 1000
+
+
+def iso(i):
+    return (T0 + timedelta(seconds=i)).isoformat()
+
+
+@pytest.fixture
+def ndjson_path(tmp_path):
+    path = tmp_path / 'history.ndjson'
+    with open(path, 'w') as f:
+        for i in range(ROWS):
+            f.write(json.dumps({'timestamp': iso(i), 'temperature': 70 + i % 10, 'vibration': 1.0}) + '\n')
+    return str(path)
+
+
+def test_index_blocks_cover_every_row(ndjson_path):
+    source = open_sensor_history(ndjson_path, index_stride=STRIDE)
+
+    assert source.sorted
+    assert len(source.blocks) == ROWS // STRIDE
+    assert source.row_count == ROWS
+    assert len(source.read_range(iso(2500), iso(2599))) == 100
+
+
+@pytest.mark.parametrize('bound', [1, 500, 999, 4321])
+def test_head_with_start_inside_a_block_returns_n_rows(ndjson_path, bound):
+    source = open_sensor_history(ndjson_path, index_stride=STRIDE)
+    df = source.head(4000, start=iso(bound))
+
+    assert len(df) == 4000
+    assert df['timestamp'].iloc[0] == pd.Timestamp(iso(bound))
+
+
+@pytest.mark.parametrize('bound', [8999, 8500, 5000, ROWS - 2])
+def test_tail_with_end_inside_a_block_returns_n_rows(ndjson_path, bound):
+    source = open_sensor_history(ndjson_path, index_stride=STRIDE)
+    df = source.tail(4000, end=iso(bound))
+
+    assert len(df) == 4000
+    assert df['timestamp'].iloc[-1] == pd.Timestamp(iso(bound))
+
+
+def test_head_and_tail_stop_at_available_rows(ndjson_path):
+    source = open_sensor_history(ndjson_path, index_stride=STRIDE)
+
+    assert len(source.head(4000, start=iso(ROWS - 10))) == 10
+    assert len(source.tail(4000, end=iso(9))) == 10
+
+
+def test_csv_quoted_fields_with_commas(tmp_path):
+    path = tmp_path / 'history.csv'
+    with open(path, 'w') as f:
+        f.write('note,"timestamp",temperature\n')
+        for i in range(50):
+            f.write(f'"valve 3, line {i}",{iso(i)},{70 + i}\n')
+    source = open_sensor_history(str(path), index_stride=10)
+
+    first, last = source.time_bounds()
+    assert first == pd.Timestamp(iso(0)) and last == pd.Timestamp(iso(49))
+    df = source.read_range(iso(20), iso(29), columns=['note', 'temperature'])
+    assert len(df) == 10
+    assert df['note'].iloc[0] == 'valve 3, line 20'
+    assert df['temperature'].iloc[-1] == 99
+
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_epoch_timestamps_are_pruned_and_filtered(tmp_path, local_tz):
+    epoch0 = T0.timestamp()
+    path = tmp_path / 'epochs.ndjson'
+    with open(path, 'w') as f:
+        for i in range(1000):
+            f.write(json.dumps({'timestamp': epoch0 + i, 'temperature': 70 + i % 10}) + '\n')
+    source = open_sensor_history(str(path), index_stride=100)
+
+    assert source.sorted and len(source.blocks) == 10
+    df = source.read_range(epoch0 + 250, epoch0 + 349)
+    assert len(df) == 100
+    assert df['timestamp'].iloc[0] == pd.Timestamp(iso(250))
+    assert len(source.read_range(iso(250), iso(349))) == 100
+
+
+def test_naive_and_aware_timestamps_agree_with_the_store(tmp_path, local_tz):
+    naive = '2024-06-01T12:00:00'
+    path = tmp_path / 'mixed.ndjson'
+    with open(path, 'w') as f:
+        f.write(json.dumps({'timestamp': naive, 'temperature': 70}) + '\n')
+        f.write(json.dumps({'timestamp': '2024-06-01T16:00:01Z', 'temperature': 71}) + '\n')
+    source = open_sensor_history(str(path), index_stride=10)
+
+    stamps = source.read_range()['timestamp']
+    assert [to_epoch_seconds(ts) for ts in stamps] == [to_epoch_seconds(naive), to_epoch_seconds(naive) + 1]
+    assert stamps.iloc[1] == pd.Timestamp('2024-06-01T12:00:01')
@@ -0,0 +1,71 @@
+"""Time-range history queries: raw cap and rollup tiers"""
+import pytest
+
+from sensor_store import SensorStore, MAX_QUERY_POINTS
+
+T0 = 1_699_999_200.0  # On an hour boundary
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SensorStore(path=str(tmp_path / 'store.db'), retention_interval_s=1e9)
+    yield store
+    store.close()
+
+
+def test_raw_query_over_the_cap_keeps_newest_readings(store):
+    total = MAX_QUERY_POINTS * 2
+    store.append_many('m1', [{'timestamp': T0 + i, 'temperature': float(i)} for i in range(total)])
+
+    result = store.query('m1', ['temperature'], T0, T0 + total, resolution_s=0)
+
+    assert result['truncated']
+    assert len(result['timestamps']) == MAX_QUERY_POINTS
+    assert result['timestamps'][-1] == T0 + total - 1
+    assert result['timestamps'] == sorted(result['timestamps'])
+    assert result['sensors']['temperature']['mean'][-1] == total - 1
+
+
+def test_raw_query_within_the_cap_is_complete(store):
+    store.append_many('m1', [{'timestamp': T0 + i, 'temperature': 1.0} for i in range(100)])
+
+    result = store.query('m1', ['temperature'], T0, T0 + 100, resolution_s=0)
+
+    assert not result['truncated']
+    assert len(result['timestamps']) == 100
+
+
+def test_rollup_tiers_match_raw_aggregates(store):
+    # Two hours of readings every 10 seconds, written in several batches
+    readings = [{'timestamp': T0 + i * 10, 'temperature': float(i % 60), 'vibration': 2.0} for i in range(720)]
+    for i in range(0, len(readings), 100):
+        store.append_many('m1', readings[i:i + 100])
+
+    minute = store.query('m1', ['temperature'], T0, T0 + 7200, resolution_s=60)
+    hour = store.query('m1', ['temperature'], T0, T0 + 7200, resolution_s=3600)
+
+    assert minute['tier'] == '1m' and hour['tier'] == '1h'
+    assert sum(minute['sensors']['temperature']['count']) == 720
+    assert sum(hour['sensors']['temperature']['count']) == 720
+    assert hour['sensors']['temperature']['min'][0] == 0.0
+    assert hour['sensors']['temperature']['max'][0] == 59.0
+    assert hour['sensors']['temperature']['mean'][0] == pytest.approx(29.5)
+    assert not minute['truncated']
+
+
+def test_capped_resolution_is_a_whole_number_of_tier_buckets(store):
+    span = MAX_QUERY_POINTS * 60 + 600  # Needs 61 s points to stay within the cap
+    store.append_many('m1', [{'timestamp': T0 + i * 60, 'temperature': 1.0} for i in range(span // 60)])
+
+    result = store.query('m1', ['temperature'], T0, T0 + span, resolution_s=60)
+
+    assert (result['tier'], result['resolution_s']) == ('1m', 120)
+    assert set(result['sensors']['temperature']['count'][:-1]) == {2}
+    assert len(result['timestamps']) <= MAX_QUERY_POINTS
+
+
+def test_machines(store):
+    store.append_many('m2', [{'timestamp': T0, 'temperature': 1.0}])
+    store.append_many('m1', [{'timestamp': T0, 'temperature': 1.0}])
+
+    assert store.machines() == ['m1', 'm2']
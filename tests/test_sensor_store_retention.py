@@ -0,0 +1,59 @@
+"""Retention sweeps of the sensor store"""
+import pytest
+
+from sensor_store import SensorStore
+
+T0 = 1_699_999_200.0
+DAY = 86400
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SensorStore(path=str(tmp_path / 'store.db'), retention_interval_s=1e9,
+                        retention={'raw': 2 * DAY, '1m': 10 * DAY, '1h': 30 * DAY})
+    yield store
+    store.close()
+
+
+def count(store, sql, *args):
+    return store._conn.execute(sql, args).fetchone()[0]
+
+
+def test_retention_is_relative_to_newest_reading_across_machines(store):
+    # m1 reports for five days, m2 stopped after the first day
+    store.append_many('m1', [{'timestamp': T0 + h * 3600, 'temperature': 70.0} for h in range(5 * 24)])
+    store.append_many('m2', [{'timestamp': T0 + h * 3600, 'temperature': 60.0} for h in range(24)])
+    store.flush()
+
+    deleted = store.enforce_retention()
+
+    newest = T0 + (5 * 24 - 1) * 3600
+    assert deleted > 0
+    assert count(store, "SELECT MIN(ts) FROM readings WHERE machine_id = 'm1'") >= newest - 2 * DAY
+    assert count(store, "SELECT COUNT(*) FROM readings WHERE machine_id = 'm2'") == 0
+    # Rollups outlive raw readings
+    assert count(store, "SELECT COUNT(*) FROM rollup_1h WHERE machine_id = 'm2'") == 24
+    assert store.query('m2', ['temperature'], T0, T0 + DAY, resolution_s=3600)['sensors']['temperature']['count'][0] == 1
+
+
+def test_backfilled_history_is_not_dropped_on_arrival(store):
+    store.append_many('m1', [{'timestamp': T0 - 400 * DAY + i * 60, 'temperature': 1.0} for i in range(100)])
+    store.flush()
+
+    assert store.enforce_retention() == 0
+    assert count(store, "SELECT COUNT(*) FROM readings") == 100
+
+
+def test_retention_sweep_never_scans_the_readings_table(store):
+    store.append_many('m1', [{'timestamp': T0 + i, 'temperature': 1.0} for i in range(10)])
+    store.flush()
+    statements = []
+    store._conn.set_trace_callback(statements.append)
+    store.enforce_retention()
+    store._conn.set_trace_callback(None)
+
+    swept = [sql for sql in statements if 'readings' in sql and sql.lstrip().upper().startswith(('SELECT', 'DELETE'))]
+    assert swept
+    for sql in swept:
+        plan = " ".join(row[-1] for row in store._conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        assert 'SCAN readings' not in plan, (sql, plan)
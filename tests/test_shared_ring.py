@@ -0,0 +1,123 @@
+"""Shared reading ring: seqlock reads, stale writes, machine IDs and writer exclusion"""
+import os
+import uuid
+
+import pytest
+
+import shared_ring
+from shared_ring import SharedReadingRing, MACHINE_ID_BYTES
+
+
+def reading(i):
+    return {'timestamp': 1_700_000_000 + i, 'temperature': 70.0 + i, 'vibration': 2.0}
+
+
+@pytest.fixture
+def make_ring():
+    rings = []
+
+    def make(**kwargs):
+        kwargs.setdefault('name', f'factory_copilot_test_{os.getpid()}_{uuid.uuid4().hex[:8]}')
+        kwargs.setdefault('capacity', 8)
+        kwargs.setdefault('max_machines', 4)
+        ring = SharedReadingRing(**kwargs)
+        rings.append(ring)
+        return ring
+
+    yield make
+    for ring in rings:
+        ring.unlink()
+        ring.close()
+
+
+def test_latest_keeps_the_newest_readings_across_wraparound(make_ring):
+    ring = make_ring()
+    ring.append_many('m1', [reading(i) for i in range(5)])
+    ring.append_many('m1', [reading(i) for i in range(5, 12)])
+
+    window = ring.latest('m1', n=20)
+
+    assert list(window['temperature']) == [70.0 + i for i in range(4, 12)]
+    assert len(ring.latest('unknown')) == 0
+
+
+def test_second_process_sees_the_same_windows(make_ring):
+    ring = make_ring()
+    ring.append_many('m1', [reading(i) for i in range(3)])
+
+    other = make_ring(name=ring.name)
+
+    assert other.machines() == ['m1']
+    assert list(other.latest('m1')['temperature']) == [70.0, 71.0, 72.0]
+
+
+def test_reader_recovers_from_a_writer_that_died_mid_write(make_ring):
+    ring = make_ring()
+    ring.append_many('m1', [reading(i) for i in range(3)])
+    slot = ring._find_slot('m1')
+    # The writer marked the slot as being written and never finished
+    ring._slots['seq'][slot] += 1
+
+    assert len(ring.latest('m1', max_retries=5)) == 0
+    assert ring.recovered == 1
+
+    ring.append_many('m1', [reading(9)])
+    assert list(ring.latest('m1')['temperature']) == [79.0]
+
+
+def test_next_write_recovers_a_stale_odd_sequence(make_ring):
+    ring = make_ring()
+    ring.append_many('m1', [reading(i) for i in range(3)])
+    ring._slots['seq'][ring._find_slot('m1')] += 1
+
+    ring.append_many('m1', [reading(5)])
+
+    assert ring._slots['seq'][ring._find_slot('m1')] % 2 == 0
+    assert list(ring.latest('m1')['temperature']) == [75.0]
+
+
+def test_over_long_machine_ids_are_rejected(make_ring):
+    ring = make_ring()
+    prefix = 'm' * MACHINE_ID_BYTES
+    ring.append_many(prefix, [reading(0)])
+
+    with pytest.raises(ValueError):
+        ring.append_many(prefix + 'x', [reading(1)])
+    with pytest.raises(ValueError):
+        ring.append_many('é' * (MACHINE_ID_BYTES // 2 + 1), [reading(1)])
+
+    # A longer ID is not an alias of the machine sharing its first 64 bytes
+    assert len(ring.latest(prefix + 'x')) == 0
+    assert len(ring.latest(prefix)) == 1
+
+
+class FakeMsvcrt:
+    """Stand-in for msvcrt whose lock is either free or held by another process"""
+    LK_NBLCK = 2
+
+    def __init__(self, held_elsewhere):
+        self.held_elsewhere = held_elsewhere
+        self.calls = 0
+
+    def locking(self, fd, mode, nbytes):
+        self.calls += 1
+        if self.held_elsewhere:
+            raise OSError(36, "Resource deadlock avoided")
+
+
+def test_without_fcntl_only_one_process_writes(make_ring, monkeypatch):
+    monkeypatch.setattr(shared_ring, 'FCNTL_AVAILABLE', False)
+    monkeypatch.setattr(shared_ring, 'msvcrt', FakeMsvcrt(held_elsewhere=False))
+    writer = make_ring()
+    writer.append_many('m1', [reading(0)])
+    writer.append_many('m1', [reading(1)])
+    # The writer role is claimed once and kept
+    assert shared_ring.msvcrt.calls == 1
+
+    monkeypatch.setattr(shared_ring, 'msvcrt', FakeMsvcrt(held_elsewhere=True))
+    other = make_ring(name=writer.name)
+
+    with pytest.raises(RuntimeError, match='only one process'):
+        other.append_many('m1', [reading(2)])
+    # Reading needs no writer role
+    assert list(other.latest('m1')['temperature']) == [70.0, 71.0]
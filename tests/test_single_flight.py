@@ -0,0 +1,117 @@
+"""Single-flight coalescing of identical concurrent calls"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from single_flight import SingleFlight, AsyncSingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'explanation'
+
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        leader = pool.submit(flight.do, 'key', slow)
+        assert started.wait(5)
+        waiters = [pool.submit(flight.do, 'key', slow) for _ in range(4)]
+        while flight.stats()['coalesced'] < 4:
+            time.sleep(0.001)
+        release.set()
+        results = [leader.result(5)] + [w.result(5) for w in waiters]
+
+    assert results == ['explanation'] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {'in_flight': 0, 'executions': 1, 'coalesced': 4, 'errors': 0, 'timeouts': 0}
+
+
+def test_leader_error_reaches_waiters_and_is_not_cached():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("provider down")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, 'key', failing)
+        assert started.wait(5)
+        waiter = pool.submit(flight.do, 'key', failing)
+        while flight.stats()['coalesced'] < 1:
+            time.sleep(0.001)
+        release.set()
+        for future in (leader, waiter):
+            with pytest.raises(RuntimeError, match='provider down'):
+                future.result(5)
+
+    # The failed call is forgotten; the next caller starts afresh
+    assert flight.do('key', lambda: 'recovered') == 'recovered'
+
+
+def test_waiter_timeout():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'late'
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        leader = pool.submit(flight.do, 'key', slow)
+        assert started.wait(5)
+        with pytest.raises(TimeoutError):
+            flight.do('key', slow, timeout=0.01)
+        release.set()
+        assert leader.result(5) == 'late'
+
+    assert flight.stats()['timeouts'] == 1
+
+
+def test_async_callers_share_one_call():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return 'explanation'
+
+    async def main():
+        return await asyncio.gather(*(flight.do('key', slow) for _ in range(5)))
+
+    assert asyncio.run(main()) == ['explanation'] * 5
+    assert len(calls) == 1
+    assert flight.stats()['coalesced'] == 4
+
+
+def test_cancelled_async_leader_fails_waiters_instead_of_cancelling_them():
+    flight = AsyncSingleFlight()
+
+    async def never():
+        await asyncio.sleep(10)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('key', never))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do('key', never))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(RuntimeError, match='cancelled'):
+            await waiter
+        assert flight.stats()['in_flight'] == 0
+
+    asyncio.run(main())
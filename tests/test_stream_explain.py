@@ -0,0 +1,75 @@
+"""Streaming explanations settle the OpenAI circuit breaker on every exit"""
+import time
+
+import pytest
+
+pytest.importorskip('langchain')
+
+from ai_explainer import AIExplainer
+from circuit_breaker import CircuitBreaker, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
+
+PREDICTION = {'risk': 82.0, 'feature_importance': {'temperature': 0.6, 'vibration': 0.4}}
+SENSORS = {'temperature': 91.0, 'vibration': 4.2, 'cycle_time': 33.0, 'error_count': 2}
+
+
+class Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeChain:
+    def __init__(self, chunks, delay_s=0.0):
+        self.chunks = chunks
+        self.delay_s = delay_s
+
+    def stream(self, variables):
+        for text in self.chunks:
+            time.sleep(self.delay_s)
+            yield Chunk(text)
+
+
+def half_open_explainer(chain, deadline_s=5.0):
+    explainer = AIExplainer()
+    explainer.llm = object()
+    explainer.chain = chain
+    explainer.breaker = CircuitBreaker('openai-test', failure_threshold=1, reset_timeout_s=0.01,
+                                       deadline_s=deadline_s)
+    explainer.breaker.record_failure()
+    assert explainer.breaker.state == STATE_OPEN
+    time.sleep(0.02)
+    return explainer
+
+
+def situation(n):
+    # A distinct situation per test so the explanation cache and response store miss
+    return dict(SENSORS, temperature=SENSORS['temperature'] + n * 7.3)
+
+
+def test_disconnect_mid_stream_releases_half_open_probe():
+    explainer = half_open_explainer(FakeChain(["Root Cause: bearing wear ", "and heat. ",
+                                               "Recommended Action: replace bearing."]))
+    stream = explainer.stream_explain(PREDICTION, situation(1))
+    next(stream)
+    assert explainer.breaker.state == STATE_HALF_OPEN
+    stream.close()  # Client went away
+
+    assert not explainer.breaker._probe_in_flight
+    assert explainer.breaker.allow_request()
+
+
+def test_completed_stream_closes_breaker():
+    explainer = half_open_explainer(FakeChain(["Root Cause: heat. ", "Recommended Action: cool down."]))
+    events = list(explainer.stream_explain(PREDICTION, situation(2)))
+
+    assert events[-1]['event'] == 'done' and events[-1]['source'] == 'llm'
+    assert explainer.breaker.state == STATE_CLOSED
+
+
+def test_stream_past_deadline_falls_back_and_counts_timeout():
+    chain = FakeChain(["Root Cause: slow ", "stream ", "keeps ", "going"], delay_s=0.05)
+    explainer = half_open_explainer(chain, deadline_s=0.08)
+    events = list(explainer.stream_explain(PREDICTION, situation(3)))
+
+    assert events[-1]['source'] == 'fallback'
+    assert explainer.breaker.state == STATE_OPEN
+    assert explainer.breaker.stats()['timeouts'] == 1
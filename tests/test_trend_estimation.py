@@ -0,0 +1,80 @@
+"""Multi-scale trend estimation and LTTB downsampling"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from trend_estimation import (estimate_trends, recent_history, downsample, lttb_indices, theil_sen_slopes,
+                              overall_direction)
+
+T0 = datetime(2024, 1, 1)
+
+
+def readings(n, interval_s=10.0, temperature=None, seed=0):
+    rng = np.random.default_rng(seed)
+    temperature = 70 + rng.normal(0, 0.2, n) if temperature is None else temperature
+    return [{'timestamp': (T0 + timedelta(seconds=i * interval_s)).isoformat(),
+             'temperature': float(temperature[i]), 'vibration': float(2 + rng.normal(0, 0.05))}
+            for i in range(n)]
+
+
+def test_rising_temperature_survives_outliers():
+    n = 3000
+    temperature = 70 + np.arange(n) * (3.0 / 360) + np.random.default_rng(1).normal(0, 0.2, n)
+    temperature[::50] = 20.0  # Sensor dropouts
+    trends = estimate_trends(readings(n, temperature=temperature))
+
+    hour = trends['hour']['sensors']['temperature']
+    assert hour['direction'] == 'rising'
+    # 3 degrees per hour (one reading every 10 s); least squares is dragged around by the dropouts
+    assert abs(hour['slope_per_hour'] - 3.0) < 0.3
+    assert overall_direction(trends, 'vibration') == 'stable'
+
+
+def test_short_window_reports_only_the_scales_it_covers():
+    trends = estimate_trends(readings(30, interval_s=1.0))
+
+    assert list(trends) == ['minute']
+    assert trends['minute']['readings'] == 30
+
+
+def test_mixed_timestamp_formats_are_one_time_axis():
+    history = readings(100, interval_s=60.0)
+    for i, reading in enumerate(history):
+        if i % 2:
+            reading['timestamp'] = (T0 + timedelta(minutes=i)).isoformat() + 'Z'
+
+    trends = estimate_trends(history)
+
+    assert trends['hour']['span_s'] == 3600.0
+
+
+def test_recent_history_drops_readings_older_than_the_longest_scale():
+    history = readings(4000, interval_s=10.0)  # About 11 hours
+
+    recent = recent_history(history)
+
+    assert len(recent) == 8 * 360 + 1
+    assert recent[-1] is history[-1]
+    assert len(recent_history(history, max_readings=100)) == 100
+
+
+def test_theil_sen_ignores_a_minority_of_outliers():
+    t = np.arange(20.0)
+    values = (2 * t)[:, None].copy()
+    values[[3, 11]] = 500
+
+    assert theil_sen_slopes(t, values)[0] == 2.0
+
+
+def test_downsample_keeps_the_ends_and_the_peaks():
+    temperature = np.full(5000, 70.0)
+    temperature[1234] = 120.0
+    history = readings(5000, temperature=temperature)
+
+    kept = downsample(history, max_points=100)
+
+    assert len(kept) == 100
+    assert kept[0] is history[0] and kept[-1] is history[-1]
+    assert any(r['temperature'] == 120.0 for r in kept)
+    assert np.all(np.diff(lttb_indices(np.arange(5000.0), temperature, 100)) > 0)
+    assert downsample(history[:50], max_points=100) is not None
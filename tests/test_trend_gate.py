@@ -0,0 +1,110 @@
+"""Reuse of Gemini trend analyses while a machine's trend is unchanged"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from trend_gate import TrendGate, trend_snapshot
+from gemini_analyzer import GeminiAnalyzer
+
+SUMMARY = {
+    'temperature': {'mean': 70.0, 'current': 71.0},
+    'vibration': {'mean': 2.0, 'current': 2.1},
+    'error_count': {'mean': 0.2, 'current': 0.0},
+    'pressure': {'mean': 100.0, 'current': 101.0},
+}
+
+
+def trends(direction):
+    return {
+        '1m': {'span_s': 60, 'readings': 60, 'sensors': {'temperature': {'direction': 'stable'}}},
+        '1h': {'span_s': 3600, 'readings': 600, 'sensors': {'temperature': {'direction': direction}}},
+    }
+
+
+def with_stat(name, stat, value):
+    summary = {k: dict(v) for k, v in SUMMARY.items()}
+    summary[name][stat] = value
+    return summary
+
+
+def test_small_changes_keep_the_stored_analysis():
+    gate = TrendGate(max_age_s=60)
+    gate.store('m1', trend_snapshot(SUMMARY, trends('rising')), 'analysis')
+
+    reused = gate.lookup('m1', trend_snapshot(with_stat('temperature', 'mean', 70.5), trends('rising')))
+
+    assert reused is not None and reused[0] == 'analysis'
+
+
+def test_direction_reversal_invalidates():
+    gate = TrendGate(max_age_s=60)
+    before = trend_snapshot(SUMMARY, trends('rising'))
+
+    assert gate.changed(before, trend_snapshot(SUMMARY, trends('falling'))) == 'temperature.direction'
+
+
+def test_sensors_without_configured_tolerance_are_compared():
+    gate = TrendGate(max_age_s=60)
+    before = trend_snapshot(SUMMARY)
+
+    assert gate.changed(before, trend_snapshot(with_stat('pressure', 'mean', 100.5))) is None
+    assert gate.changed(before, trend_snapshot(with_stat('pressure', 'mean', 104.0))) == 'pressure.mean'
+
+
+def test_no_key_is_never_gated():
+    gate = TrendGate(max_age_s=60)
+    gate.store(None, trend_snapshot(SUMMARY), 'analysis')
+
+    assert gate.lookup(None, trend_snapshot(SUMMARY)) is None
+    assert gate.stats()['entries'] == 0
+    assert gate.stats()['refreshes']['ungated'] == 1
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        return Response(f"Summary for call {self.calls}")
+
+
+def history(temperature, machine_id=None, n=30):
+    t0 = datetime(2024, 1, 1)
+    readings = []
+    for i in range(n):
+        reading = {'timestamp': (t0 + timedelta(seconds=i)).isoformat(), 'temperature': temperature + (i % 3) * 0.1,
+                   'vibration': 2.0, 'cycle_time': 30.0, 'error_count': 0.0}
+        if machine_id is not None:
+            reading['machine_id'] = machine_id
+        readings.append(reading)
+    return readings
+
+
+@pytest.fixture
+def analyzer():
+    analyzer = GeminiAnalyzer()
+    analyzer.model = FakeModel()
+    analyzer.trend_gate = TrendGate(max_age_s=600)
+    return analyzer
+
+
+def test_histories_without_machine_id_do_not_share_analyses(analyzer):
+    analyzer.analyze_trends(history(70.0))
+    second = analyzer.analyze_trends(history(70.4))
+
+    assert analyzer.model.calls == 2
+    assert second.get('reused_age_s') is None
+
+
+def test_same_machine_reuses_analysis(analyzer):
+    analyzer.analyze_trends(history(72.0, machine_id='m7'))
+    second = analyzer.analyze_trends(history(72.4, machine_id='m7'))
+
+    assert analyzer.model.calls == 1
+    assert second.get('reused_age_s') is not None
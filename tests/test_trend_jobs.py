@@ -0,0 +1,100 @@
+"""Background trend-analysis jobs"""
+import threading
+import time
+
+import pytest
+
+from trend_jobs import TrendJobQueue, QueueFullError, JOB_DONE, JOB_FAILED, JOB_RUNNING
+
+
+def wait_for(queue, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job is not None and job['status'] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{job_id} never reached {status}: {queue.get(job_id)}")
+
+
+@pytest.fixture
+def gate():
+    """analyze_fn blocking until released, so jobs can be held in flight"""
+    release = threading.Event()
+
+    def analyze(history):
+        release.wait(5)
+        return {'readings': len(history)}
+
+    yield analyze, release
+    release.set()
+
+
+def test_identical_submissions_share_a_job(gate):
+    analyze, release = gate
+    queue = TrendJobQueue(analyze, max_workers=1)
+
+    job_id, deduplicated = queue.submit('m1', lambda: [1, 2, 3], machine_id='m1')
+    same_id, same_deduplicated = queue.submit('m1', lambda: [1, 2, 3], machine_id='m1')
+    other_id, _ = queue.submit('m2', lambda: [1], machine_id='m2')
+    release.set()
+
+    assert (deduplicated, same_deduplicated) == (False, True)
+    assert same_id == job_id != other_id
+    assert wait_for(queue, job_id, JOB_DONE)['result'] == {'readings': 3}
+    # A finished job no longer absorbs submissions
+    assert queue.submit('m1', lambda: [1], machine_id='m1')[0] != job_id
+
+
+def test_full_queue_rejects_submissions(gate):
+    analyze, release = gate
+    queue = TrendJobQueue(analyze, max_workers=1, max_queue=1)
+    running, _ = queue.submit('a', lambda: [])
+    wait_for(queue, running, JOB_RUNNING)
+    queue.submit('b', lambda: [])
+
+    with pytest.raises(QueueFullError):
+        queue.submit('c', lambda: [])
+    assert queue.stats()['rejected'] == 1 and queue.stats()['queue_depth'] == 1
+
+
+def test_failures_are_reported_on_the_job():
+    def broken(history):
+        raise ValueError("no readings")
+
+    queue = TrendJobQueue(broken, max_workers=1)
+    job = wait_for(queue, queue.submit('m1', lambda: [])[0], JOB_FAILED)
+
+    assert job['error'] == 'no readings' and job['result'] is None
+    assert queue.stats()['failed'] == 1
+
+
+def test_subscribers_see_every_state_until_the_job_finishes(gate):
+    analyze, release = gate
+    queue = TrendJobQueue(analyze, max_workers=1)
+    blocker, _ = queue.submit('first', lambda: [])
+    job_id, _ = queue.submit('second', lambda: [1])
+    states = []
+    done = threading.Event()
+
+    def listener(state):
+        states.append(state['status'])
+        if state['status'] == JOB_DONE:
+            done.set()
+
+    assert queue.subscribe(job_id, listener)['status'] == 'queued'
+    release.set()
+
+    assert done.wait(5)
+    assert states == [JOB_RUNNING, JOB_DONE]
+    assert queue.subscribe(job_id, listener)['status'] == JOB_DONE
+
+
+def test_oldest_finished_jobs_are_dropped():
+    queue = TrendJobQueue(lambda history: {}, max_workers=1, max_entries=2)
+    ids = []
+    for i in range(4):
+        ids.append(queue.submit(i, lambda: [])[0])
+        wait_for(queue, ids[-1], JOB_DONE)
+
+    assert [queue.get(i) is not None for i in ids] == [False, False, True, True]
@@ -0,0 +1,100 @@
+"""DataFrame-free sensor windows and summaries"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from trend_stats import SensorWindow, summarize
+from gemini_analyzer import GeminiAnalyzer
+
+
+def readings(n=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{'timestamp': f'2024-01-01T00:{i // 60:02d}:{i % 60:02d}', 'machine_id': 'm1',
+             'temperature': float(70 + rng.normal()), 'vibration': float(2 + rng.normal(0, 0.1)),
+             'power_consumption': float(500 + rng.normal(0, 5))}
+            for i in range(n)]
+
+
+@pytest.mark.parametrize('shape', ['list', 'dataframe', 'columns'])
+def test_summary_matches_pandas_for_every_input_shape(shape):
+    history = readings()
+    frame = pd.DataFrame(history)
+    source = {'list': history, 'dataframe': frame, 'columns': frame.to_dict('list')}[shape]
+
+    summary = summarize(source)
+
+    assert list(summary) == ['temperature', 'vibration', 'power']
+    for name, column in (('temperature', 'temperature'), ('power', 'power_consumption')):
+        assert summary[name]['mean'] == pytest.approx(frame[column].mean())
+        assert summary[name]['std'] == pytest.approx(frame[column].std(ddof=0))
+        assert summary[name]['max'] == frame[column].max()
+        assert summary[name]['change'] == pytest.approx(frame[column].iloc[-1] - frame[column].iloc[0])
+
+
+def test_missing_readings_are_skipped():
+    history = readings(5)
+    history[0]['temperature'] = None
+    history[-1]['temperature'] = None
+    for reading in history:
+        reading['vibration'] = None
+
+    window = SensorWindow.from_history(history)
+    summary = summarize(window)
+
+    # A sensor that never reports is left out rather than summarized as NaN
+    assert window.names == ['temperature', 'power']
+    assert summary['temperature']['count'] == 3
+    assert summary['temperature']['first'] == history[1]['temperature']
+    assert summary['temperature']['current'] == history[3]['temperature']
+
+
+def test_window_keeps_timestamps_and_machine():
+    history = readings(10)
+    window = SensorWindow.from_history(history, sensors=['vibration'])
+
+    assert window.values.shape == (10, 1)
+    assert window.machine_id == 'm1'
+    assert window.timestamp(9) == history[9]['timestamp']
+
+
+def test_empty_history():
+    assert summarize([]) == {}
+    assert len(SensorWindow.from_history([])) == 0
+
+
+def test_trend_analysis_builds_no_dataframe(monkeypatch):
+    def no_frames(*args, **kwargs):
+        raise AssertionError("DataFrame built on the trend path")
+
+    monkeypatch.setattr(pd, 'DataFrame', no_frames)
+    analyzer = GeminiAnalyzer()
+    analyzer.model = None
+
+    result = analyzer.analyze_trends(readings(200))
+
+    assert result['status'] == 'dummy'
+    assert result['trends']
+
+
+def test_sensor_missing_from_the_first_and_last_reading_is_kept():
+    history = readings(10)
+    for reading in history[1:-1]:
+        reading['pressure'] = 100.0
+
+    window = SensorWindow.from_history(history)
+
+    assert 'pressure' in window.names
+    assert summarize(window)['pressure']['count'] == 8
+
+
+def test_unchanged_history_is_extracted_once():
+    history = readings(20)
+
+    first = SensorWindow.from_history(history)
+    assert SensorWindow.from_history(list(history)) is first
+    assert not first.values.flags.writeable
+
+    history.append(readings(21)[-1])
+    grown = SensorWindow.from_history(history)
+    assert grown is not first and len(grown) == 21
+    assert SensorWindow.from_history(history[1:]) is not grown
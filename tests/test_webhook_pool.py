@@ -0,0 +1,82 @@
+"""Keep-alive connection reuse for n8n webhook delivery"""
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from automation import AutomationTrigger
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep connections open between requests
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.clients.append(self.client_address)
+        body = json.dumps({'ok': True}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookHandler)
+    server.clients = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv('N8N_WEBHOOK_URL', f'http://127.0.0.1:{server.server_address[1]}/webhook')
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_alerts_reuse_one_connection(webhook):
+    trigger = AutomationTrigger(use_outbox=False, suppress=False, use_digest=False)
+
+    results = [trigger._send_payload({'n': i}) for i in range(5)]
+
+    assert all(r['success'] for r in results)
+    assert len(webhook.clients) == 5 and len(set(webhook.clients)) == 1
+    stats = trigger.connection_stats()['sync']
+    assert (stats['requests'], stats['connections_opened'], stats['reuse_rate']) == (5, 1, 0.8)
+
+
+def test_async_alerts_reuse_one_connection(webhook):
+    pytest.importorskip('httpx')
+    trigger = AutomationTrigger(use_outbox=False, suppress=False, use_digest=False)
+
+    async def send_all():
+        try:
+            return [await trigger._asend_payload({'n': i}) for i in range(5)]
+        finally:
+            await trigger._async_client.aclose()
+
+    results = asyncio.run(send_all())
+
+    assert all(r['success'] for r in results)
+    assert len(set(webhook.clients)) == 1
+    stats = trigger.connection_stats()['async']
+    assert (stats['requests'], stats['connections_opened']) == (5, 1)
+
+
+def test_idle_sync_connection_is_closed_after_the_keepalive_expiry(webhook, monkeypatch):
+    monkeypatch.setenv('N8N_KEEPALIVE_EXPIRY_S', '0.2')
+    trigger = AutomationTrigger(use_outbox=False, suppress=False, use_digest=False)
+
+    trigger._send_payload({'n': 0})
+    trigger._send_payload({'n': 1})
+    time.sleep(0.3)
+    trigger._send_payload({'n': 2})
+
+    assert len(set(webhook.clients[:2])) == 1 and webhook.clients[2] != webhook.clients[1]
+    stats = trigger.connection_stats()['sync']
+    assert (stats['requests'], stats['connections_opened']) == (3, 2)